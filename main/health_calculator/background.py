@@ -0,0 +1,121 @@
+# Runs the calculators' heavy work off the Tk thread.
+#
+# Each tab owns a TabWorker. run() hands a function to a worker thread and
+# calls back on the Tk thread (Tk is not thread-safe) once it finishes; the
+# Tk side finds out by polling the future with widget.after, so no worker
+# ever touches a widget. A run() supersedes the tab's previous request: if
+# that has not started it is cancelled, if it is running it is asked to stop
+# (see Job.cancelled), and either way its result is dropped.
+# The tab's progress bar (packed last in its row; hidden while idle) shows
+# once a request has been running for a moment.
+#
+#   worker = TabWorker(frame, progressbar)
+#   worker.run(compute_plan, (diet, protein, meals), on_done=show_plan)
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# How often the Tk thread checks for finished work
+POLL_MS = 15
+# Requests finishing sooner than this never show the progress bar
+PROGRESS_DELAY_MS = 150
+WORKER_THREADS = 2
+
+_executor = None
+
+
+def default_executor():
+    # Threads shared by every tab, started on first use
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(WORKER_THREADS, thread_name_prefix="health-calc")
+    return _executor
+
+
+class Job:
+    # Handed to functions that take a `job` argument, so long loops can
+    # check job.cancelled() and stop early
+    def __init__(self):
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+
+class TabWorker:
+    def __init__(self, widget, progressbar=None, executor=None, poll_ms=POLL_MS):
+        self.widget = widget
+        self.progressbar = progressbar
+        self.executor = executor
+        self.poll_ms = poll_ms
+        self.job = None
+        self.future = None
+        self.callbacks = None
+        self.elapsed_ms = 0
+        self._poll_job = None
+        self._progress_shown = False
+        if progressbar is not None:
+            self._progress_pack = progressbar.pack_info()
+            progressbar.pack_forget()
+
+    def busy(self):
+        return self.future is not None
+
+    def run(self, function, args=(), on_done=None, on_error=None, pass_job=False):
+        # Computes function(*args) in the background, then calls on_done(result)
+        # or on_error(exception) on the Tk thread unless a newer run() came
+        # first. With `pass_job`, the function also gets job=<Job>.
+        self.cancel()
+        self.job = Job()
+        kwargs = {'job': self.job} if pass_job else {}
+        executor = self.executor or default_executor()
+        self.future = executor.submit(function, *args, **kwargs)
+        self.callbacks = (on_done, on_error)
+        self.elapsed_ms = 0
+        if self._poll_job is None:
+            self._poll_job = self.widget.after(self.poll_ms, self._poll)
+
+    def cancel(self):
+        # Drops the request in flight, if any
+        if self.future is not None:
+            self.job.cancel()
+            self.future.cancel()
+            self.future = None
+            self.callbacks = None
+        self._set_progress(False)
+
+    def _poll(self):
+        self._poll_job = None
+        future = self.future
+        if future is None:
+            return
+        if not future.done():
+            self.elapsed_ms += self.poll_ms
+            if self.elapsed_ms >= PROGRESS_DELAY_MS:
+                self._set_progress(True)
+            self._poll_job = self.widget.after(self.poll_ms, self._poll)
+            return
+
+        on_done, on_error = self.callbacks
+        self.future = self.callbacks = None
+        self._set_progress(False)
+        error = future.exception()
+        if error is not None:
+            if on_error is None:
+                raise error
+            on_error(error)
+        elif on_done is not None:
+            on_done(future.result())
+
+    def _set_progress(self, shown):
+        if self.progressbar is None or shown == self._progress_shown:
+            return
+        self._progress_shown = shown
+        if shown:
+            self.progressbar.pack(self._progress_pack)
+            self.progressbar.start(10)
+        else:
+            self.progressbar.stop()
+            self.progressbar.pack_forget()
@@ -0,0 +1,372 @@
+# Benchmark suite: compute kernels, chart rendering, cold imports and startup.
+#
+# Results are written as JSON and can be compared with a saved baseline;
+# any benchmark slower than the baseline by more than the threshold is
+# reported as a regression and makes the run exit with status 1. Charts
+# render on the Agg backend; a chart whose median frame of a kind is over
+# its RENDER_BUDGETS_MS also fails the run. The first full draw of every
+# chart (fonts and glyph caches still cold) is reported but has no budget.
+# The GUI's startup imports are timed everywhere; its first paint and
+# opening every tab need a display and are skipped without one (run under
+# xvfb-run to include them).
+#
+#   python benchmarks.py -o baseline.json
+#   python benchmarks.py --compare baseline.json --threshold 0.25
+#   python benchmarks.py --only compute --quick
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+GROUPS = ("compute", "render", "import", "startup")
+DEFAULT_THRESHOLD = 0.25
+# Median milliseconds allowed per chart frame kind (see charts.ChartRenderer)
+RENDER_BUDGETS_MS = {'blit': 50.0, 'full': 100.0}
+
+# Input sizes
+DOSE_COUNTS = (1, 1_000, 100_000)
+TABLE_SIZES = (19, 1_000, 10_000, 100_000)
+MEALS_PER_DAY = (3, 4, 5, 6)
+PLAN_DAYS = 28
+HISTORY_BATCH_ROWS = 4096
+
+# Prints the import time, then the two GUI times or "no-display"
+_STARTUP_PROBE = """
+import time
+start = time.perf_counter()
+import tkinter as tk
+import main
+imported = time.perf_counter()
+try:
+    root = tk.Tk()
+except tk.TclError:
+    print(imported - start, "no-display")
+    raise SystemExit
+app = main.HealthCalculatorGUI(root)
+root.update_idletasks()
+first_paint = time.perf_counter()
+for name in ("protein", "meal"):
+    app.ensure_calculator(name)
+root.update_idletasks()
+all_tabs = time.perf_counter()
+root.destroy()
+print(imported - start, first_paint - start, all_tabs - start)
+"""
+
+
+def time_call(function, sample_time=0.05, repeat=5):
+    # Median and best time per call over `repeat` samples; each sample loops
+    # the call for at least `sample_time` seconds
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= sample_time:
+            break
+        number = max(number * 2, int(number * sample_time / max(elapsed, 1e-9)))
+
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        samples.append((time.perf_counter() - start) / number)
+    return {'median_us': statistics.median(samples) * 1e6, 'min_us': min(samples) * 1e6,
+            'number': number, 'repeat': repeat}
+
+
+def synthetic_table(rows, seed=0):
+    # FOOD_DATABASE foods repeated with +-50% protein and calories
+    import numpy as np
+    from food_table import FoodTable
+
+    base = FoodTable.from_dict()
+    if rows <= len(base):
+        return base
+    rng = np.random.default_rng(seed)
+    source = rng.integers(0, len(base), rows)
+    scale = rng.uniform(0.5, 1.5, (2, rows))
+    names = [f"{base.names[i]} #{n}" for n, i in enumerate(source.tolist())]
+    return FoodTable(names, np.round(base.protein[source] * scale[0], 1),
+                     np.round(base.calories[source] * scale[1]),
+                     base.category_codes[source], base.serving_codes[source], base.serving_sizes)
+
+
+def compute_benchmarks(quick=False):
+    import numpy as np
+    import caffeine_engine
+    import caffeine_population
+    import caffeine_tracker
+    import caffeine_schedule
+    import compact_plan
+    import core
+    import food_search
+    import history
+    import meal_search
+    import week_planner
+    from constants import SWEEP_DOSES
+
+    benchmarks = {}
+    sample_time = 0.01 if quick else 0.05
+
+    def add(name, function):
+        benchmarks[name] = time_call(function, sample_time)
+
+    add("core.hours_until_safe", lambda: core.hours_until_safe(200))
+    add("core.calculate_protein_requirements",
+        lambda: core.calculate_protein_requirements(70, "Athlete", "Muscle Building"))
+    for count in DOSE_COUNTS:
+        doses = np.linspace(0, 2000, count)
+        add(f"caffeine_engine.hours_until_safe[doses={count}]",
+            lambda doses=doses: caffeine_engine.hours_until_safe(doses))
+        add(f"caffeine_engine.classify_doses[doses={count}]",
+            lambda doses=doses: caffeine_engine.classify_doses(doses))
+
+    rng = np.random.default_rng(0)
+    users = 1_000 if quick else 10_000
+    user_ids = np.repeat(np.arange(users), 4)
+    times = rng.uniform(0, 16, user_ids.size)
+    doses = rng.choice([80.0, 120.0, 200.0], user_ids.size)
+    add(f"caffeine_schedule.simulate_schedules[users={users}]",
+        lambda: caffeine_schedule.simulate_schedules(user_ids, times, doses, users, 0, 24))
+
+    add(f"caffeine_engine.bedtime_sweep[doses={SWEEP_DOSES},times=288]",
+        lambda: caffeine_engine.bedtime_sweep(22.0))
+
+    tracked = 100_000 if quick else 1_000_000
+    tracker = caffeine_tracker.CaffeineTracker(capacity=tracked)
+    tracker.add_many(range(tracked), np.zeros(tracked), np.zeros(tracked))
+    event_slots = rng.integers(0, tracked, 5_000)
+    event_times = np.sort(rng.uniform(0, 16, 5_000))
+    event_doses = rng.choice([80.0, 120.0, 200.0], 5_000)
+    add(f"caffeine_tracker.add_slots[users={tracked},events=5000]",
+        lambda: tracker.add_slots(event_slots, event_doses, event_times))
+    add("caffeine_tracker.add", lambda: tracker.add(0, 95.0, 16.0))
+    add(f"caffeine_tracker.levels_at[users={tracked}]", lambda: tracker.levels_at(22.0))
+
+    hours = np.arange(0, 24.5, 0.5)
+    subjects = 2_000 if quick else 20_000
+    add(f"caffeine_population.simulate_population[subjects={subjects}]",
+        lambda: caffeine_population.simulate_population(200, hours, subjects))
+
+    for rows in TABLE_SIZES[:2] if quick else TABLE_SIZES:
+        table = synthetic_table(rows)
+        for meals in MEALS_PER_DAY:
+            add(f"core.create_meal_plan[foods={rows},meals={meals}]",
+                lambda table=table, meals=meals: core.create_meal_plan("Mixed", 120, meals,
+                                                                      table=table))
+        add(f"meal_search.search_meal_plans[foods={rows}]",
+            lambda table=table: meal_search.search_meal_plans("Mixed", 120, 4, rng=0,
+                                                              budget_ms=None, table=table))
+
+        def build_month(table=table):
+            week_planner.MultiDayPlan(PLAN_DAYS, "Mixed", 120, 4, table=table).refresh()
+
+        month = week_planner.MultiDayPlan(PLAN_DAYS, "Mixed", 120, 4, table=table)
+        month.refresh()
+
+        def edit_day(month=month):
+            month.regenerate_day(PLAN_DAYS // 2)
+            month.refresh()
+
+        add(f"week_planner.build[foods={rows},days={PLAN_DAYS}]", build_month)
+        add(f"week_planner.edit_day[foods={rows},days={PLAN_DAYS}]", edit_day)
+
+        plan = core.create_meal_plan("Mixed", 120, 4, table=table)
+        compact = compact_plan.CompactPlan.from_dict(plan, table)
+        add(f"compact_plan.from_dict[foods={rows}]",
+            lambda plan=plan, table=table: compact_plan.CompactPlan.from_dict(plan, table))
+        add(f"compact_plan.to_dict[foods={rows}]",
+            lambda compact=compact, table=table: compact.to_dict(table))
+        add(f"compact_plan.meal_totals[foods={rows}]",
+            lambda compact=compact, table=table: compact.meal_totals(table))
+
+        add(f"food_search.build[foods={rows}]", lambda table=table: food_search.FoodSearchIndex(table))
+        index = food_search.FoodSearchIndex(table)
+        for query in ("chi", "chikcen"):
+            add(f"food_search.search[foods={rows},query={query}]",
+                lambda index=index, query=query: index.search(query))
+
+    # One cli.py batch written to a history database (the writer's own time)
+    with tempfile.TemporaryDirectory() as directory:
+        store = history.HistoryStore(os.path.join(directory, "history.db"))
+        batch = [(1.7e9 + i, f"m{i % 1000}", 'protein', 100.0 + i % 50,
+                  '{"id": 1, "type": "protein", "daily_protein": 112.0}')
+                 for i in range(HISTORY_BATCH_ROWS)]
+
+        def write_batch():
+            store.record_many(batch)
+            store.flush()
+
+        add(f"history.record_many[rows={HISTORY_BATCH_ROWS}]", write_batch)
+        store.close()
+    return benchmarks
+
+
+def render_benchmarks(quick=False):
+    import matplotlib
+    matplotlib.use("Agg")
+    from charts import measure_frame_times
+
+    benchmarks = {}
+    for chart, stats in measure_frame_times(frames=20 if quick else 60).items():
+        for kind, s in stats.items():
+            benchmarks[f"render.{chart}.{kind}"] = {
+                'median_us': s['p50_ms'] * 1000, 'mean_us': s['mean_ms'] * 1000,
+                'p95_us': s['p95_ms'] * 1000, 'number': s['count']}
+            if kind in RENDER_BUDGETS_MS:
+                benchmarks[f"render.{chart}.{kind}"]['budget_us'] = RENDER_BUDGETS_MS[kind] * 1000
+    return benchmarks
+
+
+def over_budget(current):
+    # (name, median us, budget us) of the benchmarks slower than their budget
+    return [(name, result['median_us'], result['budget_us'])
+            for name, result in current['results'].items()
+            if 'budget_us' in result and result['median_us'] > result['budget_us']]
+
+
+def import_benchmarks(quick=False):
+    from measure_import import measure, DEFAULT_MODULES
+
+    benchmarks = {}
+    for module in DEFAULT_MODULES:
+        try:
+            r = measure(module, 3 if quick else 10)
+        except subprocess.CalledProcessError:
+            # e.g. tkinter missing for the GUI modules
+            benchmarks[f"import.{module}"] = {'skipped': "import failed"}
+            continue
+        benchmarks[f"import.{module}"] = {'median_us': r['median_ms'] * 1000,
+                                          'min_us': r['min_ms'] * 1000,
+                                          'max_rss_mb': r['max_rss_mb']}
+    return benchmarks
+
+
+def startup_benchmarks(quick=False):
+    # startup.imports (tkinter and the GUI modules) runs anywhere; the
+    # first paint and all tabs need a display and are skipped without one
+    here = os.path.dirname(os.path.abspath(__file__))
+    names = ("startup.imports", "startup.first_paint", "startup.all_tabs")
+    samples = []
+    for _ in range(2 if quick else 5):
+        out = subprocess.run([sys.executable, "-c", _STARTUP_PROBE], cwd=here,
+                             capture_output=True, text=True)
+        if out.returncode != 0:
+            return {name: {'skipped': "startup failed"} for name in names}
+        fields = out.stdout.split()
+        samples.append([float(x) for x in fields if x != "no-display"])
+
+    results = {}
+    for i, name in enumerate(names):
+        if any(len(s) <= i for s in samples):
+            results[name] = {'skipped': "no display"}
+            continue
+        results[name] = {'median_us': statistics.median(s[i] for s in samples) * 1e6,
+                         'min_us': min(s[i] for s in samples) * 1e6, 'number': len(samples)}
+    return results
+
+
+def run(groups=GROUPS, quick=False):
+    import numpy
+    runners = {'compute': compute_benchmarks, 'render': render_benchmarks,
+               'import': import_benchmarks, 'startup': startup_benchmarks}
+    results = {}
+    for group in groups:
+        results.update(runners[group](quick))
+    return {
+        'meta': {'python': platform.python_version(), 'numpy': numpy.__version__,
+                 'platform': platform.platform(), 'machine': platform.machine(),
+                 'cpus': os.cpu_count(), 'quick': quick,
+                 'time': time.strftime("%Y-%m-%dT%H:%M:%S")},
+        'results': results
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    # Rows of (name, baseline us, current us, ratio, status) for benchmarks
+    # present in both runs
+    rows = []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if not before or 'median_us' not in before or 'median_us' not in result:
+            continue
+        ratio = result['median_us'] / before['median_us'] if before['median_us'] else 1.0
+        if ratio > 1 + threshold:
+            status = "REGRESSION"
+        elif ratio < 1 / (1 + threshold):
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((name, before['median_us'], result['median_us'], ratio, status))
+    return rows
+
+
+def _format_us(us):
+    if us >= 1e6:
+        return f"{us / 1e6:.2f} s"
+    if us >= 1e3:
+        return f"{us / 1e3:.2f} ms"
+    return f"{us:.2f} us"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Health Calculator benchmarks")
+    parser.add_argument("--only", default=",".join(GROUPS),
+                        help=f"comma-separated groups to run ({', '.join(GROUPS)})")
+    parser.add_argument("--quick", action="store_true", help="fewer sizes and shorter runs")
+    parser.add_argument("-o", "--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare with a saved results file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown before a benchmark counts as a regression "
+                             "(default 0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    groups = [g.strip() for g in args.only.split(",") if g.strip()]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown group(s): {', '.join(sorted(unknown))}")
+
+    current = run(groups, args.quick)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+
+    for name, result in current['results'].items():
+        if 'skipped' in result:
+            print(f"{name:<58}{'skipped: ' + result['skipped']:>20}")
+        else:
+            print(f"{name:<58}{_format_us(result['median_us']):>20}")
+
+    failed = False
+    slow = over_budget(current)
+    if slow:
+        print(f"\n{'over budget':<58}{'budget':>12}{'median':>12}")
+        for name, median, budget in slow:
+            print(f"{name:<58}{_format_us(budget):>12}{_format_us(median):>12}")
+        failed = True
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare(current, baseline, args.threshold)
+        print(f"\n{'benchmark':<58}{'baseline':>12}{'current':>12}{'ratio':>8}  status")
+        for name, before, after, ratio, status in rows:
+            print(f"{name:<58}{_format_us(before):>12}{_format_us(after):>12}{ratio:>8.2f}  {status}")
+        regressions = [row for row in rows if row[4] == "REGRESSION"]
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
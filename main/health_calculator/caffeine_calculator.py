@@ -1,8 +1,12 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from shared import *
+import core
+import tracing
+from summaries import caffeine_summary
+
+# Delay before the chart follows a keystroke in the dose entry
+PREVIEW_DELAY_MS = 30
 
 class CaffeineCalculator:
     def __init__(self, parent_frame):
@@ -49,11 +53,29 @@ class CaffeineCalculator:
                            command=lambda d=dose: self.set_caffeine_dose(d))
             btn.pack(side=tk.LEFT, padx=(5, 0))
         
+        # Population mode: shade how the curve varies between people
+        self.population_var = tk.BooleanVar(value=False)
+        population_check = ttk.Checkbutton(input_frame, text="Show how this varies between people",
+                                           variable=self.population_var,
+                                           command=self.on_dose_edited)
+        population_check.pack(anchor=tk.W, pady=(0, 4))
+        
         # Calculate button
         calc_button = ttk.Button(input_frame, text="Calculate Sleep Impact", 
                                 command=self.calculate_impact)
         calc_button.pack(pady=(10, 0))
         
+        sweep_button = ttk.Button(input_frame, text="Compare Doses and Bedtimes",
+                                  command=self.open_sweep)
+        sweep_button.pack(pady=(5, 0))
+        self.sweep_window = None
+        
+        # The timeline is computed in the background; the bar shows while it is slow
+        from background import TabWorker
+        progress = ttk.Progressbar(input_frame, mode='indeterminate', length=120)
+        progress.pack(pady=(5, 0))
+        self.worker = TabWorker(self.parent_frame, progress)
+        
         # Results frame
         self.results_frame = ttk.LabelFrame(self.parent_frame, text="Results", padding="10")
         self.results_frame.pack(fill=tk.X, pady=(0, 10))
@@ -64,16 +86,16 @@ class CaffeineCalculator:
         self.chart_frame = ttk.LabelFrame(self.parent_frame, text="Caffeine Decay Timeline", padding="5")
         self.chart_frame.pack(fill=tk.BOTH, expand=True)
         
-        # Create figure and canvas
-        self.fig, self.ax = plt.subplots(figsize=(8, 4), dpi=80)
-        self.canvas = FigureCanvasTkAgg(self.fig, self.chart_frame)
-        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.fig, self.ax, self.canvas, self.toolbar = create_chart(self.chart_frame)
         
-        # Add toolbar
-        from matplotlib.backends.backend_tkagg import NavigationToolbar2Tk
-        self.toolbar = NavigationToolbar2Tk(self.canvas, self.chart_frame)
-        self.toolbar.update()
-        self.toolbar.pack(side=tk.BOTTOM, fill=tk.X)
+        from charts import CaffeineChart, ChartRenderer
+        self.chart = CaffeineChart(self.ax, animated=True)
+        self.renderer = ChartRenderer(self.fig, self.canvas, self.chart)
+        
+        # Follow the entry live while typing
+        self._preview_job = None
+        self.caffeine_var.trace_add('write', self.on_dose_edited)
+        self.unit_var.trace_add('write', self.on_dose_edited)
     
     def setup_results(self):
         for widget in self.results_frame.winfo_children():
@@ -85,42 +107,106 @@ class CaffeineCalculator:
                                      foreground='blue')
         self.result_label.pack(pady=8)
     
+    def open_sweep(self):
+        if self.sweep_window is not None and self.sweep_window.window.winfo_exists():
+            self.sweep_window.window.lift()
+        else:
+            self.sweep_window = SweepWindow(self.parent_frame)
+    
     def set_caffeine_dose(self, dose):
         self.caffeine_var.set(dose)
         self.unit_var.set("grams")
         self.calculate_impact()
     
+    def on_dose_edited(self, *args):
+        # A result still being computed is for the old dose, drop it
+        self.worker.cancel()
+        # Coalesce bursts of keystrokes into one chart update
+        if self._preview_job is not None:
+            self.parent_frame.after_cancel(self._preview_job)
+        self._preview_job = self.parent_frame.after(PREVIEW_DELAY_MS, self.preview_dose)
+    
+    def preview_dose(self):
+        self._preview_job = None
+        if self.worker.busy():
+            # Every edit cancels the worker, so this is a Calculate for the
+            # dose in the entry (set_caffeine_dose); it updates the chart too,
+            # and a preview run on the same worker would cancel it
+            return
+        try:
+            caffeine_mg, caffeine_grams = self.read_dose()
+        except (ValueError, tk.TclError):
+            # Half-typed numbers are expected here, wait for the next keystroke
+            return
+        if caffeine_mg < 0:
+            return
+        if self.population_var.get():
+            # Simulating the population takes a moment, keep it off the Tk thread
+            self.worker.run(self.compute_timeline, (caffeine_mg, True),
+                            on_done=lambda timeline: self.update_chart(
+                                caffeine_grams, caffeine_mg, timeline['safe_hours'],
+                                timeline['curve'], timeline['bands']),
+                            on_error=self.show_error)
+        else:
+            timeline = self.caffeine_timeline(caffeine_mg)
+            self.update_chart(caffeine_grams, caffeine_mg, timeline['safe_hours'], timeline['curve'])
+    
+    def read_dose(self):
+        caffeine_mg = core.to_mg(self.caffeine_var.get(), self.unit_var.get())
+        return caffeine_mg, caffeine_mg / 1000
+    
     def calculate_remaining_caffeine(self, initial_dose_mg, hours):
-        return initial_dose_mg * (0.5) ** (hours / CAFFEINE_HALF_LIFE)
+        return core.calculate_remaining_caffeine(initial_dose_mg, hours)
     
     def hours_until_safe(self, initial_dose_mg):
-        hours = 0
-        max_hours = 200
-        while (self.calculate_remaining_caffeine(initial_dose_mg, hours) > SLEEP_THRESHOLD_MG 
-               and hours < max_hours):
-            hours += 1
-        return min(hours, max_hours)
+        return core.hours_until_safe(initial_dose_mg)
     
     def get_dose_safety_level(self, dose_mg):
-        if dose_mg >= LETHAL_DOSE_MG:
-            return "LETHAL", "red"
-        elif dose_mg >= DANGER_DOSE_MG:
-            return "EXTREMELY DANGEROUS", "darkred"
-        elif dose_mg >= MAX_SAFE_DOSE_MG:
-            return "HIGH DOSE", "orange"
-        else:
-            return "SAFE RANGE", "green"
+        return core.get_dose_safety_level(dose_mg)
+    
+    def caffeine_timeline(self, caffeine_mg):
+        # Safe hours and the decay curve of a dose, reused from the result cache
+        from charts import caffeine_curve
+        from result_cache import default_cache, caffeine_key
+        
+        def compute():
+            safe_hours = self.hours_until_safe(caffeine_mg)
+            hours, levels = caffeine_curve(caffeine_mg, safe_hours)
+            hours.flags.writeable = levels.flags.writeable = False
+            return {'safe_hours': safe_hours, 'curve': (hours, levels)}
+        
+        return default_cache().get_or_compute(caffeine_key(caffeine_mg), compute)
+    
+    def population_timeline(self, caffeine_mg):
+        # caffeine_timeline plus percentile bands over POPULATION_SUBJECTS
+        # simulated people, on a time grid that also covers the slowest ones
+        import numpy as np
+        from charts import caffeine_curve
+        from caffeine_population import sample_subjects, subject_hours_until_safe, population_bands
+        from constants import POPULATION_SUBJECTS, POPULATION_PERCENTILES, POPULATION_SEED
+        from result_cache import default_cache, population_key
+        
+        def compute():
+            safe_hours = self.hours_until_safe(caffeine_mg)
+            half_lives, lags = sample_subjects(POPULATION_SUBJECTS, POPULATION_SEED)
+            slowest = np.percentile(subject_hours_until_safe(caffeine_mg, half_lives, lags),
+                                    POPULATION_PERCENTILES[-1])
+            hours, levels = caffeine_curve(caffeine_mg, max(safe_hours, slowest))
+            bands = population_bands(caffeine_mg, hours, half_lives, lags)
+            for array in (hours, levels, bands['levels'], bands['safe_hours']):
+                array.flags.writeable = False
+            return {'safe_hours': safe_hours, 'curve': (hours, levels), 'bands': bands}
+        
+        return default_cache().get_or_compute(population_key(caffeine_mg), compute)
     
     def calculate_impact(self):
+        with tracing.span("caffeine.calculate_impact"):
+            self._calculate_impact()
+
+    def _calculate_impact(self):
         try:
-            caffeine_amount = self.caffeine_var.get()
-            
-            if self.unit_var.get() == "grams":
-                caffeine_mg = caffeine_amount * 1000
-                caffeine_grams = caffeine_amount
-            else:
-                caffeine_mg = caffeine_amount
-                caffeine_grams = caffeine_amount / 1000
+            with tracing.span("caffeine.parse"):
+                caffeine_mg, caffeine_grams = self.read_dose()
             
             safety_level, color = self.get_dose_safety_level(caffeine_mg)
             
@@ -131,83 +217,87 @@ class CaffeineCalculator:
                 messagebox.showwarning("Dangerous Dose", 
                                      f"Warning: {caffeine_mg:,.0f}mg is extremely dangerous!")
             
-            safe_hours = self.hours_until_safe(caffeine_mg)
-            self.update_results(caffeine_grams, caffeine_mg, safe_hours, safety_level, color)
-            self.update_chart(caffeine_grams, caffeine_mg)
-            
         except ValueError:
             messagebox.showerror("Input Error", "Please enter a valid number!")
-    
-    def update_results(self, caffeine_grams, caffeine_mg, safe_hours, safety_level, color):
-        for widget in self.results_frame.winfo_children():
-            widget.destroy()
+            return
         
-        caffeine_mg_formatted = f"{caffeine_mg:,.0f}" if caffeine_mg >= 1000 else f"{caffeine_mg:.0f}"
-        caffeine_grams_formatted = f"{caffeine_grams:,.1f}" if caffeine_grams >= 1 else f"{caffeine_grams:.3f}"
-        
-        result_text = f"""• Dose: {caffeine_grams_formatted}g ({caffeine_mg_formatted}mg)
-• Sleep Impact: {safe_hours:.1f} hours
-• Safety: {safety_level}"""
-        
-        result_label = ttk.Label(self.results_frame, text=result_text,
-                               font=('Arial', 10), foreground=color)
-        result_label.pack(pady=8)
+        self.worker.run(self.compute_timeline, (caffeine_mg, self.population_var.get()),
+                        on_done=lambda timeline: self.show_impact(
+                            caffeine_grams, caffeine_mg, timeline, safety_level, color),
+                        on_error=self.show_error)
     
-    def update_chart(self, caffeine_grams, caffeine_mg):
-        self.ax.clear()
-        
-        safe_hours = self.hours_until_safe(caffeine_mg)
-        
-        if safe_hours < 12:
-            max_hours = 12
-        elif safe_hours < 24:
-            max_hours = safe_hours + 4
-        elif safe_hours < 48:
-            max_hours = safe_hours + 8
-        else:
-            max_hours = safe_hours + 12
-        
-        max_hours = min(max_hours, 168)
-        
-        if max_hours <= 24:
-            time_step = 0.5
-        elif max_hours <= 72:
-            time_step = 1
-        else:
-            time_step = 2
-        
-        hours = [x * time_step for x in range(0, int(max_hours/time_step) + 1)]
-        remaining = [self.calculate_remaining_caffeine(caffeine_mg, h) for h in hours]
-        
-        self.ax.plot(hours, remaining, 'b-', linewidth=2, label='Caffeine in body')
-        self.ax.axhline(y=SLEEP_THRESHOLD_MG, color='r', linestyle='--', 
-                       linewidth=1.5, label=f'Sleep threshold ({SLEEP_THRESHOLD_MG}mg)')
-        
-        if safe_hours <= max_hours:
-            self.ax.axvline(x=safe_hours, color='g', linestyle=':', 
-                           linewidth=1.5, label=f'Safe to sleep ({safe_hours:.1f}h)')
-        
-        self.ax.set_xlabel('Hours after consumption', fontsize=9)
-        self.ax.set_ylabel('Caffeine (mg)', fontsize=9)
+    def compute_timeline(self, caffeine_mg, population=False):
+        # Runs on a worker thread: no widgets here
+        with tracing.span("caffeine.compute", population=population):
+            if population:
+                return self.population_timeline(caffeine_mg)
+            return self.caffeine_timeline(caffeine_mg)
+    
+    def show_impact(self, caffeine_grams, caffeine_mg, timeline, safety_level, color):
+        safe_hours = timeline['safe_hours']
+        bands = timeline.get('bands')
+        with tracing.span("caffeine.update_results"):
+            self.update_results(caffeine_grams, caffeine_mg, safe_hours, safety_level, color, bands)
+        with tracing.span("caffeine.update_chart"):
+            self.update_chart(caffeine_grams, caffeine_mg, safe_hours, timeline['curve'], bands)
+        # Saved only when HEALTH_CALC_HISTORY is set; queued, never written here
+        from history import record
+        record('caffeine', {'dose_mg': caffeine_mg, 'hours_until_safe': safe_hours,
+                            'safety_level': safety_level})
+    
+    def show_error(self, error):
+        messagebox.showerror("Calculation Error", f"Could not calculate the timeline: {error}")
+    
+    def update_results(self, caffeine_grams, caffeine_mg, safe_hours, safety_level, color,
+                       bands=None):
+        # The label from setup_results is reused, one configure per result
+        result_text = caffeine_summary(caffeine_grams, caffeine_mg, safe_hours, safety_level, bands)
+        self.result_label.configure(text=result_text, foreground=color)
+    
+    def update_chart(self, caffeine_grams, caffeine_mg, safe_hours, curve=None, bands=None):
+        self.renderer.render(caffeine_grams, caffeine_mg, safe_hours, curve, bands)
+
+
+class SweepWindow:
+    # Every dose at every time of the day before bedtime as one heatmap
+    # (caffeine_engine.bedtime_sweep); a whole grid computes and redraws in
+    # a few tens of milliseconds, so it follows the controls directly
+    BEDTIMES = [f"{hour:02d}:{minute:02d}" for hour in (20, 21, 22, 23, 0, 1, 2)
+                for minute in (0, 30)]
+    
+    def __init__(self, parent):
+        self.window = tk.Toplevel(parent)
+        self.window.title("Caffeine: Doses and Bedtimes")
         
-        if caffeine_mg > 1000:
-            self.ax.ticklabel_format(style='plain', axis='y')
-            self.ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: format(int(x), ',')))
+        controls = ttk.Frame(self.window, padding="8")
+        controls.pack(fill=tk.X)
         
-        title_text = f'Caffeine Decay: {caffeine_grams:.3f}g → {safe_hours:.1f}h affect'
-        self.ax.set_title(title_text, fontsize=11, fontweight='bold', pad=10)
+        ttk.Label(controls, text="Bedtime:").pack(side=tk.LEFT)
+        self.bedtime_var = tk.StringVar(value="22:00")
+        bedtime_combobox = ttk.Combobox(controls, textvariable=self.bedtime_var,
+                                        values=self.BEDTIMES, width=6, state="readonly")
+        bedtime_combobox.pack(side=tk.LEFT, padx=(8, 15))
+        bedtime_combobox.bind('<<ComboboxSelected>>', self.draw)
         
-        self.ax.set_xlim(0, max_hours)
-        self.ax.set_ylim(0, caffeine_mg * 1.05)
-        self.ax.grid(True, alpha=0.2)
-        self.ax.legend(loc='upper right', fontsize=8, framealpha=0.9)
+        self.kind_var = tk.StringVar(value='level_mg')
+        for text, kind in (("Caffeine at bedtime", 'level_mg'),
+                           ("Hours awake after bedtime", 'hours_awake')):
+            ttk.Radiobutton(controls, text=text, variable=self.kind_var, value=kind,
+                            command=self.draw).pack(side=tk.LEFT, padx=(0, 10))
         
-        if max_hours <= 24:
-            self.ax.xaxis.set_major_locator(plt.MultipleLocator(2))
-        elif max_hours <= 72:
-            self.ax.xaxis.set_major_locator(plt.MultipleLocator(6))
-        else:
-            self.ax.xaxis.set_major_locator(plt.MultipleLocator(24))
+        chart_frame = ttk.Frame(self.window)
+        chart_frame.pack(fill=tk.BOTH, expand=True)
+        self.fig, self.ax, self.canvas, self.toolbar = create_chart(chart_frame)
         
-        self.fig.tight_layout(pad=2.0)
-        self.canvas.draw()
\ No newline at end of file
+        from charts import SweepChart, ChartRenderer
+        self.chart = SweepChart(self.ax, animated=True)
+        self.renderer = ChartRenderer(self.fig, self.canvas, self.chart)
+        self.draw()
+    
+    def draw(self, *args):
+        from caffeine_engine import bedtime_sweep
+        hours, minutes = (int(part) for part in self.bedtime_var.get().split(":"))
+        with tracing.span("caffeine.sweep"):
+            sweep = bedtime_sweep(hours + minutes / 60)
+        with tracing.span("caffeine.update_sweep_chart"):
+            self.renderer.render(sweep, self.kind_var.get())
@@ -0,0 +1,63 @@
+# Vectorized caffeine decay engine (no widgets, works on whole arrays)
+import numpy as np
+from constants import (CAFFEINE_HALF_LIFE, SLEEP_THRESHOLD_MG, LETHAL_DOSE_MG,
+                       DANGER_DOSE_MG, MAX_SAFE_DOSE_MG, MAX_HOURS_UNTIL_SAFE,
+                       SWEEP_DOSE_RANGE_MG, SWEEP_DOSES, SWEEP_STEP_MINUTES)
+
+# Safety levels ordered by dose, code 0 is the safest
+SAFETY_LEVELS = np.array(["SAFE RANGE", "HIGH DOSE", "EXTREMELY DANGEROUS", "LETHAL"])
+SAFETY_COLORS = np.array(["green", "orange", "darkred", "red"])
+_SAFETY_BOUNDS = np.array([MAX_SAFE_DOSE_MG, DANGER_DOSE_MG, LETHAL_DOSE_MG], dtype=float)
+
+
+def decay_factor(hours, half_life=CAFFEINE_HALF_LIFE):
+    # Fraction of a dose left after `hours`
+    return np.exp2(-np.asarray(hours, dtype=float) / half_life)
+
+
+def remaining_caffeine(doses_mg, hours, half_life=CAFFEINE_HALF_LIFE):
+    # Returns a (doses x hours) matrix; a scalar on either side drops that axis
+    doses = np.asarray(doses_mg, dtype=float)
+    return np.multiply.outer(doses, decay_factor(hours, half_life))
+
+
+def hours_until_safe(doses_mg, threshold_mg=SLEEP_THRESHOLD_MG,
+                     half_life=CAFFEINE_HALF_LIFE, max_hours=MAX_HOURS_UNTIL_SAFE):
+    # Closed form of dose * 0.5 ** (t / half_life) == threshold, solved for t
+    doses = np.asarray(doses_mg, dtype=float)
+    ratio = np.maximum(doses, threshold_mg) / threshold_mg
+    return np.minimum(half_life * np.log2(ratio), max_hours)
+
+
+def bedtime_sweep(bedtime, doses_mg=None, step_minutes=SWEEP_STEP_MINUTES,
+                  threshold_mg=SLEEP_THRESHOLD_MG, half_life=CAFFEINE_HALF_LIFE):
+    # Every dose taken at every intake time of the 24 hours before `bedtime`
+    # (clock hours), as (doses x intake times) matrices: caffeine left at
+    # bedtime and hours after bedtime until it is under the threshold.
+    # Intake times run from 24 hours before bedtime to `step_minutes` before;
+    # 'safe_hours' is hours_until_safe of every dose.
+    if doses_mg is None:
+        doses_mg = np.geomspace(*SWEEP_DOSE_RANGE_MG, SWEEP_DOSES)
+    doses = np.asarray(doses_mg, dtype=float)
+    steps = 24 * 60 // step_minutes
+    before_bed = np.arange(steps, 0, -1) * (step_minutes / 60)
+    safe_hours = hours_until_safe(doses, threshold_mg, half_life)
+    return {
+        'bedtime': bedtime,
+        'doses_mg': doses,
+        'hours_before_bed': before_bed,
+        'intake_hours': (bedtime - before_bed) % 24,
+        'safe_hours': safe_hours,
+        'level_mg': remaining_caffeine(doses, before_bed, half_life),
+        'hours_awake': np.maximum(np.subtract.outer(safe_hours, before_bed), 0)
+    }
+
+
+def safety_level_codes(doses_mg):
+    # Index into SAFETY_LEVELS / SAFETY_COLORS for every dose
+    return np.searchsorted(_SAFETY_BOUNDS, np.asarray(doses_mg, dtype=float), side='right')
+
+
+def classify_doses(doses_mg):
+    codes = safety_level_codes(doses_mg)
+    return SAFETY_LEVELS[codes], SAFETY_COLORS[codes]
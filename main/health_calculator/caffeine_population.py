@@ -0,0 +1,135 @@
+# Population mode for the caffeine calculator: how a dose affects different
+# people rather than one person with the average 5 hour half-life.
+#
+# Every virtual subject draws a half-life and an absorption lag (see
+# HALF_LIFE_DISTRIBUTION and ABSORPTION_LAG_DISTRIBUTION in constants.py).
+# A subject has no caffeine in the body until the lag has passed, then the
+# dose decays with the subject's half-life.
+#
+# Subjects are simulated a chunk at a time. Each chunk is folded into one
+# histogram per time point with LEVEL_BINS_PER_OCTAVE log-spaced bins of
+# level / dose, so memory is (time points x bins) however many subjects run,
+# and the percentile curves are read from those histograms. They are within
+# 1 / LEVEL_BINS_PER_OCTAVE of an octave (about 0.5%) of the exact
+# percentiles.
+#
+#   bands = simulate_population(200, np.arange(0, 24.5, 0.5))
+#   bands['levels'][0], bands['levels'][-1]    # 5th and 95th percentile curves
+#   bands['safe_hours']                        # same percentiles, hours until safe
+import numpy as np
+from constants import (SLEEP_THRESHOLD_MG, MAX_HOURS_UNTIL_SAFE, HALF_LIFE_DISTRIBUTION,
+                       ABSORPTION_LAG_DISTRIBUTION, POPULATION_SUBJECTS, POPULATION_PERCENTILES,
+                       POPULATION_SEED)
+
+LEVEL_BINS_PER_OCTAVE = 128
+# Levels below dose * 2 ** -LEVEL_OCTAVES (a millionth) share the lowest bin
+LEVEL_OCTAVES = 20
+# Upper bound for one chunk's work arrays
+CHUNK_BYTES = 8 * 1024 * 1024
+
+
+def sample(distribution, count, rng):
+    # `count` draws from a ('fixed' | 'uniform' | 'lognormal', ...) tuple
+    kind, *params = distribution
+    if kind == 'fixed':
+        return np.full(count, float(params[0]))
+    if kind == 'uniform':
+        low, high = params
+        return rng.uniform(low, high, count)
+    if kind == 'lognormal':
+        median, geometric_sd, low, high = params
+        values = median * np.exp(np.log(geometric_sd) * rng.standard_normal(count))
+        return np.clip(values, low, high, out=values)
+    raise ValueError(f"Unknown distribution: {kind}")
+
+
+def sample_subjects(count, rng=None, half_life=HALF_LIFE_DISTRIBUTION,
+                    lag=ABSORPTION_LAG_DISTRIBUTION):
+    # (half_lives, lags) in hours for `count` virtual subjects
+    rng = np.random.default_rng(rng)
+    return sample(half_life, count, rng), sample(lag, count, rng)
+
+
+def subject_levels(dose_mg, hours, half_lives, lags):
+    # (subjects x hours) matrix of caffeine left in mg
+    elapsed = np.asarray(hours, dtype=float) - np.asarray(lags, dtype=float)[:, None]
+    levels = dose_mg * np.exp2(-np.maximum(elapsed, 0) / np.asarray(half_lives)[:, None])
+    return np.where(elapsed >= 0, levels, 0.0)
+
+
+def subject_hours_until_safe(dose_mg, half_lives, lags, threshold_mg=SLEEP_THRESHOLD_MG,
+                             max_hours=MAX_HOURS_UNTIL_SAFE):
+    # caffeine_engine.hours_until_safe per subject, plus the subject's lag
+    if dose_mg <= threshold_mg:
+        return np.zeros(len(half_lives))
+    return np.minimum(lags + half_lives * np.log2(dose_mg / threshold_mg), max_hours)
+
+
+def level_histograms(hours, half_lives, lags, chunk_subjects=None):
+    # (hours x bins) subject counts. Bin 0 holds subjects whose caffeine
+    # hasn't been absorbed yet and the last bin those who have all of it
+    # (absorbed just now); bin k in between holds levels in
+    # dose * 2 ** ([k - 1, k) / LEVEL_BINS_PER_OCTAVE - LEVEL_OCTAVES)
+    hours = np.asarray(hours, dtype=float)
+    top = LEVEL_OCTAVES * LEVEL_BINS_PER_OCTAVE
+    bins = top + 2
+    if chunk_subjects is None:
+        # elapsed, position and index arrays of 8 bytes each
+        chunk_subjects = max(CHUNK_BYTES // (24 * max(hours.size, 1)), 1)
+
+    counts = np.zeros(hours.size * bins, dtype=np.int64)
+    offsets = np.arange(hours.size) * bins
+    for start in range(0, len(half_lives), chunk_subjects):
+        stop = start + chunk_subjects
+        elapsed = hours - lags[start:stop, None]
+        # Position of log2(level / dose) on the bin grid
+        position = (LEVEL_OCTAVES - elapsed / half_lives[start:stop, None]) * LEVEL_BINS_PER_OCTAVE
+        index = np.clip(np.floor(position), 0, top - 1).astype(np.int64) + 1
+        index[position >= top] = top + 1
+        index[elapsed < 0] = 0
+        index += offsets
+        counts += np.bincount(index.ravel(), minlength=counts.size)
+    return counts.reshape(hours.size, bins)
+
+
+def histogram_percentiles(counts, percentiles, dose_mg):
+    # (percentiles x hours) levels in mg, interpolated in log space within
+    # the bin a percentile falls in
+    last = counts.shape[1] - 1
+    cumulative = np.cumsum(counts, axis=1)
+    total = cumulative[:, -1]
+    rows = np.arange(counts.shape[0])
+    levels = np.empty((len(percentiles), counts.shape[0]))
+    for i, p in enumerate(percentiles):
+        target = total * (p / 100)
+        b = np.minimum((cumulative < target[:, None]).sum(axis=1), last)
+        in_bin = counts[rows, b]
+        fraction = (target - (cumulative[rows, b] - in_bin)) / np.maximum(in_bin, 1)
+        octaves = (b - 1 + fraction) / LEVEL_BINS_PER_OCTAVE - LEVEL_OCTAVES
+        levels[i] = np.where(b == last, dose_mg,
+                             np.where(b > 0, dose_mg * np.exp2(np.minimum(octaves, 0)), 0.0))
+    return levels
+
+
+def population_bands(dose_mg, hours, half_lives, lags, percentiles=POPULATION_PERCENTILES,
+                     chunk_subjects=None):
+    # Percentile curves and hours until safe for already sampled subjects
+    hours = np.asarray(hours, dtype=float)
+    counts = level_histograms(hours, half_lives, lags, chunk_subjects)
+    safe_hours = subject_hours_until_safe(dose_mg, half_lives, lags)
+    return {
+        'hours': hours,
+        'percentiles': tuple(percentiles),
+        'levels': histogram_percentiles(counts, percentiles, dose_mg),
+        'safe_hours': np.percentile(safe_hours, percentiles),
+        'subjects': len(half_lives)
+    }
+
+
+def simulate_population(dose_mg, hours, subjects=POPULATION_SUBJECTS, rng=POPULATION_SEED,
+                        percentiles=POPULATION_PERCENTILES, half_life=HALF_LIFE_DISTRIBUTION,
+                        lag=ABSORPTION_LAG_DISTRIBUTION, chunk_subjects=None):
+    # Samples `subjects` people and returns their population_bands; the same
+    # rng seed gives the same bands
+    half_lives, lags = sample_subjects(subjects, rng, half_life, lag)
+    return population_bands(dose_mg, hours, half_lives, lags, percentiles, chunk_subjects)
@@ -0,0 +1,126 @@
+# Multi-dose caffeine schedules for many users at once
+#
+# Decay is linear in the dose, so the body level of a whole schedule is the
+# sum of single-dose curves. On a uniform time grid that sum is a causal
+# convolution of a dose-impulse train with the decay kernel, which is solved
+# either with an FFT or with the equivalent one-step recurrence.
+import numpy as np
+from constants import CAFFEINE_HALF_LIFE, SLEEP_THRESHOLD_MG
+from caffeine_engine import decay_factor
+
+# Upper bound for one chunk's work array, keeps a 100k-user week in check
+CHUNK_BYTES = 64 * 1024 * 1024
+
+
+def _sort_events(user_ids, times, doses):
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    times = np.asarray(times, dtype=float)
+    doses = np.asarray(doses, dtype=float)
+    # Grouping by user is all the chunking needs; logs usually arrive grouped
+    if np.any(user_ids[1:] < user_ids[:-1]):
+        order = np.argsort(user_ids, kind='stable')
+        user_ids, times, doses = user_ids[order], times[order], doses[order]
+    return user_ids, times, doses
+
+
+def _impulse_train(user_ids, times, doses, first_user, n_users, start, step, n_steps, half_life):
+    # Each dose lands on the first grid point at or after it, pre-decayed by
+    # the gap, so grid values stay exact and not just rounded to the step
+    k = np.maximum(np.ceil((times - start) / step - 1e-9), 0).astype(np.int64)
+    keep = k < n_steps
+    k = k[keep]
+    weights = doses[keep] * decay_factor(start + k * step - times[keep], half_life)
+    flat = (user_ids[keep] - first_user) * n_steps + k
+    impulses = np.bincount(flat, weights=weights, minlength=n_users * n_steps)
+    return impulses.astype(float, copy=False).reshape(n_users, n_steps)
+
+
+def _convolve_fft(impulses, kernel):
+    n_steps = impulses.shape[1]
+    n_fft = 1 << int(np.ceil(np.log2(2 * n_steps)))
+    spectrum = np.fft.rfft(impulses, n_fft, axis=1) * np.fft.rfft(kernel, n_fft)
+    levels = np.fft.irfft(spectrum, n_fft, axis=1)[:, :n_steps]
+    # Round-off can leave tiny negatives where the true level is zero
+    return np.maximum(levels, 0.0, out=levels)
+
+
+def _convolve_recursive(impulses, ratio):
+    levels = np.array(impulses.T, order='C')
+    for k in range(1, levels.shape[0]):
+        levels[k] += ratio * levels[k - 1]
+    return levels.T
+
+
+def iter_schedule_chunks(user_ids, times, doses, n_users, start, stop, step=0.25,
+                         half_life=CAFFEINE_HALF_LIFE, method='recursive', chunk_users=None):
+    # Yields (first_user, levels) with levels shaped (users in chunk, grid points)
+    if method not in ('recursive', 'fft'):
+        raise ValueError(f"Unknown method: {method}")
+    user_ids, times, doses = _sort_events(user_ids, times, doses)
+    n_steps = int(round((stop - start) / step)) + 1
+    kernel = decay_factor(np.arange(n_steps) * step, half_life)
+    ratio = float(decay_factor(step, half_life))
+
+    if chunk_users is None:
+        row_bytes = 16 * n_steps * (2 if method == 'fft' else 1)
+        chunk_users = max(1, CHUNK_BYTES // row_bytes)
+
+    bounds = np.searchsorted(user_ids, np.arange(0, n_users + chunk_users, chunk_users))
+    for c, first_user in enumerate(range(0, n_users, chunk_users)):
+        count = min(chunk_users, n_users - first_user)
+        lo, hi = bounds[c], bounds[c + 1]
+        impulses = _impulse_train(user_ids[lo:hi], times[lo:hi], doses[lo:hi], first_user,
+                                  count, start, step, n_steps, half_life)
+        if method == 'fft':
+            yield first_user, _convolve_fft(impulses, kernel)
+        else:
+            yield first_user, _convolve_recursive(impulses, ratio)
+
+
+def simulate_schedules(user_ids, times, doses, n_users, start, stop, step=0.25,
+                       half_life=CAFFEINE_HALF_LIFE, method='recursive', dtype=np.float64):
+    # Body level for every user on the grid start, start + step, ..., stop (hours)
+    grid = start + np.arange(int(round((stop - start) / step)) + 1) * step
+    levels = np.empty((n_users, grid.size), dtype=dtype)
+    for first_user, chunk in iter_schedule_chunks(user_ids, times, doses, n_users, start, stop,
+                                                  step, half_life, method):
+        levels[first_user:first_user + chunk.shape[0]] = chunk
+    return grid, levels
+
+
+def sleep_safe_times(user_ids, times, doses, n_users, threshold_mg=SLEEP_THRESHOLD_MG,
+                     half_life=CAFFEINE_HALF_LIFE):
+    # First time after each user's last drink from which the level stays under
+    # the threshold. Nothing is added after the last drink, so the level only
+    # decays from there and the crossing has a closed form. NaN for no drinks.
+    user_ids, times, doses = _sort_events(user_ids, times, doses)
+    safe = np.full(n_users, np.nan)
+    if user_ids.size == 0:
+        return safe
+
+    group_start = np.flatnonzero(np.r_[True, user_ids[1:] != user_ids[:-1]])
+    last_time = np.full(n_users, np.nan)
+    last_time[user_ids[group_start]] = np.maximum.reduceat(times, group_start)
+
+    gap = last_time[user_ids] - times
+    level = np.bincount(user_ids, weights=doses * decay_factor(gap, half_life), minlength=n_users)
+    has_events = ~np.isnan(last_time)
+    ratio = np.maximum(level[has_events], threshold_mg) / threshold_mg
+    safe[has_events] = last_time[has_events] + half_life * np.log2(ratio)
+    return safe
+
+
+def simulate_schedule(events, start=None, stop=None, step=0.25, half_life=CAFFEINE_HALF_LIFE):
+    # Single user convenience wrapper; events is a list of (hour, dose_mg)
+    times = np.array([t for t, _ in events], dtype=float)
+    doses = np.array([d for _, d in events], dtype=float)
+    users = np.zeros(times.size, dtype=np.int64)
+    safe_time = float(sleep_safe_times(users, times, doses, 1, half_life=half_life)[0])
+    if start is None:
+        start = float(times.min()) if times.size else 0.0
+    if stop is None:
+        stop = start + 12.0
+        if times.size:
+            stop = max(stop, float(np.ceil(safe_time)))
+    grid, levels = simulate_schedules(users, times, doses, 1, start, stop, step, half_life)
+    return grid, levels[0], safe_time
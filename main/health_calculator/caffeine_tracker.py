@@ -0,0 +1,111 @@
+# Current caffeine level of many users, updated one drink at a time.
+#
+# Decay is exponential, so a level only needs to be known at one moment:
+# level(t) = level(t0) * 0.5 ** ((t - t0) / half_life). Each user keeps just
+# their level and the time it was taken (in hours, on any clock the caller
+# likes), so logging a drink costs the same with 1 or 10,000 earlier drinks.
+# The state of all users lives in two NumPy arrays indexed by a slot per
+# user (16 bytes per user), and population questions are one vectorized pass.
+# A new user's state starts at the time of their first drink, so any clock
+# works, including negative hours:
+#
+#   tracker = CaffeineTracker()
+#   tracker.add("ana", 95, at=8.0)
+#   tracker.add_many(["ana", "ben"], [63, 120], [13.5, 14.0])
+#   tracker.level("ana", at=22.0)
+#   tracker.above(at=22.0)        # users still over SLEEP_THRESHOLD_MG at 22:00
+import numpy as np
+from constants import CAFFEINE_HALF_LIFE, SLEEP_THRESHOLD_MG
+
+INITIAL_CAPACITY = 1024
+
+
+class CaffeineTracker:
+    def __init__(self, half_life=CAFFEINE_HALF_LIFE, capacity=INITIAL_CAPACITY):
+        self.half_life = half_life
+        self.slots = {}
+        self.users = []
+        self.levels = np.zeros(capacity)
+        self.times = np.zeros(capacity)
+
+    def __len__(self):
+        return len(self.users)
+
+    def __contains__(self, user_id):
+        return user_id in self.slots
+
+    def nbytes(self):
+        # Memory of the level and time arrays (the user dict comes on top)
+        return self.levels.nbytes + self.times.nbytes
+
+    def slot(self, user_id, at=0.0):
+        # The user's index into the state arrays, added on first sight with
+        # a level of 0 at time `at` (their first drink)
+        slot = self.slots.get(user_id)
+        if slot is None:
+            slot = len(self.users)
+            if slot == self.levels.size:
+                # Doubling keeps appends amortized O(1)
+                self.levels = np.concatenate((self.levels, np.zeros(slot)))
+                self.times = np.concatenate((self.times, np.zeros(slot)))
+            self.times[slot] = at
+            self.slots[user_id] = slot
+            self.users.append(user_id)
+        return slot
+
+    def _decay(self, hours):
+        return np.exp2(-np.asarray(hours, dtype=float) / self.half_life)
+
+    def add(self, user_id, dose_mg, at):
+        # One drink. A drink logged late (before the user's last update) is
+        # decayed forward to that update instead, which gives the same level.
+        slot = self.slot(user_id, at)
+        last = self.times[slot]
+        now = max(at, last)
+        self.levels[slot] = (self.levels[slot] * 2.0 ** (-(now - last) / self.half_life)
+                             + dose_mg * 2.0 ** (-(now - at) / self.half_life))
+        self.times[slot] = now
+
+    def add_many(self, user_ids, doses_mg, times):
+        # A batch of drinks in any order, users may repeat
+        slots = np.fromiter((self.slot(u, at) for u, at in zip(user_ids, times)),
+                            dtype=np.int64, count=len(user_ids))
+        self.add_slots(slots, doses_mg, times)
+
+    def add_slots(self, slots, doses_mg, times):
+        # add_many by slot. Every touched user moves to the later of their
+        # last update and their newest drink in the batch; the work is in
+        # proportion to the batch, not to the number of users.
+        slots = np.asarray(slots, dtype=np.int64)
+        times = np.asarray(times, dtype=float)
+        touched, position = np.unique(slots, return_inverse=True)
+        latest = self.times[touched]
+        np.maximum.at(latest, position, times)
+        self.levels[touched] *= self._decay(latest - self.times[touched])
+        self.times[touched] = latest
+        np.add.at(self.levels, slots, np.asarray(doses_mg, dtype=float)
+                  * self._decay(latest[position] - times))
+
+    def level(self, user_id, at):
+        # mg in the body at `at` (not before the user's last drink); 0 for
+        # users never seen
+        slot = self.slots.get(user_id)
+        if slot is None:
+            return 0.0
+        return float(self.levels[slot] * 2.0 ** (-(at - self.times[slot]) / self.half_life))
+
+    def levels_at(self, at):
+        # Level of every user at `at`, indexed by slot
+        n = len(self.users)
+        return self.levels[:n] * self._decay(at - self.times[:n])
+
+    def above(self, at, threshold_mg=SLEEP_THRESHOLD_MG):
+        # Users whose level at `at` is still over the threshold
+        return [self.users[slot] for slot in np.flatnonzero(self.levels_at(at) > threshold_mg)]
+
+    def safe_times(self, threshold_mg=SLEEP_THRESHOLD_MG):
+        # When each user (by slot) drops under the threshold if they drink
+        # nothing more; their last update time if already under it
+        n = len(self.users)
+        ratio = np.maximum(self.levels[:n], threshold_mg) / threshold_mg
+        return self.times[:n] + self.half_life * np.log2(ratio)
@@ -0,0 +1,525 @@
+# Persistent-artist charts for the calculators.
+# Each chart creates its lines, patches and texts once and updates them in
+# place. ChartRenderer decides per frame whether blitting the changed artists
+# is enough or the axes need a full, coalesced redraw, and keeps frame times.
+#
+#   python charts.py        # frame times on the Agg backend, no display needed
+import math
+import time
+from collections import deque
+
+import numpy as np
+from matplotlib import cm
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import LogNorm, Normalize
+from matplotlib.patches import Patch, Rectangle
+from matplotlib.ticker import FixedLocator, FuncFormatter, MultipleLocator, ScalarFormatter
+
+import core
+import tracing
+from constants import SLEEP_THRESHOLD_MG, POPULATION_PERCENTILES, SWEEP_DOSE_RANGE_MG
+
+FRAME_HISTORY = 240
+_NICE_STEPS = (1, 1.2, 1.5, 2, 2.5, 3, 4, 5, 6, 8, 10)
+
+
+def nice_ceiling(value):
+    # Round an axis limit up to a 1-1.2-1.5-2-...-10 step so small input
+    # changes keep the same limits and only the data artists need redrawing
+    if not value > 0:
+        return 1.0
+    magnitude = 10 ** math.floor(math.log10(value))
+    for step in _NICE_STEPS:
+        if step * magnitude >= value:
+            return step * magnitude
+    return 10 * magnitude
+
+
+def caffeine_timeline(safe_hours):
+    # Returns (max_hours, time_step, tick_step) for the decay chart
+    if safe_hours < 12:
+        max_hours = 12
+    elif safe_hours < 24:
+        max_hours = safe_hours + 4
+    elif safe_hours < 48:
+        max_hours = safe_hours + 8
+    else:
+        max_hours = safe_hours + 12
+
+    max_hours = min(max_hours, 168)
+
+    if max_hours <= 24:
+        time_step, tick_step = 0.5, 2
+    elif max_hours <= 72:
+        time_step, tick_step = 1, 6
+    else:
+        time_step, tick_step = 2, 24
+
+    # Whole multiples of a few samples keep the x limits stable while typing
+    bucket = time_step * 4
+    max_hours = min(math.ceil(max_hours / bucket) * bucket, 168)
+    return max_hours, time_step, tick_step
+
+
+def caffeine_curve(caffeine_mg, safe_hours):
+    # (hours, caffeine left in mg) sampled over the chart's time range
+    max_hours, time_step, _ = caffeine_timeline(safe_hours)
+    hours = np.arange(int(max_hours/time_step) + 1) * time_step
+    return hours, core.calculate_remaining_caffeine(caffeine_mg, hours)
+
+
+def protein_distribution(daily_protein, goal):
+    # ProteinChart.update arguments: the daily protein split over four meals
+    meals = ['Breakfast', 'Lunch', 'Dinner', 'Snack']
+    title = f'Daily Protein Distribution: {daily_protein:.1f}g total\n({goal})'
+    return [daily_protein / 4] * 4, meals, goal, title
+
+
+class CaffeineChart:
+    tight_layout_kwargs = {'pad': 2.0}
+
+    def __init__(self, ax, animated=False):
+        self.ax = ax
+        self.layout_key = None
+
+        self.line, = ax.plot([], [], 'b-', linewidth=2, label='Caffeine in body',
+                             animated=animated)
+        self.threshold_line = ax.axhline(y=SLEEP_THRESHOLD_MG, color='r', linestyle='--',
+                                         linewidth=1.5, label=f'Sleep threshold ({SLEEP_THRESHOLD_MG}mg)')
+        self.safe_line = ax.axvline(x=0, color='g', linestyle=':', linewidth=1.5,
+                                    label='Safe to sleep', animated=animated)
+        self.title = ax.set_title('', fontsize=11, fontweight='bold', pad=10)
+        self.title.set_animated(animated)
+        self.legend = None
+        self.animated = animated
+
+        # Population percentile bands (caffeine_population.py), outermost
+        # first; hidden unless update() gets bands
+        self.bands = []
+        pairs = len(POPULATION_PERCENTILES) // 2
+        for i in range(pairs):
+            low, high = POPULATION_PERCENTILES[i], POPULATION_PERCENTILES[-1 - i]
+            band = PolyCollection([], facecolor='b', edgecolor='none', alpha=0.12 + 0.1 * i,
+                                  label=f'{high - low:g}% of people', animated=animated)
+            band.set_visible(False)
+            ax.add_collection(band, autolim=False)
+            self.bands.append(band)
+
+        ax.set_xlabel('Hours after consumption', fontsize=9)
+        ax.set_ylabel('Caffeine (mg)', fontsize=9)
+        ax.grid(True, alpha=0.2)
+        self._thousands = FuncFormatter(lambda x, p: format(int(x), ','))
+
+    def animated_artists(self):
+        artists = [*self.bands, self.line, self.safe_line, self.title]
+        if self.legend is not None:
+            artists.append(self.legend)
+        return artists
+
+    def update(self, caffeine_grams, caffeine_mg, safe_hours, curve=None, bands=None):
+        # `curve` is caffeine_curve(caffeine_mg, safe_hours) if already known.
+        # `bands` (caffeine_population.population_bands) shades the spread
+        # between people; the time axis then also covers the slowest of them.
+        span = safe_hours if bands is None else max(safe_hours, bands['safe_hours'][-1])
+        max_hours, time_step, tick_step = caffeine_timeline(span)
+        self.line.set_data(*(curve or caffeine_curve(caffeine_mg, span)))
+
+        show_safe = safe_hours <= max_hours
+        self.safe_line.set_xdata([safe_hours, safe_hours])
+        self.safe_line.set_visible(show_safe)
+        title = f'Caffeine Decay: {caffeine_grams:.3f}g → {safe_hours:.1f}h affect'
+        show_bands = bands is not None
+        if show_bands:
+            hours, levels = bands['hours'], bands['levels']
+            for i, band in enumerate(self.bands):
+                outline = np.concatenate((np.column_stack((hours, levels[i])),
+                                          np.column_stack((hours, levels[-1 - i]))[::-1]))
+                band.set_verts([outline])
+            low, high = bands['safe_hours'][0], bands['safe_hours'][-1]
+            title += f'\n({low:.1f}–{high:.1f}h for {self.bands[0].get_label()})'
+        for band in self.bands:
+            band.set_visible(show_bands)
+        self.title.set_text(title)
+
+        y_top = nice_ceiling(caffeine_mg * 1.05)
+        thousands = caffeine_mg > 1000
+        layout_key = (max_hours, tick_step, y_top, thousands, show_safe, show_bands)
+        if layout_key != self.layout_key:
+            self.ax.set_xlim(0, max_hours)
+            self.ax.set_ylim(0, y_top)
+            self.ax.xaxis.set_major_locator(MultipleLocator(tick_step))
+            if thousands:
+                self.ax.yaxis.set_major_formatter(self._thousands)
+            else:
+                self.ax.yaxis.set_major_formatter(ScalarFormatter())
+
+            handles = [self.line, self.threshold_line]
+            if show_bands:
+                handles.extend(self.bands)
+            if show_safe:
+                handles.append(self.safe_line)
+            if self.legend is not None:
+                self.legend.remove()
+            self.legend = self.ax.legend(handles=handles, loc='upper right', fontsize=8,
+                                         framealpha=0.9)
+            self.legend.set_animated(self.animated)
+            self.layout_key = layout_key
+
+        if show_safe:
+            self.legend.get_texts()[-1].set_text(f'Safe to sleep ({safe_hours:.1f}h)')
+        return layout_key
+
+
+class ProteinChart:
+    tight_layout_kwargs = {'pad': 2.0}
+
+    # Colors based on goal
+    COLORS = {
+        "Maintenance": ['#ff9999', '#66b3ff', '#99ff99', '#ffcc99'],
+        "Muscle Building": ['#ff6b6b', '#4ecdc4', '#45b7d1', '#96ceb4'],
+        "Fat Loss": ['#ff9ff3', '#f368e0', '#ff9f43', '#ee5253']
+    }
+
+    def __init__(self, ax, animated=False, value_format='{:.1f}g'):
+        # Wedges are labeled with their value (grams of protein), not the
+        # percentage Axes.pie would print
+        self.ax = ax
+        self.animated = animated
+        self.value_format = value_format
+        self.layout_key = None
+        self.wedges, self.texts, self.autotexts = [], [], []
+        self.title = ax.set_title('', fontsize=11, fontweight='bold', pad=20)
+        self.title.set_animated(animated)
+
+    def animated_artists(self):
+        return self.wedges + self.texts + self.autotexts + [self.title]
+
+    def _build(self, labels, colors):
+        for artist in self.animated_artists()[:-1]:
+            artist.remove()
+        wedges, texts, autotexts = self.ax.pie([1] * len(labels), labels=labels, colors=colors,
+                                               autopct=lambda pct: '', startangle=90)
+        for autotext in autotexts:
+            autotext.set_color('white')
+            autotext.set_fontweight('bold')
+        for artist in (*wedges, *texts, *autotexts):
+            artist.set_animated(self.animated)
+        self.wedges, self.texts, self.autotexts = list(wedges), list(texts), list(autotexts)
+
+    def update(self, values, labels, goal, title):
+        colors = self.COLORS.get(goal, self.COLORS["Maintenance"])
+        layout_key = tuple(labels)
+        if layout_key != self.layout_key:
+            self._build(labels, colors)
+            self.layout_key = layout_key
+
+        # Same geometry as Axes.pie: counterclockwise from 90 degrees
+        fractions = np.asarray(values, dtype=float) / np.sum(values)
+        bounds = 90 + 360 * np.concatenate(([0.0], np.cumsum(fractions)))
+        for i, wedge in enumerate(self.wedges):
+            wedge.set_theta1(bounds[i])
+            wedge.set_theta2(bounds[i + 1])
+            wedge.set_facecolor(colors[i % len(colors)])
+
+            middle = np.deg2rad((bounds[i] + bounds[i + 1]) / 2)
+            x, y = math.cos(middle), math.sin(middle)
+            self.texts[i].set_position((1.1 * x, 1.1 * y))
+            self.texts[i].set_horizontalalignment('left' if x > 0 else 'right')
+            self.autotexts[i].set_position((0.6 * x, 0.6 * y))
+            self.autotexts[i].set_text(self.value_format.format(values[i]))
+
+        self.title.set_text(title)
+        return layout_key
+
+
+class MealPlanChart:
+    tight_layout_kwargs = {}
+
+    def __init__(self, ax, animated=False):
+        self.ax = ax
+        self.animated = animated
+        self.layout_key = None
+        self.bars = []
+        self.legend = None
+
+        self.empty_text = ax.text(0.5, 0.5, 'No meal data available', ha='center', va='center',
+                                  transform=ax.transAxes, visible=False)
+        ax.set_xlabel('Meals')
+        ax.set_ylabel('Protein (g)')
+        ax.set_title('Protein Distribution Across Meals', fontsize=11, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+
+    def animated_artists(self):
+        return list(self.bars)
+
+    def _ensure_bars(self, count):
+        # Bars are pooled and only ever added; unused ones are hidden
+        while len(self.bars) < count:
+            bar = Rectangle((0, 0), 0.8, 0, animated=self.animated)
+            self.ax.add_patch(bar)
+            self.bars.append(bar)
+
+    def update(self, meal_plan):
+        meals = meal_plan['meals']
+
+        # Foods in order of first appearance, protein per (food, meal)
+        foods = []
+        for meal in meals:
+            for food in meal['foods']:
+                if food['name'] not in foods:
+                    foods.append(food['name'])
+        protein = np.zeros((len(foods), len(meals)))
+        for j, meal in enumerate(meals):
+            for food in meal['foods']:
+                protein[foods.index(food['name']), j] = food['protein']
+
+        colors = cm.Set3(np.linspace(0, 1, len(foods)))
+        bottoms = np.vstack([np.zeros(len(meals)), np.cumsum(protein, axis=0)[:-1]]) if foods else protein
+        self._ensure_bars(protein.size)
+        for k, bar in enumerate(self.bars):
+            if k < protein.size:
+                i, j = divmod(k, len(meals))
+                bar.set_bounds(j - 0.4, bottoms[i, j], 0.8, protein[i, j])
+                bar.set_facecolor(colors[i])
+                bar.set_visible(protein[i, j] > 0)
+            else:
+                bar.set_visible(False)
+
+        meal_names = tuple(meal['name'] for meal in meals)
+        y_top = nice_ceiling(protein.sum(axis=0).max() * 1.05) if foods else 1.0
+        layout_key = (meal_names, tuple(foods), y_top)
+        if layout_key != self.layout_key:
+            self.empty_text.set_visible(not meals)
+            self.ax.set_xticks(range(len(meal_names)))
+            self.ax.set_xticklabels(meal_names, rotation=45, ha='right')
+            self.ax.set_xlim(-0.6, max(len(meal_names), 1) - 0.4)
+            self.ax.set_ylim(0, y_top)
+            if self.legend is not None:
+                self.legend.remove()
+                self.legend = None
+            if foods:
+                handles = [Patch(facecolor=color, label=food) for food, color in zip(foods, colors)]
+                self.legend = self.ax.legend(handles=handles, bbox_to_anchor=(1.05, 1),
+                                             loc='upper left', fontsize=8)
+            self.layout_key = layout_key
+        return layout_key
+
+
+class SweepChart:
+    # caffeine_engine.bedtime_sweep as one image: hours before bedtime
+    # across, dose up (log scale), colored by caffeine at bedtime or by hours
+    # kept awake. The line marks where a dose just wears off by bedtime.
+    # Decay doesn't depend on the time of day, so the bedtime only changes the
+    # clock times along the top; they are animated texts, and changing the
+    # bedtime just blits. The grid is colored once per update into an RGBA
+    # image, so draws only copy pixels; the colorbar has a mappable of its
+    # own and plain-text ticks (mathtext labels dominated the full draw), and
+    # the margins are fixed, so switching the kind skips tight_layout.
+    tight_layout_kwargs = None
+    MARGINS = {'left': 0.1, 'right': 0.97, 'bottom': 0.12, 'top': 0.86}
+    DOSE_TICKS = (10, 30, 100, 300, 1000, 3000, 10000)
+    LEVEL_TICKS = (1, 10, 100, 1000, 10000)
+    HOUR_TICKS = tuple(range(-24, 0, 3))
+    KINDS = {
+        'level_mg': ('Caffeine at bedtime (mg)', 'magma',
+                     LogNorm(vmin=1, vmax=SWEEP_DOSE_RANGE_MG[1])),
+        'hours_awake': ('Hours awake after bedtime', 'viridis', None),
+    }
+
+    def __init__(self, ax, animated=False):
+        self.ax = ax
+        self.animated = animated
+        self.layout_key = None
+
+        self.image = ax.imshow(np.zeros((2, 2, 4), dtype=np.uint8), origin='lower', aspect='auto',
+                               interpolation='nearest', animated=animated)
+        self.scale = cm.ScalarMappable()
+        self.boundary, = ax.plot([], [], color='c', linewidth=1.5,
+                                 label=f'{SLEEP_THRESHOLD_MG}mg left at bedtime', animated=animated)
+        self.title = ax.set_title('', fontsize=11, fontweight='bold', pad=18)
+        self.clock_labels = [ax.text(x, 1.01, '', transform=ax.get_xaxis_transform(), ha='center',
+                                     va='bottom', fontsize=8, color='dimgray', animated=animated)
+                             for x in self.HOUR_TICKS]
+        self.title.set_animated(animated)
+        self.colorbar = ax.figure.colorbar(self.scale, ax=ax)
+        self.legend = ax.legend(handles=[self.boundary], loc='upper left', fontsize=8,
+                                framealpha=0.9)
+        self.legend.set_animated(animated)
+        ax.figure.subplots_adjust(**self.MARGINS)
+
+        ax.set_xlabel('Hours before bedtime', fontsize=9)
+        ax.set_ylabel('Dose', fontsize=9)
+        ax.yaxis.set_major_locator(FixedLocator(np.log10(self.DOSE_TICKS)))
+        ax.yaxis.set_major_formatter(FuncFormatter(lambda y, p: self.format_mg(10 ** y)))
+        ax.xaxis.set_major_locator(FixedLocator(self.HOUR_TICKS))
+        ax.xaxis.set_major_formatter(FuncFormatter(lambda x, p: f'{-x:g}h'))
+
+    def animated_artists(self):
+        return [self.image, self.boundary, self.legend, self.title, *self.clock_labels]
+
+    def update(self, sweep, kind='level_mg'):
+        label, cmap, norm = self.KINDS[kind]
+        values = sweep[kind]
+        before_bed = sweep['hours_before_bed']
+        log_doses = np.log10(sweep['doses_mg'])
+
+        # Pixel edges half a step beyond the first and last samples
+        x_step = before_bed[0] - before_bed[1] if before_bed.size > 1 else 1.0
+        y_step = log_doses[1] - log_doses[0] if log_doses.size > 1 else 1.0
+        extent = (-before_bed[0] - x_step / 2, -before_bed[-1] + x_step / 2,
+                  log_doses[0] - y_step / 2, log_doses[-1] + y_step / 2)
+        if norm is None:
+            norm = Normalize(vmin=0, vmax=max(float(values.max()), 1.0))
+        layout_key = (kind, extent, norm.vmax)
+        if layout_key != self.layout_key:
+            self.scale.set_cmap(cmap)
+            self.scale.set_norm(norm)
+            # A new norm resets the colorbar's ticks
+            if kind == 'level_mg':
+                self.colorbar.set_ticks(self.LEVEL_TICKS)
+                self.colorbar.formatter = FuncFormatter(lambda v, p: self.format_mg(v))
+                self.colorbar.minorticks_off()
+            self.colorbar.set_label(label, fontsize=9)
+            self.image.set_extent(extent)
+            self.ax.set_xlim(extent[0], extent[1])
+            self.ax.set_ylim(extent[2], extent[3])
+            self.layout_key = layout_key
+        self.image.set_data(self.scale.to_rgba(values, bytes=True))
+
+        # Each dose is just under the threshold at bedtime when taken its
+        # hours until safe before
+        self.boundary.set_data(-sweep['safe_hours'], log_doses)
+        bedtime = sweep['bedtime']
+        self.title.set_text(f'{label} for a {self.clock(bedtime)} bedtime')
+        for x, text in zip(self.HOUR_TICKS, self.clock_labels):
+            text.set_text(self.clock(bedtime + x))
+        return layout_key
+
+    @staticmethod
+    def format_mg(mg):
+        return f'{mg / 1000:g}g' if mg >= 1000 else f'{mg:.0f}mg'
+
+    @staticmethod
+    def clock(hours):
+        minutes = round(hours * 60) % (24 * 60)
+        return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+class ChartRenderer:
+    # Full redraws go through draw_idle, so bursts of updates coalesce into one
+    # paint, and tight_layout only runs when the chart's layout key changes
+    # (never for charts with fixed margins, whose tight_layout_kwargs is
+    # None). Everything else restores the cached background and blits the
+    # animated artists. The first full draw is also kept on its own, since it
+    # includes loading fonts and caching glyphs.
+    def __init__(self, fig, canvas, chart, blit=True):
+        self.fig = fig
+        self.canvas = canvas
+        self.chart = chart
+        self.blit = blit and canvas.supports_blit
+        self.background = None
+        self.layout_key = None
+        self.frame_times = {'blit': deque(maxlen=FRAME_HISTORY),
+                            'full': deque(maxlen=FRAME_HISTORY),
+                            'first': deque(maxlen=1)}
+        self._pending_full = None
+        canvas.mpl_connect('draw_event', self._on_draw)
+
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        with tracing.span("chart.update", chart=type(self.chart).__name__):
+            layout_key = self.chart.update(*args, **kwargs)
+
+        if layout_key != self.layout_key or self.background is None or not self.blit:
+            if layout_key != self.layout_key:
+                if self.chart.tight_layout_kwargs is not None:
+                    with tracing.span("chart.tight_layout"):
+                        self.fig.tight_layout(**self.chart.tight_layout_kwargs)
+                self.layout_key = layout_key
+            if self._pending_full is None:
+                self._pending_full = start
+            self.canvas.draw_idle()
+            return
+
+        with tracing.span("chart.blit", chart=type(self.chart).__name__):
+            self.canvas.restore_region(self.background)
+            self._draw_animated()
+            self.canvas.blit(self.fig.bbox)
+        self.frame_times['blit'].append((time.perf_counter() - start) * 1000)
+
+    def _draw_animated(self):
+        for artist in self.chart.animated_artists():
+            if artist.get_visible():
+                self.fig.draw_artist(artist)
+
+    def _on_draw(self, event):
+        if self.blit:
+            self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+            self._draw_animated()
+        if self._pending_full is not None:
+            # Request to finished paint, so the draw_idle wait is included
+            end = time.perf_counter()
+            kind = 'full' if self.frame_times['first'] else 'first'
+            self.frame_times[kind].append((end - self._pending_full) * 1000)
+            tracing.record("chart.full_draw", self._pending_full, end,
+                           chart=type(self.chart).__name__)
+            self._pending_full = None
+
+    def frame_stats(self):
+        # Milliseconds per frame kind: count, mean, p50, p95 and max
+        stats = {}
+        for kind, times in self.frame_times.items():
+            if times:
+                values = np.fromiter(times, dtype=float)
+                stats[kind] = {
+                    'count': len(values),
+                    'mean_ms': float(values.mean()),
+                    'p50_ms': float(np.percentile(values, 50)),
+                    'p95_ms': float(np.percentile(values, 95)),
+                    'max_ms': float(values.max()),
+                }
+        return stats
+
+
+def _sample_updates(frames):
+    # Inputs that mimic typing in a dose, clicking weights, regenerating plans
+    # and picking bedtimes
+    doses = np.linspace(180, 220, frames)
+    caffeine = [(mg / 1000, mg, core.hours_until_safe(mg)) for mg in doses]
+    protein = []
+    for weight in np.linspace(68, 72, frames):
+        needs = core.calculate_protein_requirements(weight, "Moderate Exercise", "Muscle Building")
+        protein.append(protein_distribution(needs["daily_protein"], "Muscle Building"))
+    plans = [(core.create_meal_plan("Mixed", core.daily_protein_target(weight), 4),)
+             for weight in np.linspace(68, 72, frames)]
+    from caffeine_engine import bedtime_sweep
+    # Switching between the two views every 10 frames redraws in full
+    sweeps = [(bedtime_sweep(bedtime), 'hours_awake' if i // 10 % 2 else 'level_mg')
+              for i, bedtime in enumerate(np.linspace(21, 23, frames))]
+    return {'caffeine': (CaffeineChart, caffeine),
+            'protein': (ProteinChart, protein),
+            'meal': (MealPlanChart, plans),
+            'sweep': (SweepChart, sweeps)}
+
+
+def measure_frame_times(frames=60, figsize=(8, 4), dpi=80):
+    # Renders every chart `frames` times on the Agg backend
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    results = {}
+    for name, (chart_class, updates) in _sample_updates(frames).items():
+        fig = Figure(figsize=figsize, dpi=dpi)
+        canvas = FigureCanvasAgg(fig)
+        renderer = ChartRenderer(fig, canvas, chart_class(fig.add_subplot(), animated=True))
+        for args in updates:
+            renderer.render(*args)
+        results[name] = renderer.frame_stats()
+    return results
+
+
+if __name__ == "__main__":
+    for name, stats in measure_frame_times().items():
+        for kind, s in stats.items():
+            print(f"{name:<10}{kind:<6}{s['count']:>5} frames  mean {s['mean_ms']:6.2f} ms  "
+                  f"p95 {s['p95_ms']:6.2f} ms  max {s['max_ms']:6.2f} ms")
@@ -0,0 +1,307 @@
+# Headless entry point: JSON-lines requests in, JSON-lines results out.
+#
+# Every input line is one request for one of the calculators:
+#
+#   {"id": 1, "type": "caffeine", "dose": 0.2, "unit": "grams"}
+#   {"id": 2, "type": "protein", "weight": 70, "unit": "kg",
+#    "activity": "Athlete", "goal": "Maintenance"}
+#   {"id": 3, "type": "meal", "user_id": "m42", "weight": 68, "diet": "Vegetarian"}
+#
+# Missing fields take the GUI's defaults. Units are those of
+# constants.DOSE_UNITS_MG and WEIGHT_UNITS_KG. Lines are read in batches. The
+# caffeine and protein requests of a batch are computed together on NumPy
+# arrays, and meal plans go to a worker pool (seeded per user, as in
+# cohort.py). Results are written in input order. Only a fixed number of
+# batches are in flight, so memory stays flat whatever the input size.
+#
+#   python cli.py requests.jsonl -o results.jsonl --workers 8
+#   cat requests.jsonl | python cli.py - > results.jsonl
+#   python cli.py requests.jsonl -o results.jsonl --history history.db
+import argparse
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import caffeine_engine
+import cohort
+import core
+import tracing
+from constants import BASE_PROTEIN, GOAL_MULTIPLIER
+
+DEFAULT_BATCH_SIZE = 4096
+# Batches waiting on meal plans per worker before we wait for the oldest one
+BATCHES_IN_FLIGHT_PER_WORKER = 2
+
+# Same defaults as the calculator tabs
+DEFAULT_CAFFEINE = {'dose': 0.2, 'unit': "grams"}
+DEFAULT_PROTEIN = {'weight': 70, 'unit': "kg", 'activity': "Moderate Exercise",
+                   'goal': "Muscle Building"}
+# The Meal Planner tab's weight; the other meal fields default in cohort.read_profile
+DEFAULT_MEAL = {'weight': 68}
+
+
+def _error(request, message):
+    return {'id': request.get('id'), 'type': request.get('type'), 'error': message}
+
+
+def caffeine_batch(requests):
+    # Results for a list of caffeine requests, computed as arrays
+    results = [None] * len(requests)
+    valid, doses = [], []
+    for i, request in enumerate(requests):
+        try:
+            dose = core.to_mg(float(request.get('dose', DEFAULT_CAFFEINE['dose'])),
+                              request.get('unit', DEFAULT_CAFFEINE['unit']))
+            if not (dose >= 0 and math.isfinite(dose)):
+                raise ValueError("dose must be a non-negative number")
+        except (TypeError, ValueError) as e:
+            results[i] = _error(request, str(e))
+            continue
+        valid.append(i)
+        doses.append(dose)
+
+    doses = np.array(doses, dtype=float)
+    hours = caffeine_engine.hours_until_safe(doses).tolist()
+    levels = caffeine_engine.SAFETY_LEVELS[caffeine_engine.safety_level_codes(doses)].tolist()
+    for i, dose, safe_hours, level in zip(valid, doses.tolist(), hours, levels):
+        results[i] = {'id': requests[i].get('id'), 'type': 'caffeine', 'dose_mg': dose,
+                      'hours_until_safe': safe_hours, 'safety_level': level}
+    return results
+
+
+def protein_batch(requests):
+    # Results for a list of protein requests, computed as arrays
+    results = [None] * len(requests)
+    valid, weights, factors = [], [], []
+    for i, request in enumerate(requests):
+        try:
+            weight = core.to_kg(float(request.get('weight', DEFAULT_PROTEIN['weight'])),
+                                request.get('unit', DEFAULT_PROTEIN['unit']))
+            if not (weight > 0 and math.isfinite(weight)):
+                raise ValueError("weight must be a positive number")
+            activity = request.get('activity', DEFAULT_PROTEIN['activity'])
+            goal = request.get('goal', DEFAULT_PROTEIN['goal'])
+            if activity not in BASE_PROTEIN:
+                raise ValueError(f"unknown activity: {activity}")
+            if goal not in GOAL_MULTIPLIER:
+                raise ValueError(f"unknown goal: {goal}")
+        except (TypeError, ValueError) as e:
+            results[i] = _error(request, str(e))
+            continue
+        valid.append(i)
+        weights.append(weight)
+        factors.append(BASE_PROTEIN[activity] * GOAL_MULTIPLIER[goal])
+
+    weights = np.array(weights, dtype=float)
+    factors = np.array(factors, dtype=float)
+    daily = (weights * factors).tolist()
+    for i, weight_kg, per_kg, protein in zip(valid, weights.tolist(), factors.tolist(), daily):
+        results[i] = {'id': requests[i].get('id'), 'type': 'protein', 'daily_protein': protein,
+                      'protein_per_kg': per_kg, 'weight_kg': weight_kg}
+    return results
+
+
+def meal_batch(requests, seed=0, variety=0.0, cache=None, cached_only=False):
+    # Meal plans for a list of meal requests (runs in the worker processes;
+    # see cohort.plan_for_profile for `cache` and `cached_only`). A bad
+    # request gives an error record, never an exception.
+    results = []
+    for request in requests:
+        result = cohort.plan_for_profile({**DEFAULT_MEAL, **request}, seed, variety, cache,
+                                         cached_only)
+        if result is not None:
+            result = {'id': request.get('id'), 'type': 'meal', **result}
+        results.append(result)
+    return results
+
+
+def _parse(line):
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        return {'error': f"invalid JSON: {e}"}
+    if not isinstance(request, dict):
+        return {'error': "request must be a JSON object"}
+    return request
+
+
+def _parse_lines(lines):
+    # One json.loads call for the whole batch; line by line only if some
+    # line is invalid
+    try:
+        requests = json.loads("[" + ",".join(lines) + "]")
+    except ValueError:
+        return [_parse(line) for line in lines]
+    if len(requests) != len(lines):
+        # A line held several comma-separated values
+        return [_parse(line) for line in lines]
+    return [request if isinstance(request, dict) else {'error': "request must be a JSON object"}
+            for request in requests]
+
+
+def _split_batch(lines):
+    # Parsed requests grouped by type, with their positions in the batch
+    results = [None] * len(lines)
+    groups = {'caffeine': ([], []), 'protein': ([], []), 'meal': ([], [])}
+    for i, request in enumerate(_parse_lines(lines)):
+        kind = request.get('type')
+        if 'error' in request and kind is None:
+            results[i] = {'id': None, 'type': None, 'error': request['error']}
+        elif kind not in groups:
+            results[i] = _error(request, f"unknown request type: {kind}")
+        else:
+            positions, requests = groups[kind]
+            positions.append(i)
+            requests.append(request)
+    return results, groups
+
+
+def _fill(results, positions, values):
+    for i, value in zip(positions, values):
+        results[i] = value
+
+
+def _lines(source, batch_size):
+    # Non-blank lines, batch_size at a time
+    lines = (line for line in source if line.strip())
+    while True:
+        batch = list(itertools.islice(lines, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_result_batches(source, workers=1, batch_size=DEFAULT_BATCH_SIZE, seed=0, variety=0.0):
+    # Yields lists of result dicts, one per non-blank input line, in input
+    # order. `workers` > 1 computes meal plans in that many processes.
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(workers, initializer=cohort.init_worker)
+    window = max(workers, 1) * BATCHES_IN_FLIGHT_PER_WORKER
+    pending = deque()
+
+    def finish(results, positions, meals):
+        if meals is not None:
+            _fill(results, positions, meals.result() if executor else meals)
+        return results
+
+    try:
+        for lines in _lines(source, batch_size):
+            with tracing.span("cli.parse", lines=len(lines)):
+                results, groups = _split_batch(lines)
+            for kind, compute in (('caffeine', caffeine_batch), ('protein', protein_batch)):
+                positions, requests = groups[kind]
+                if requests:
+                    with tracing.span(f"cli.{kind}", requests=len(requests)):
+                        _fill(results, positions, compute(requests))
+
+            positions, requests = groups['meal']
+            meals = None
+            if requests:
+                if executor:
+                    meals = executor.submit(meal_batch, requests, seed, variety)
+                else:
+                    with tracing.span("cli.meal", requests=len(requests)):
+                        meals = meal_batch(requests, seed, variety)
+            pending.append((results, positions, meals))
+            while len(pending) > window or (pending and executor is None):
+                yield finish(*pending.popleft())
+        while pending:
+            yield finish(*pending.popleft())
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_results(source, workers=1, batch_size=DEFAULT_BATCH_SIZE, seed=0, variety=0.0):
+    for results in iter_result_batches(source, workers, batch_size, seed, variety):
+        yield from results
+
+
+_encode = json.JSONEncoder().encode
+
+
+def encode_result(result):
+    # One output line. Caffeine and protein results are formatted directly
+    # (floats use repr, as json does), which is about twice as fast as the
+    # generic encoder; everything else goes through json.
+    kind = result.get('type')
+    if 'error' in result or kind not in ('caffeine', 'protein'):
+        return _encode(result)
+    request_id = result['id']
+    if type(request_id) is not int:
+        request_id = _encode(request_id)
+    if kind == 'caffeine':
+        return (f'{{"id": {request_id}, "type": "caffeine", "dose_mg": {result["dose_mg"]!r}, '
+                f'"hours_until_safe": {result["hours_until_safe"]!r}, '
+                f'"safety_level": "{result["safety_level"]}"}}')
+    return (f'{{"id": {request_id}, "type": "protein", '
+            f'"daily_protein": {result["daily_protein"]!r}, '
+            f'"protein_per_kg": {result["protein_per_kg"]!r}, "weight_kg": {result["weight_kg"]!r}}}')
+
+
+def record_batch(store, results, lines):
+    # Queues a batch's results (without errors) on a history.HistoryStore,
+    # reusing the output lines as the stored JSON
+    from history import headline_value
+
+    now = time.time()
+    store.record_many([(now, result.get('user_id'), result['type'],
+                        headline_value(result['type'], result), line)
+                       for result, line in zip(results, lines) if 'error' not in result])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run caffeine, protein and meal-plan requests from JSON lines without the GUI")
+    parser.add_argument("input", nargs="?", default="-",
+                        help="JSON-lines request file (default: stdin)")
+    parser.add_argument("-o", "--output", default="-", help="JSON-lines output (default: stdout)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes for meal plans (0 = one per CPU, default 1 = no pool)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--seed", type=int, default=0, help="base seed for meal-plan RNGs")
+    parser.add_argument("--variety", type=float, default=0.0,
+                        help="let slightly worse meal plans win for more varied results")
+    parser.add_argument("--history", metavar="FILE",
+                        help="also record the results in this history database (see history.py)")
+    args = parser.parse_args(argv)
+    workers = args.workers or os.cpu_count() or 1
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding='utf-8')
+    target = sys.stdout if args.output == "-" else open(args.output, 'w', encoding='utf-8')
+    store = None
+    if args.history:
+        from history import HistoryStore
+        store = HistoryStore(args.history)
+    start = time.perf_counter()
+    count = errors = 0
+    try:
+        for batch in iter_result_batches(source, workers, args.batch_size, args.seed, args.variety):
+            lines = list(map(encode_result, batch))
+            target.write("\n".join(lines) + "\n")
+            count += len(batch)
+            errors += sum('error' in result for result in batch)
+            if store is not None:
+                record_batch(store, batch, lines)
+    finally:
+        if store is not None:
+            store.close()
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"{count} requests ({errors} errors) in {elapsed:.2f} s "
+          f"({count / max(elapsed, 1e-9):,.0f}/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# Meal plans for a whole cohort of members across a process pool.
+#
+# Profiles stream in and results stream out in input order. Profiles are sent
+# to the workers in chunks, and only a fixed number of chunks are in flight at
+# once, so memory stays flat however many members there are. Each member's
+# plan uses its own RNG stream seeded from (seed, stable hash of the user id).
+# A rerun with the same seed gives the same plans whatever the worker count or
+# chunk size.
+#
+#   python cohort.py members.jsonl -o plans.jsonl --seed 20261018 --workers 8
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import core
+import tracing
+from compact_plan import CompactPlan
+from constants import DIET_CATEGORIES, MAX_BODY_WEIGHT_KG, MAX_MEALS_PER_DAY, WEIGHT_UNITS_KG
+
+DEFAULT_CHUNK_SIZE = 256
+# Chunks queued per worker before we wait for the oldest one
+CHUNKS_IN_FLIGHT_PER_WORKER = 4
+
+# Same defaults as the Meal Planner tab
+DEFAULT_PROFILE = {'unit': "kg", 'diet': "Mixed", 'meals_per_day': 4}
+
+
+def user_seed_sequence(seed, user_id):
+    # hash() is salted per process, so use a fixed digest of the id instead
+    digest = hashlib.blake2b(str(user_id).encode('utf-8'), digest_size=8).digest()
+    return np.random.SeedSequence([seed, int.from_bytes(digest, 'little')])
+
+
+def read_profile(profile):
+    # (weight, unit, diet, meals per day) with defaults filled in; ValueError if invalid
+    if 'weight' not in profile:
+        raise ValueError("missing field: weight")
+    weight = float(profile['weight'])
+    unit = profile.get('unit', DEFAULT_PROFILE['unit'])
+    diet = profile.get('diet', DEFAULT_PROFILE['diet'])
+    meals_per_day = float(profile.get('meals_per_day', DEFAULT_PROFILE['meals_per_day']))
+    if not weight > 0:
+        raise ValueError("weight must be positive")
+    if unit not in WEIGHT_UNITS_KG:
+        raise ValueError(f"unknown unit: {unit}")
+    # "inf" and huge weights would size the solver's tables by the target
+    if not math.isfinite(weight) or core.to_kg(weight, unit) > MAX_BODY_WEIGHT_KG:
+        raise ValueError(f"weight must be at most {MAX_BODY_WEIGHT_KG:g} kg")
+    if diet not in DIET_CATEGORIES:
+        raise ValueError(f"unknown diet: {diet}")
+    # int() would turn 2.7 into 2
+    if not meals_per_day.is_integer():
+        raise ValueError("meals_per_day must be a whole number")
+    if not 1 <= meals_per_day <= MAX_MEALS_PER_DAY:
+        raise ValueError(f"meals_per_day must be between 1 and {MAX_MEALS_PER_DAY}")
+    return weight, unit, diet, int(meals_per_day)
+
+
+def profile_target(profile):
+    # (diet, daily protein in g, meals per day); ValueError if the profile is invalid
+    weight, unit, diet, meals_per_day = read_profile(profile)
+    return diet, core.daily_protein_target(core.to_kg(weight, unit)), meals_per_day
+
+
+def plan_cache_key(profile, seed=0, variety=0.0):
+    # Key of the profile's plan in a result_cache.ResultCache (None if invalid)
+    from result_cache import meal_plan_key
+    try:
+        diet, daily_protein, meals_per_day = profile_target(profile)
+    except (TypeError, ValueError):
+        return None
+    return meal_plan_key(diet, daily_protein, meals_per_day,
+                         (seed, str(profile.get('user_id'))), variety)
+
+
+def plan_for_profile(profile, seed=0, variety=0.0, cache=None, cached_only=False):
+    # One member: {'user_id', 'weight', 'unit', 'diet', 'meals_per_day'} in,
+    # {'user_id', 'daily_protein', 'plan'} out ({'user_id', 'error'} if the
+    # profile is invalid or its plan fails, so one bad row doesn't stop the
+    # batch). With a `cache`, plans are looked up there first; `cached_only`
+    # returns None instead of computing a plan the cache doesn't have. The
+    # cache holds compact_plan.CompactPlan entries, a few hundred bytes each.
+    user_id = profile.get('user_id')
+    try:
+        diet, daily_protein, meals_per_day = profile_target(profile)
+    except (TypeError, ValueError) as e:
+        return {'user_id': user_id, 'error': str(e)}
+
+    plan = key = None
+    if cache is not None:
+        key = plan_cache_key(profile, seed, variety)
+        compact = cache.get(key)
+        if compact is not None:
+            plan = compact.to_dict()
+    if plan is None:
+        if cached_only:
+            return None
+        rng = np.random.default_rng(user_seed_sequence(seed, user_id))
+        try:
+            with tracing.span("cohort.plan"):
+                plan = core.create_meal_plan(diet, daily_protein, meals_per_day, rng=rng,
+                                             variety=variety)
+        except (ArithmeticError, MemoryError, ValueError) as e:
+            return {'user_id': user_id, 'error': f"meal plan failed: {e}"}
+        if cache is not None:
+            cache.put(key, CompactPlan.from_dict(plan, meals_per_day=meals_per_day))
+    return {'user_id': user_id, 'daily_protein': daily_protein, 'plan': plan}
+
+
+def _plan_chunk(profiles, seed, variety):
+    return [plan_for_profile(profile, seed, variety) for profile in profiles]
+
+
+def init_worker():
+    # Load the food table (or map the snapshot) before the first chunk arrives
+    from food_table import default_table
+    default_table()
+
+
+def iter_chunks(profiles, chunk_size):
+    profiles = iter(profiles)
+    while True:
+        chunk = list(itertools.islice(profiles, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_cohort_plans(profiles, seed=0, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                      window=None, variety=0.0):
+    # Yields plan_for_profile results in input order. `workers=1` runs in this
+    # process; otherwise at most `window` chunks are queued on the pool
+    # (CHUNKS_IN_FLIGHT_PER_WORKER per worker by default).
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        for profile in profiles:
+            yield plan_for_profile(profile, seed, variety)
+        return
+
+    if window is None:
+        window = workers * CHUNKS_IN_FLIGHT_PER_WORKER
+    executor = ProcessPoolExecutor(workers, initializer=init_worker)
+    pending = deque()
+    try:
+        for chunk in iter_chunks(profiles, chunk_size):
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+            pending.append(executor.submit(_plan_chunk, chunk, seed, variety))
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        # Also reached when the caller stops iterating early
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def read_jsonl(f):
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate meal plans for a cohort of members")
+    parser.add_argument("profiles", help="JSON-lines file of member profiles ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="JSON-lines output (default: stdout)")
+    parser.add_argument("--seed", type=int, default=0, help="base seed for every member's RNG")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: one per CPU, 1 = no pool)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--variety", type=float, default=0.0,
+                        help="let slightly worse plans win for more varied results")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.profiles == "-" else open(args.profiles, encoding='utf-8')
+    target = sys.stdout if args.output == "-" else open(args.output, 'w', encoding='utf-8')
+    start = time.perf_counter()
+    count = errors = 0
+    try:
+        for result in iter_cohort_plans(read_jsonl(source), args.seed, args.workers,
+                                        args.chunk_size, variety=args.variety):
+            target.write(json.dumps(result) + "\n")
+            count += 1
+            errors += 'error' in result
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"{count} members ({errors} invalid) in {elapsed:.1f} s "
+          f"({count / max(elapsed, 1e-9):.0f}/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# Compact meal plans for holding many at once (caches, batch jobs).
+#
+# core.create_meal_plan returns nested dicts: one per food, plus copies of
+# those for every meal, a few kilobytes per plan. A CompactPlan is one small
+# structured array with a row per (meal, food): the food's table row, its
+# servings and the meal. Names, protein, calories and serving sizes are
+# looked up in the food table when needed, and totals come from np.bincount.
+# to_dict() gives back exactly the dict create_meal_plan would have built
+# and from_dict() reads one, so the GUI keeps using the dict form.
+#
+#   compact = CompactPlan.from_dict(core.create_meal_plan("Mixed", 120, 4))
+#   compact.meal_totals()      # (protein, calories) per meal
+#   compact.to_dict()          # == the plan passed in
+#
+#   python compact_plan.py     # memory per plan, dict vs compact
+import sys
+import numpy as np
+
+# One row per (meal, food), in meal order and, within a meal, in the order
+# the dict form lists the foods
+PLAN_DTYPE = np.dtype([('food', np.uint32), ('servings', np.uint16), ('meal', np.uint8)])
+
+
+class CompactPlan:
+    __slots__ = ('entries', 'meals_per_day')
+
+    def __init__(self, entries, meals_per_day):
+        self.entries = entries
+        self.meals_per_day = meals_per_day
+
+    @classmethod
+    def from_rows(cls, rows, meal_index, meals_per_day, servings=None):
+        # Same arguments as core.build_meal_plan (no table needed); servings
+        # of the same food in the same meal are merged
+        rows = np.asarray(rows, dtype=np.int64)
+        meal_index = np.asarray(meal_index, dtype=np.int64)
+        servings = np.ones(rows.size, dtype=np.int64) if servings is None else np.asarray(servings)
+        keys = meal_index * (int(rows.max(initial=0)) + 1) + rows
+        unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        order = np.lexsort((first, meal_index[first]))
+        entries = np.empty(unique.size, dtype=PLAN_DTYPE)
+        entries['food'] = rows[first][order]
+        entries['meal'] = meal_index[first][order]
+        entries['servings'] = np.bincount(inverse, weights=servings, minlength=unique.size)[order]
+        return cls(entries, meals_per_day)
+
+    @classmethod
+    def from_dict(cls, meal_plan, table=None, meals_per_day=None):
+        # Meals are numbered by their "Meal N" names; `meals_per_day` defaults
+        # to the last one with food
+        from food_table import default_table
+
+        if table is None:
+            table = default_table()
+        rows, meal_index, servings = [], [], []
+        for meal in meal_plan['meals']:
+            number = int(meal['name'].rsplit(" ", 1)[1]) - 1
+            for food in meal['foods']:
+                rows.append(table.index_of(food['name']))
+                meal_index.append(number)
+                servings.append(food['servings'])
+        entries = np.empty(len(rows), dtype=PLAN_DTYPE)
+        entries['food'] = rows
+        entries['meal'] = meal_index
+        entries['servings'] = servings
+        if meals_per_day is None:
+            meals_per_day = max(meal_index, default=-1) + 1
+        return cls(entries, meals_per_day)
+
+    def to_dict(self, table=None):
+        # The core.create_meal_plan layout
+        from core import build_meal_plan
+        from food_table import default_table
+
+        if table is None:
+            table = default_table()
+        return build_meal_plan(table, self.entries['food'].tolist(), self.entries['meal'].tolist(),
+                               self.meals_per_day, self.entries['servings'].tolist())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __eq__(self, other):
+        return (isinstance(other, CompactPlan) and self.meals_per_day == other.meals_per_day
+                and np.array_equal(self.entries, other.entries))
+
+    def __repr__(self):
+        return f"CompactPlan({len(self)} entries, {self.meals_per_day} meals)"
+
+    def daily_foods(self):
+        # (table rows, servings) over the whole day, rows ascending
+        rows, inverse = np.unique(self.entries['food'], return_inverse=True)
+        return rows, np.bincount(inverse, weights=self.entries['servings']).astype(np.int64)
+
+    def meal_totals(self, table=None):
+        # (protein, calories) arrays with one value per meal of the day
+        from food_table import default_table
+
+        if table is None:
+            table = default_table()
+        food, servings, meal = (self.entries[field] for field in ('food', 'servings', 'meal'))
+        protein = np.bincount(meal, weights=servings * table.protein[food].astype(float),
+                              minlength=self.meals_per_day)
+        calories = np.bincount(meal, weights=servings * table.calories[food].astype(float),
+                               minlength=self.meals_per_day)
+        return protein, calories
+
+    def totals(self, table=None):
+        # (total protein, total calories) of the day
+        protein, calories = self.meal_totals(table)
+        return float(protein.sum()), float(calories.sum())
+
+    def nbytes(self):
+        return sys.getsizeof(self) + sys.getsizeof(self.entries)
+
+
+def deep_sizeof(value):
+    # Bytes of a plan in dict form, counting every dict, list, str and number
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_sizeof(k) + deep_sizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(deep_sizeof(v) for v in value)
+    return size
+
+
+def memory_report(meals=(3, 4, 5, 6), weights=(55, 70, 85, 100)):
+    # Average bytes per plan in dict and compact form over a few plans
+    import core
+
+    plans = [core.create_meal_plan(diet, core.daily_protein_target(weight), n)
+             for diet in ("Mixed", "Plant Based") for weight in weights for n in meals]
+    as_dict = sum(deep_sizeof(plan) for plan in plans) / len(plans)
+    compact = sum(CompactPlan.from_dict(plan, meals_per_day=n).nbytes()
+                  for plan, n in zip(plans, meals * (len(plans) // len(meals)))) / len(plans)
+    return {'plans': len(plans), 'dict_bytes': as_dict, 'compact_bytes': compact,
+            'ratio': as_dict / compact}
+
+
+if __name__ == "__main__":
+    report = memory_report()
+    print(f"{report['plans']} plans: {report['dict_bytes']:,.0f} bytes as dicts, "
+          f"{report['compact_bytes']:,.0f} bytes compact ({report['ratio']:.1f}x smaller)")
@@ -0,0 +1,115 @@
+# Calculator constants and food data (no GUI or third-party imports)
+
+# Caffeine parameters
+CAFFEINE_HALF_LIFE = 5.0
+SLEEP_THRESHOLD_MG = 50
+LETHAL_DOSE_MG = 10000
+DANGER_DOSE_MG = 1000
+MAX_SAFE_DOSE_MG = 400
+MAX_HOURS_UNTIL_SAFE = 200
+
+# Population mode (caffeine_population.py): how half-life and absorption lag
+# (hours) vary between people. A distribution is ('fixed', value),
+# ('uniform', low, high) or ('lognormal', median, geometric_sd, low, high).
+HALF_LIFE_DISTRIBUTION = ('lognormal', CAFFEINE_HALF_LIFE, 1.4, 2.0, 10.0)
+ABSORPTION_LAG_DISTRIBUTION = ('fixed', 0.0)
+POPULATION_SUBJECTS = 20000
+POPULATION_PERCENTILES = (5, 25, 50, 75, 95)
+POPULATION_SEED = 0
+
+# Dose x bedtime sweep: dose range in mg (log-spaced), number of doses, and
+# minutes between the intake times covering the 24 hours before bedtime
+SWEEP_DOSE_RANGE_MG = (10, 10000)
+SWEEP_DOSES = 500
+SWEEP_STEP_MINUTES = 5
+
+# Protein parameters
+PROTEIN_PER_KG = 1.6
+PROTEIN_PER_LB = 0.72
+LB_TO_KG = 0.453592
+
+# Units accepted for caffeine doses and body weights, as factors to mg and kg
+# (the GUI offers "grams"/"milligrams", requests may also say "mg")
+DOSE_UNITS_MG = {"grams": 1000.0, "milligrams": 1.0, "mg": 1.0}
+WEIGHT_UNITS_KG = {"kg": 1.0, "lbs": LB_TO_KG}
+
+# Largest body weight (kg) and meals per day a batch profile may ask for; the
+# meal solver's tables grow with the protein target
+MAX_BODY_WEIGHT_KG = 650.0
+MAX_MEALS_PER_DAY = 12
+
+# Base protein requirements (grams per kg)
+BASE_PROTEIN = {
+    "Sedentary": 0.8,
+    "Light Exercise": 1.0,
+    "Moderate Exercise": 1.2,
+    "Intense Exercise": 1.6,
+    "Athlete": 2.0
+}
+
+# Adjust for goals
+GOAL_MULTIPLIER = {
+    "Maintenance": 1.0,
+    "Muscle Building": 1.2,
+    "Fat Loss": 1.1
+}
+
+# Meal plans: allowed protein overshoot (g) and serving limit per food
+MEAL_PROTEIN_TOLERANCE = 5.0
+MAX_SERVINGS_PER_FOOD = 3
+
+# "Random Plan" search: candidate plans drawn per click (in batches, within
+# the time budget), plans returned, the most foods two returned plans may
+# share (Jaccard index) and the largest food pool a candidate draws from
+SEARCH_CANDIDATES = 4096
+SEARCH_BATCH = 1024
+SEARCH_BUDGET_MS = 50
+SEARCH_TOP_K = 3
+SEARCH_MAX_OVERLAP = 0.5
+SEARCH_POOL_SIZE = 64
+
+# Weights of the search score terms (lower score is better)
+SEARCH_WEIGHTS = {
+    'protein': 4.0,     # distance outside [target, target + tolerance], per gram of target
+    'calories': 1.0,    # calories per gram of protein, relative excess over the leanest food
+    'variety': 0.5,     # share of the food pool left unused
+    'balance': 1.0      # spread of protein between meals (coefficient of variation)
+}
+
+# Food categories, in the order of their codes in the food table
+FOOD_CATEGORIES = ('animal', 'plant', 'vegetarian')
+
+# Food categories allowed by each diet preference (None means everything)
+DIET_CATEGORIES = {
+    "Mixed": None,
+    "Animal Based": ('animal',),
+    "Plant Based": ('plant',),
+    "Vegetarian": ('vegetarian', 'plant')
+}
+
+# Food database
+FOOD_DATABASE = {
+    # Animal Based Proteins
+    'Chicken Breast': {'protein': 31, 'calories': 165, 'category': 'animal', 'serving': '100g'},
+    'Eggs': {'protein': 13, 'calories': 155, 'category': 'animal', 'serving': '2 large eggs'},
+    'Salmon': {'protein': 25, 'calories': 206, 'category': 'animal', 'serving': '100g'},
+    'Greek Yogurt': {'protein': 10, 'calories': 59, 'category': 'animal', 'serving': '100g'},
+    'Beef Steak': {'protein': 26, 'calories': 271, 'category': 'animal', 'serving': '100g'},
+    'Tuna': {'protein': 30, 'calories': 132, 'category': 'animal', 'serving': '100g'},
+    'Whey Protein': {'protein': 24, 'calories': 120, 'category': 'animal', 'serving': '1 scoop'},
+    
+    # Plant Based Proteins
+    'Tofu': {'protein': 8, 'calories': 76, 'category': 'plant', 'serving': '100g'},
+    'Lentils': {'protein': 9, 'calories': 116, 'category': 'plant', 'serving': '100g cooked'},
+    'Chickpeas': {'protein': 9, 'calories': 139, 'category': 'plant', 'serving': '100g cooked'},
+    'Kidney Beans': {'protein': 9, 'calories': 127, 'category': 'plant', 'serving': '100g cooked'},
+    'Almonds': {'protein': 21, 'calories': 579, 'category': 'plant', 'serving': '100g'},
+    'Peanut Butter': {'protein': 25, 'calories': 588, 'category': 'plant', 'serving': '100g'},
+    'Quinoa': {'protein': 4, 'calories': 120, 'category': 'plant', 'serving': '100g cooked'},
+    
+    # Vegetarian Proteins
+    'Paneer': {'protein': 18, 'calories': 265, 'category': 'vegetarian', 'serving': '100g'},
+    'Milk': {'protein': 3, 'calories': 42, 'category': 'vegetarian', 'serving': '100ml'},
+    'Cottage Cheese': {'protein': 11, 'calories': 98, 'category': 'vegetarian', 'serving': '100g'},
+    'Cheese': {'protein': 25, 'calories': 402, 'category': 'vegetarian', 'serving': '100g'}
+}
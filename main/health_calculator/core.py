@@ -0,0 +1,180 @@
+# Headless calculations shared by the GUI, batch jobs and services.
+# Importing this module loads only the standard library, so the caffeine and
+# protein formulas cost no tkinter, matplotlib or numpy import. The meal-plan
+# functions need numpy and the food table and import them on first call
+# (measure_import.py checks that `import core` stays free of numpy).
+import math
+from constants import *
+
+
+def to_kg(weight, unit):
+    # ValueError for a unit not in WEIGHT_UNITS_KG
+    if unit not in WEIGHT_UNITS_KG:
+        raise ValueError(f"unknown unit: {unit}")
+    return weight * WEIGHT_UNITS_KG[unit]
+
+
+def to_mg(dose, unit):
+    # ValueError for a unit not in DOSE_UNITS_MG
+    if unit not in DOSE_UNITS_MG:
+        raise ValueError(f"unknown unit: {unit}")
+    return dose * DOSE_UNITS_MG[unit]
+
+
+# Caffeine
+
+def calculate_remaining_caffeine(initial_dose_mg, hours):
+    return initial_dose_mg * (0.5) ** (hours / CAFFEINE_HALF_LIFE)
+
+
+def hours_until_safe(initial_dose_mg, threshold_mg=SLEEP_THRESHOLD_MG,
+                     half_life=CAFFEINE_HALF_LIFE, max_hours=MAX_HOURS_UNTIL_SAFE):
+    if not initial_dose_mg > threshold_mg:
+        return 0.0
+    return min(half_life * math.log2(initial_dose_mg / threshold_mg), max_hours)
+
+
+def get_dose_safety_level(dose_mg):
+    if dose_mg >= LETHAL_DOSE_MG:
+        return "LETHAL", "red"
+    elif dose_mg >= DANGER_DOSE_MG:
+        return "EXTREMELY DANGEROUS", "darkred"
+    elif dose_mg >= MAX_SAFE_DOSE_MG:
+        return "HIGH DOSE", "orange"
+    else:
+        return "SAFE RANGE", "green"
+
+
+# Protein
+
+def calculate_protein_requirements(weight_kg, activity, goal):
+    protein_per_kg = BASE_PROTEIN[activity] * GOAL_MULTIPLIER[goal]
+    daily_protein = weight_kg * protein_per_kg
+
+    return {
+        "daily_protein": daily_protein,
+        "protein_per_kg": protein_per_kg,
+        "weight_kg": weight_kg
+    }
+
+
+# Meal planning
+
+def daily_protein_target(weight_kg):
+    # 1.6g per kg for muscle building
+    return weight_kg * PROTEIN_PER_KG
+
+
+def _food_entry(table, row, servings):
+    return {
+        'name': table.names[row],
+        'servings': servings,
+        'protein': table.protein[row].item() * servings,
+        'calories': table.calories[row].item() * servings,
+        'serving_size': table.serving(row)
+    }
+
+
+def _solver_order(table, diet_pref, max_protein, max_servings):
+    from food_table import PRUNE_PROTEIN_LIMIT
+    if isinstance(max_servings, int) and max_protein <= PRUNE_PROTEIN_LIMIT:
+        return table.solver_order(diet_pref, max_servings=max_servings)
+    return table.solver_order(diet_pref)
+
+
+def create_meal_plan(diet_pref, daily_protein, meals_per_day, rng=None, variety=0.0,
+                     objective='calories', tolerance=MEAL_PROTEIN_TOLERANCE,
+                     max_servings=MAX_SERVINGS_PER_FOOD, table=None, pinned=()):
+    # Hits the protein target within `tolerance` at the lowest total calories
+    # (objective='servings' minimizes the number of servings instead). `rng`
+    # (seed or numpy Generator) breaks ties randomly; `variety` > 0 also lets
+    # slightly worse plans win for more varied results. `max_servings` is a
+    # limit for every food or an array with one per table row (0 excludes
+    # the food); `pinned` table rows get at least one serving whatever the
+    # diet. Foods come from the columnar food table (FOOD_DATABASE unless
+    # another table is given).
+    from food_table import default_table
+
+    if table is None:
+        table = default_table()
+    serving_row, meal_index = solve_meal_rows(table, diet_pref, daily_protein, meals_per_day, rng,
+                                              variety, objective, tolerance, max_servings, pinned)
+    return build_meal_plan(table, serving_row, meal_index, meals_per_day)
+
+
+def solve_meal_rows(table, diet_pref, daily_protein, meals_per_day, rng=None, variety=0.0,
+                    objective='calories', tolerance=MEAL_PROTEIN_TOLERANCE,
+                    max_servings=MAX_SERVINGS_PER_FOOD, pinned=()):
+    # create_meal_plan before building the dict: the table row of every
+    # single serving, in table order, and the meal it goes to
+    import numpy as np
+    from meal_solver import solve_servings, distribute_into_meals
+
+    pinned = np.unique(np.asarray(pinned, dtype=np.int64))
+    if pinned.size:
+        # One serving of each pinned food up front; the solver covers the
+        # rest of the target within what is left of their limits
+        daily_protein = max(daily_protein - float(table.protein[pinned].sum()), 0.0)
+        max_servings = np.broadcast_to(np.asarray(max_servings, dtype=np.int64),
+                                       (len(table),)).copy()
+        max_servings[pinned] = np.maximum(max_servings[pinned] - 1, 0)
+
+    # Only the diet's candidate rows, already in the order the solver needs
+    rows = _solver_order(table, diet_pref, daily_protein + tolerance, max_servings)
+    protein = table.protein[rows].astype(float)
+    if objective == 'calories':
+        cost = table.calories[rows].astype(float)
+    elif objective == 'servings':
+        cost = np.ones(rows.size)
+    else:
+        raise ValueError(f"Unknown objective: {objective}")
+    if np.ndim(max_servings):
+        max_servings = np.asarray(max_servings)[rows]
+
+    if rng is not None:
+        rng = np.random.default_rng(rng)
+    servings = solve_servings(protein, cost, daily_protein, tolerance, max_servings,
+                              rng=rng, variety=variety, order=np.arange(rows.size))
+
+    # Report foods in table order, then spread single servings over the
+    # meals, balancing protein
+    chosen = np.flatnonzero(servings)
+    chosen = chosen[np.argsort(rows[chosen], kind='stable')]
+    serving_row = np.repeat(rows[chosen], servings[chosen])
+    if pinned.size:
+        serving_row = np.sort(np.concatenate((serving_row, pinned)), kind='stable')
+    serving_row = serving_row.tolist()
+    meal_index = distribute_into_meals(table.protein[serving_row], meals_per_day)
+    return serving_row, meal_index.tolist()
+
+
+def build_meal_plan(table, rows, meal_index, meals_per_day, servings=None):
+    # Plan dict from parallel lists of food rows, their meal and their
+    # servings (one each by default). Servings of the same food are merged,
+    # per meal and in the daily list, which is in table order.
+    if servings is None:
+        servings = [1] * len(rows)
+    daily = {}
+    meals = [{} for _ in range(meals_per_day)]
+    for row, meal, n in zip(rows, meal_index, servings):
+        daily[row] = daily.get(row, 0) + n
+        meals[meal][row] = meals[meal].get(row, 0) + n
+    foods = [_food_entry(table, row, n) for row, n in sorted(daily.items())]
+
+    meal_plan = {
+        'total_protein': sum(food['protein'] for food in foods),
+        'total_calories': sum(food['calories'] for food in foods),
+        'meals': [],
+        'foods': foods
+    }
+    for meal, counts in enumerate(meals):
+        meal_foods = [_food_entry(table, row, n) for row, n in counts.items()]
+        if meal_foods:
+            meal_plan['meals'].append({
+                'name': f"Meal {meal+1}",
+                'foods': meal_foods,
+                'protein': sum(food['protein'] for food in meal_foods),
+                'calories': sum(food['calories'] for food in meal_foods)
+            })
+
+    return meal_plan
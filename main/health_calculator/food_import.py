@@ -0,0 +1,398 @@
+# Bulk food-catalogue importer and memory-mapped snapshots.
+#
+# import_catalogue streams a CSV, JSON-lines or JSON-array dump in chunks,
+# normalizes units and categories, drops rows repeating an earlier name (foods
+# are looked up by name) and writes a compact binary snapshot: fixed-width
+# numeric columns, prebuilt index arrays and a UTF-8 string pool.
+# load_snapshot maps that file read-only, so startup does no parsing and
+# worker processes share the same pages.
+#
+#   python food_import.py foods.csv -o foods.snap
+#   HEALTH_CALC_FOOD_SNAPSHOT=foods.snap python main.py
+import argparse
+import csv
+import json
+import math
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+from constants import FOOD_CATEGORIES
+from food_table import FoodTable
+
+SNAPSHOT_MAGIC = b'HCFOOD\x00\x01'
+SNAPSHOT_ENV = "HEALTH_CALC_FOOD_SNAPSHOT"
+DEFAULT_CHUNK_ROWS = 50_000
+
+# magic, rows, distinct servings, categories, then one offset per section
+_HEADER = struct.Struct('<8sQQQ11Q')
+_SECTIONS = ('protein', 'calories', 'category', 'serving', 'name_offsets', 'serving_offsets',
+             'category_order', 'category_bounds', 'density_order', 'names', 'servings')
+
+# Source column names we accept, first match wins
+NAME_COLUMNS = ('name', 'food', 'description', 'food_name')
+PROTEIN_COLUMNS = {'protein': 1.0, 'protein_g': 1.0, 'protein_mg': 0.001}
+CALORIE_COLUMNS = {'calories': 1.0, 'kcal': 1.0, 'energy_kcal': 1.0,
+                   'energy_kj': 1 / 4.184, 'kj': 1 / 4.184}
+CATEGORY_COLUMNS = ('category', 'type', 'group', 'food_group')
+SERVING_COLUMNS = ('serving', 'serving_size', 'portion')
+
+CATEGORY_ALIASES = {
+    'animal': 'animal', 'meat': 'animal', 'poultry': 'animal', 'fish': 'animal',
+    'seafood': 'animal', 'egg': 'animal', 'eggs': 'animal', 'supplement': 'animal',
+    'plant': 'plant', 'vegan': 'plant', 'legume': 'plant', 'legumes': 'plant',
+    'grain': 'plant', 'grains': 'plant', 'nuts': 'plant', 'seeds': 'plant', 'soy': 'plant',
+    'vegetarian': 'vegetarian', 'dairy': 'vegetarian', 'cheese': 'vegetarian',
+}
+
+DEFAULT_SERVING = '100g'
+MAX_PROTEIN_PER_SERVING = 1000
+
+
+class ImportStats:
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_written = 0
+        self.rejected = {}
+        self.seconds = 0.0
+
+    def reject(self, reason):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+    def __str__(self):
+        lines = [f"read {self.rows_read} rows, wrote {self.rows_written} in {self.seconds:.2f}s"]
+        for reason, count in sorted(self.rejected.items()):
+            lines.append(f"  rejected {count}: {reason}")
+        return "\n".join(lines)
+
+
+# Reading
+
+def _iter_json_array(f, buffer_size=1 << 20):
+    # Streams the items of a top-level JSON array without loading it whole
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+
+    def read_more():
+        nonlocal buffer, position, eof
+        chunk = f.read(buffer_size)
+        eof = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+        return not eof
+
+    def next_char():
+        # First non-whitespace character from `position` on ('' at the end)
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n':
+                position += 1
+            if position < len(buffer) or not read_more():
+                return buffer[position:position + 1]
+
+    if next_char() != '[':
+        raise ValueError("expected a JSON array")
+    position += 1
+    if next_char() == ']':
+        return
+    while True:
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not read_more():
+                    raise
+                continue
+            # A number cut off by the end of the buffer decodes as a shorter
+            # one ("-7." as -7), so an item counts once a delimiter follows
+            if eof or (end < len(buffer) and buffer[end] in ' \t\r\n,]'):
+                break
+            read_more()
+        position = end
+        yield item
+        separator = next_char()
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError("expected ',' or ']' between the items of the JSON array")
+        position += 1
+        next_char()
+
+
+def iter_records(path, fmt=None):
+    if fmt is None:
+        ext = os.path.splitext(path)[1].lower()
+        fmt = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.json': 'json'}.get(ext, 'csv')
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        elif fmt == 'jsonl':
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # Rejected by normalize_record, the import goes on
+                        yield None
+        elif fmt == 'json':
+            yield from _iter_json_array(f)
+        else:
+            raise ValueError(f"Unknown format: {fmt}")
+
+
+def iter_chunks(records, chunk_rows=DEFAULT_CHUNK_ROWS):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Normalizing
+
+def _first(record, keys):
+    for key in keys:
+        value = record.get(key)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def _scaled(record, columns):
+    for key, scale in columns.items():
+        value = record.get(key)
+        if value not in (None, ''):
+            return float(value) * scale
+    return None
+
+
+def normalize_record(record, stats):
+    # Returns (name, protein_g, kcal, category, serving) or None if rejected
+    if record is None:
+        stats.reject("invalid JSON line")
+        return None
+    if not isinstance(record, dict):
+        stats.reject("not an object")
+        return None
+    record = {str(k).strip().lower(): v for k, v in record.items()}
+    name = _first(record, NAME_COLUMNS)
+    if name is None or not str(name).strip():
+        stats.reject("missing name")
+        return None
+
+    try:
+        protein = _scaled(record, PROTEIN_COLUMNS)
+        calories = _scaled(record, CALORIE_COLUMNS)
+    except (TypeError, ValueError):
+        stats.reject("non-numeric protein or calories")
+        return None
+    if protein is None or calories is None:
+        stats.reject("missing protein or calories")
+        return None
+    if not (math.isfinite(protein) and math.isfinite(calories)) or protein < 0 or calories < 0:
+        stats.reject("negative or non-finite protein or calories")
+        return None
+    if protein > MAX_PROTEIN_PER_SERVING:
+        stats.reject("implausible protein per serving")
+        return None
+
+    category = CATEGORY_ALIASES.get(str(_first(record, CATEGORY_COLUMNS) or '').strip().lower())
+    if category is None:
+        stats.reject("unknown category")
+        return None
+
+    serving = ' '.join(str(_first(record, SERVING_COLUMNS) or DEFAULT_SERVING).split())
+    return ' '.join(str(name).split()), protein, calories, category, serving
+
+
+# Writing
+
+def _align(f, boundary=8):
+    pad = -f.tell() % boundary
+    if pad:
+        f.write(b'\0' * pad)
+
+
+def _string_pool(strings):
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, b''.join(encoded)
+
+
+def write_snapshot(path, names, protein, calories, category_codes, serving_codes, serving_sizes):
+    table = FoodTable(names, protein, calories, category_codes, serving_codes, serving_sizes)
+    category_order = np.concatenate([table.category_rows[c] for c in table.categories])
+    category_bounds = np.cumsum([0] + [table.category_rows[c].size for c in table.categories])
+    name_offsets, name_pool = _string_pool(names)
+    serving_offsets, serving_pool = _string_pool(serving_sizes)
+
+    sections = {
+        'protein': table.protein,
+        'calories': table.calories,
+        'category': table.category_codes,
+        'serving': table.serving_codes,
+        'name_offsets': name_offsets,
+        'serving_offsets': serving_offsets,
+        'category_order': category_order.astype(np.int32),
+        'category_bounds': category_bounds.astype(np.uint64),
+        'density_order': table.density_order,
+        'names': name_pool,
+        'servings': serving_pool,
+    }
+
+    # Write next to the target and rename, so readers never map a partial file
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\0' * _HEADER.size)
+        offsets = []
+        for name in _SECTIONS:
+            _align(f)
+            offsets.append(f.tell())
+            data = sections[name]
+            f.write(data if isinstance(data, bytes) else np.ascontiguousarray(data).tobytes())
+        f.seek(0)
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, len(names), len(serving_sizes),
+                             len(table.categories), *offsets))
+    os.replace(tmp_path, path)
+
+
+def import_catalogue(source, snapshot_path, fmt=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    stats = ImportStats()
+    start = time.perf_counter()
+    category_code = {name: code for code, name in enumerate(FOOD_CATEGORIES)}
+    serving_code = {}
+    serving_sizes = []
+    names, protein, calories, categories, servings = [], [], [], [], []
+    seen = set()
+
+    for chunk in iter_chunks(iter_records(source, fmt), chunk_rows):
+        stats.rows_read += len(chunk)
+        chunk_protein, chunk_calories, chunk_categories, chunk_servings = [], [], [], []
+        for record in chunk:
+            row = normalize_record(record, stats)
+            if row is None:
+                continue
+            name, row_protein, row_calories, category, serving = row
+            # Foods are looked up by name (FoodTable.index_of), so the first
+            # row of a name wins
+            if name in seen:
+                stats.reject("duplicate name")
+                continue
+            seen.add(name)
+            if serving not in serving_code:
+                serving_code[serving] = len(serving_sizes)
+                serving_sizes.append(serving)
+            names.append(name)
+            chunk_protein.append(row_protein)
+            chunk_calories.append(row_calories)
+            chunk_categories.append(category_code[category])
+            chunk_servings.append(serving_code[serving])
+        # Numbers go straight into compact arrays, one per chunk
+        protein.append(np.array(chunk_protein, dtype=np.float32))
+        calories.append(np.array(chunk_calories, dtype=np.float32))
+        categories.append(np.array(chunk_categories, dtype=np.uint8))
+        servings.append(np.array(chunk_servings, dtype=np.uint32))
+
+    if not names:
+        raise ValueError(f"No usable foods in {source}")
+    write_snapshot(snapshot_path, names, np.concatenate(protein), np.concatenate(calories),
+                   np.concatenate(categories), np.concatenate(servings), serving_sizes)
+    stats.rows_written = len(names)
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+# Loading
+
+class StringPool:
+    # Read-only sequence of strings decoded on access from a mapped buffer
+    def __init__(self, buffer, offsets, pool_start):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.pool_start = pool_start
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start = self.pool_start + int(self.offsets[i])
+        end = self.pool_start + int(self.offsets[i + 1])
+        return bytes(self.buffer[start:end]).decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def nbytes(self):
+        return self.offsets.nbytes + int(self.offsets[-1])
+
+
+def load_snapshot(path):
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, n_rows, n_servings, n_categories, *offsets = _HEADER.unpack_from(buffer, 0)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a food snapshot")
+    at = dict(zip(_SECTIONS, offsets))
+
+    def column(name, dtype, count):
+        return np.frombuffer(buffer, dtype=dtype, count=count, offset=at[name])
+
+    category_order = column('category_order', np.int32, n_rows)
+    category_bounds = column('category_bounds', np.uint64, n_categories + 1).astype(np.int64)
+    serving_pool = StringPool(buffer, column('serving_offsets', np.uint64, n_servings + 1),
+                              at['servings'])
+    categories = FOOD_CATEGORIES[:n_categories]
+
+    return FoodTable(StringPool(buffer, column('name_offsets', np.uint64, n_rows + 1), at['names']),
+                     column('protein', np.float32, n_rows),
+                     column('calories', np.float32, n_rows),
+                     column('category', np.uint8, n_rows),
+                     column('serving', np.uint32, n_rows),
+                     list(serving_pool), categories,
+                     category_rows={c: category_order[category_bounds[i]:category_bounds[i + 1]]
+                                    for i, c in enumerate(categories)},
+                     density_order=column('density_order', np.int32, n_rows))
+
+
+def load_default_table():
+    # The snapshot named by HEALTH_CALC_FOOD_SNAPSHOT, or None if unset
+    path = os.environ.get(SNAPSHOT_ENV)
+    if not path:
+        return None
+    return load_snapshot(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import a food catalogue into a binary snapshot")
+    parser.add_argument("source", help="CSV, JSON-lines (.jsonl) or JSON array (.json) file")
+    parser.add_argument("-o", "--output", required=True, help="snapshot file to write")
+    parser.add_argument("--format", choices=["csv", "jsonl", "json"],
+                        help="source format (default: from the file extension)")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    stats = import_catalogue(args.source, args.output, args.format, args.chunk_rows)
+    print(stats)
+
+    start = time.perf_counter()
+    table = load_snapshot(args.output)
+    load_ms = (time.perf_counter() - start) * 1000
+    print(f"snapshot: {len(table)} foods, {os.path.getsize(args.output) / 1e6:.1f} MB, "
+          f"loads in {load_ms:.1f} ms")
+    return stats
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# Type-ahead search over the food table's names, for picking foods to pin or
+# exclude in catalogues of hundreds of thousands of foods.
+#
+# The index is built once per table and has two parts:
+# - a prefix index: the normalized names (lower case, words split on
+#   anything but letters and digits), sorted, with their table rows; the
+#   names starting with a query are one slice found by binary search
+# - trigram postings for typos and for words inside a name: the sorted rows
+#   containing each trigram of " " + normalized name (UTF-8 bytes), all
+#   stored in three NumPy arrays
+# Names starting with the query come first, then names sharing at least
+# FUZZY_MIN_SHARE of the query's trigrams, most shared first. Ties go to the
+# food with the most protein per calorie (FoodTable.density_order).
+#
+#   index = default_index()
+#   index.search("chikcen")       # table rows, best first
+#   index.describe()              # size and build time
+#
+#   python food_search.py --foods 300000    # build time, memory, query times
+import bisect
+import re
+import threading
+import time
+import numpy as np
+import tracing
+
+# Suggestions per query
+DEFAULT_LIMIT = 10
+# Share of the query's trigrams a fuzzy match needs
+FUZZY_MIN_SHARE = 0.3
+# Also 0 in UTF-8 text, so no trigram spans two names
+_SEPARATOR = "\0"
+_SPLIT = re.compile(r"[\W_]+")
+
+
+def normalize(text):
+    return _SPLIT.sub(" ", text.lower()).strip()
+
+
+def _trigram_codes(data):
+    # (codes, start positions) of the byte trigrams of `data`, separators excluded
+    data = np.frombuffer(data, dtype=np.uint8)
+    if data.size < 3:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int64)
+    wide = data.astype(np.uint32)
+    codes = (wide[:-2] << 16) | (wide[1:-1] << 8) | wide[2:]
+    separator = data == 0
+    valid = ~(separator[:-2] | separator[1:-1] | separator[2:])
+    return codes[valid], np.flatnonzero(valid)
+
+
+class FoodSearchIndex:
+    def __init__(self, table):
+        start = time.perf_counter()
+        with tracing.span("food_search.build", foods=len(table)):
+            self.table = table
+            names = [normalize(name) for name in table.names]
+
+            # Prefix index
+            order = sorted(range(len(names)), key=names.__getitem__)
+            self.sorted_names = [names[row] for row in order]
+            self.prefix_rows = np.asarray(order, dtype=np.int32)
+
+            # Rank of every row by protein density, 0 = best
+            self.density_rank = np.empty(len(table), dtype=np.int32)
+            self.density_rank[table.density_order] = np.arange(len(table), dtype=np.int32)
+
+            # Trigram postings: rows of trigram k are postings[offsets[k]:offsets[k + 1]]
+            text = (_SEPARATOR + " ").join([""] + names).encode('utf-8')
+            codes, positions = _trigram_codes(text)
+            separators = np.flatnonzero(np.frombuffer(text, dtype=np.uint8) == 0)
+            rows = np.searchsorted(separators, positions, side='right') - 1
+            # (trigram, row) pairs sorted and deduplicated; a plain sort is
+            # many times faster than np.unique here
+            pairs = np.sort((codes.astype(np.uint64) << np.uint64(32)) | rows.astype(np.uint64))
+            pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]]
+            codes = (pairs >> np.uint64(32)).astype(np.uint32)
+            self.postings = (pairs & np.uint64(0xFFFFFFFF)).astype(np.int32)
+            first = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+            self.trigrams = codes[first]
+            self.offsets = np.append(first, codes.size).astype(np.int64)
+        self.build_ms = (time.perf_counter() - start) * 1000
+        tracing.count("food_search.bytes", self.nbytes())
+
+    def __len__(self):
+        return len(self.prefix_rows)
+
+    def nbytes(self):
+        # Index arrays plus the sorted name strings (the table comes on top)
+        import sys
+        arrays = sum(a.nbytes for a in (self.prefix_rows, self.density_rank, self.postings,
+                                        self.trigrams, self.offsets))
+        strings = sys.getsizeof(self.sorted_names) + sum(map(sys.getsizeof, self.sorted_names))
+        return arrays + strings
+
+    def describe(self):
+        return (f"{len(self):,} foods indexed in {self.build_ms:,.0f} ms "
+                f"({self.nbytes() / 2**20:.1f} MB)")
+
+    def _best(self, rows, limit, key=None):
+        # The `limit` rows with the lowest key (density rank by default), in order
+        if key is None:
+            key = self.density_rank[rows]
+        if rows.size > limit:
+            keep = np.argpartition(key, limit)[:limit]
+            rows, key = rows[keep], key[keep]
+        return rows[np.argsort(key, kind='stable')]
+
+    def prefix_matches(self, query, allowed=None):
+        # Rows whose normalized name starts with the normalized query
+        query = normalize(query)
+        if not query:
+            return np.empty(0, dtype=np.int32)
+        low = bisect.bisect_left(self.sorted_names, query)
+        high = bisect.bisect_left(self.sorted_names, query[:-1] + chr(ord(query[-1]) + 1), low)
+        rows = self.prefix_rows[low:high]
+        return rows if allowed is None else rows[allowed[rows]]
+
+    def fuzzy_matches(self, query):
+        # (rows, shared trigrams) of the names sharing at least
+        # FUZZY_MIN_SHARE of the query's trigrams
+        codes = np.unique(_trigram_codes((" " + normalize(query)).encode('utf-8'))[0])
+        if codes.size == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+        found = np.minimum(np.searchsorted(self.trigrams, codes), max(self.trigrams.size - 1, 0))
+        found = found[self.trigrams[found] == codes]
+        if found.size == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+        hits = np.concatenate([self.postings[self.offsets[k]:self.offsets[k + 1]]
+                               for k in found.tolist()])
+        shared = np.bincount(hits, minlength=len(self))
+        rows = np.flatnonzero(shared >= max(1, int(np.ceil(FUZZY_MIN_SHARE * codes.size))))
+        return rows.astype(np.int32), shared[rows]
+
+    def search(self, query, limit=DEFAULT_LIMIT, allowed=None):
+        # Up to `limit` table rows, best first. `allowed` is an optional
+        # boolean array over the table rows (e.g. a diet's foods).
+        with tracing.span("food_search.search"):
+            rows = self._best(self.prefix_matches(query, allowed), limit)
+            if rows.size < limit:
+                fuzzy, shared = self.fuzzy_matches(query)
+                keep = ~np.isin(fuzzy, rows)
+                if allowed is not None:
+                    keep &= allowed[fuzzy]
+                fuzzy, shared = fuzzy[keep], shared[keep]
+                key = (shared.max(initial=0) - shared) * len(self) + self.density_rank[fuzzy]
+                rows = np.concatenate((rows, self._best(fuzzy, limit - rows.size, key)))
+            return rows.tolist()
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def default_index():
+    # Index of food_table.default_table(), built on first use (and again if
+    # the default table is replaced)
+    global _default_index
+    from food_table import default_table
+
+    table = default_table()
+    with _default_index_lock:
+        if _default_index is None or _default_index.table is not table:
+            _default_index = FoodSearchIndex(table)
+    return _default_index
+
+
+def main(argv=None):
+    import argparse
+    from benchmarks import synthetic_table
+    from food_table import default_table
+
+    parser = argparse.ArgumentParser(description="Build the food search index and time queries")
+    parser.add_argument("--foods", type=int, default=0,
+                        help="search a synthetic table of this many foods (default: the food table)")
+    args = parser.parse_args(argv)
+
+    table = synthetic_table(args.foods) if args.foods else default_table()
+    index = FoodSearchIndex(table)
+    print(index.describe())
+    for query in ("c", "ch", "chi", "chick", "chicken b", "chikcen", "breast", "tofu", "lentls"):
+        start = time.perf_counter()
+        rows = index.search(query)
+        elapsed = (time.perf_counter() - start) * 1000
+        names = ", ".join(table.names[row] for row in rows[:3])
+        print(f"{query!r:14} {elapsed:6.2f} ms  {names}")
+
+
+if __name__ == "__main__":
+    main()
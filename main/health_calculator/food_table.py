@@ -0,0 +1,177 @@
+# Columnar food table.
+# Protein, calories and category codes live in NumPy arrays; names and
+# serving sizes are plain sequences looked up by row id. Per-category row
+# arrays, per-diet rows and sort orders are built once and reused by every
+# plan instead of filtering FOOD_DATABASE on each call.
+import numpy as np
+from constants import FOOD_DATABASE, FOOD_CATEGORIES, DIET_CATEGORIES
+
+# Plans asking for more protein (g) than this use the unpruned solver order
+PRUNE_PROTEIN_LIMIT = 1000
+
+
+class FoodTable:
+    def __init__(self, names, protein, calories, category_codes, serving_codes, serving_sizes,
+                 categories=FOOD_CATEGORIES, category_rows=None, density_order=None):
+        self.names = names
+        self.protein = np.asarray(protein, dtype=np.float32)
+        self.calories = np.asarray(calories, dtype=np.float32)
+        self.category_codes = np.asarray(category_codes, dtype=np.uint8)
+        self.serving_codes = np.asarray(serving_codes, dtype=np.uint32)
+        self.serving_sizes = serving_sizes
+        self.categories = tuple(categories)
+
+        # Rows of every category, in table order (snapshots store these prebuilt)
+        if category_rows is None:
+            order = np.argsort(self.category_codes, kind='stable').astype(np.int32)
+            bounds = np.searchsorted(self.category_codes[order], np.arange(len(self.categories) + 1))
+            category_rows = {name: order[bounds[code]:bounds[code + 1]]
+                             for code, name in enumerate(self.categories)}
+        self.category_rows = category_rows
+
+        # Highest protein per calorie first
+        if density_order is None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                density = np.where(self.calories > 0, self.protein / self.calories, np.inf)
+            density_order = np.argsort(-density, kind='stable').astype(np.int32)
+        self.density_order = density_order
+
+        self._diet_rows = {}
+        self._solver_order = {}
+        self._name_index = None
+        # What result_cache's fingerprint knows the table by (see cache_tag)
+        self.source_tag = None
+
+    @classmethod
+    def from_dict(cls, food_database=FOOD_DATABASE, categories=FOOD_CATEGORIES):
+        names = list(food_database)
+        category_code = {name: code for code, name in enumerate(categories)}
+        serving_sizes = []
+        serving_code = {}
+        serving_codes = []
+        for name in names:
+            serving = food_database[name]['serving']
+            if serving not in serving_code:
+                serving_code[serving] = len(serving_sizes)
+                serving_sizes.append(serving)
+            serving_codes.append(serving_code[serving])
+
+        return cls(names,
+                   [food_database[name]['protein'] for name in names],
+                   [food_database[name]['calories'] for name in names],
+                   [category_code[food_database[name]['category']] for name in names],
+                   serving_codes, serving_sizes, categories)
+
+    def __len__(self):
+        return len(self.protein)
+
+    def diet_rows(self, diet_pref):
+        # Row ids a diet preference may use, sorted ascending
+        rows = self._diet_rows.get(diet_pref)
+        if rows is None:
+            categories = DIET_CATEGORIES.get(diet_pref)
+            if categories is None:
+                rows = np.arange(len(self), dtype=np.int32)
+            else:
+                rows = np.sort(np.concatenate([self.category_rows[c] for c in categories]))
+            self._diet_rows[diet_pref] = rows
+        return rows
+
+    def solver_order(self, diet_pref, resolution=1.0, max_servings=None):
+        # Diet rows sorted by (protein floored to `resolution`, calories), the
+        # order meal_solver.solve_servings expects when costs are calories.
+        # With a serving limit each protein group keeps only as many of its
+        # cheapest foods as a plan of up to PRUNE_PROTEIN_LIMIT grams can use.
+        key = (diet_pref, resolution, max_servings)
+        order = self._solver_order.get(key)
+        if order is None:
+            rows = self.diet_rows(diet_pref)
+            units = np.floor(self.protein[rows] / resolution).astype(np.int64)
+            order = rows[np.lexsort((self.calories[rows], units))]
+            if max_servings is not None:
+                units = np.floor(self.protein[order] / resolution).astype(np.int64)
+                starts = np.flatnonzero(np.r_[True, units[1:] != units[:-1]])
+                rank = np.arange(units.size) - np.repeat(starts, np.diff(np.r_[starts, units.size]))
+                limit = PRUNE_PROTEIN_LIMIT / resolution
+                needed = np.ceil(limit / (np.maximum(units, 1) * max_servings))
+                order = order[(units > 0) & (rank < needed)]
+            self._solver_order[key] = order
+        return order
+
+    def index_of(self, name):
+        if self._name_index is None:
+            self._name_index = {n: i for i, n in enumerate(self.names)}
+        return self._name_index[name]
+
+    def cache_tag(self):
+        # How default_table() loaded the table (the snapshot's
+        # result_cache.snapshot_tag, "" for FOOD_DATABASE, which the constants
+        # already cover), else a hash of its contents
+        if self.source_tag is None:
+            import hashlib
+            digest = hashlib.sha256(repr(self.categories).encode('utf-8'))
+            for column in (self.protein, self.calories, self.category_codes, self.serving_codes):
+                digest.update(np.ascontiguousarray(column))
+            digest.update("\0".join(self.names).encode('utf-8'))
+            digest.update("\0".join(self.serving_sizes).encode('utf-8'))
+            self.source_tag = digest.hexdigest()
+        return self.source_tag
+
+    def serving(self, row):
+        return self.serving_sizes[self.serving_codes[row]]
+
+    def category(self, row):
+        return self.categories[self.category_codes[row]]
+
+    def record(self, row):
+        # One row in the FOOD_DATABASE entry layout
+        return {
+            'protein': self.protein[row].item(),
+            'calories': self.calories[row].item(),
+            'category': self.category(row),
+            'serving': self.serving(row)
+        }
+
+    def nbytes(self):
+        # Column arrays plus a rough size of the string sequences
+        import sys
+        arrays = sum(a.nbytes for a in (self.protein, self.calories, self.category_codes,
+                                         self.serving_codes, self.density_order))
+        arrays += sum(rows.nbytes for rows in self.category_rows.values())
+        if isinstance(self.names, list):
+            strings = sys.getsizeof(self.names) + sum(sys.getsizeof(n) for n in self.names)
+        else:
+            strings = self.names.nbytes()
+        return arrays + strings + sum(sys.getsizeof(s) for s in self.serving_sizes)
+
+
+_default_table = None
+
+
+def default_table():
+    # The table the planner uses: the snapshot named by HEALTH_CALC_FOOD_SNAPSHOT
+    # if set, otherwise built from FOOD_DATABASE on first use
+    global _default_table
+    if _default_table is None:
+        import os
+        from food_import import SNAPSHOT_ENV, load_default_table
+        from result_cache import snapshot_tag
+        # Taken before loading, so a snapshot replaced meanwhile is seen as new
+        tag = snapshot_tag(os.environ.get(SNAPSHOT_ENV))
+        table = load_default_table()
+        if table is None:
+            table = FoodTable.from_dict()
+        table.source_tag = tag
+        _default_table = table
+    return _default_table
+
+
+def set_default_table(table):
+    # Replaces the default table (None loads it again on next use) and drops
+    # the cached results computed from the old one
+    global _default_table
+    from result_cache import invalidate_caches
+    if table is not None:
+        table.cache_tag()
+    _default_table = table
+    invalidate_caches()
@@ -0,0 +1,268 @@
+# History of calculations (caffeine, protein, meal plans) in a local SQLite
+# database, so results can be compared over days and weeks.
+#
+# Calls to record() only put rows on a queue; a background thread opens the
+# database (creating it and its schema if needed) and writes them in batches
+# of up to WRITE_BATCH_ROWS, one transaction per batch, so neither the GUI
+# nor the batch CLI waits on the disk. record() never blocks: with
+# MAX_QUEUED_BATCHES already waiting it drops the row and counts it in
+# `dropped`. record_many() (the CLI's batches) waits instead. The
+# database runs in WAL mode, so queries read while the writer writes. Rows
+# hold the time (Unix seconds), an optional user id, the calculation type,
+# its headline number (mg of caffeine, g of protein, g of protein in the
+# plan) and the full result as JSON; they are indexed by user and time.
+#
+# History is off unless HEALTH_CALC_HISTORY names the database file (or
+# cli.py runs with --history FILE).
+#
+#   HEALTH_CALC_HISTORY=~/.health_calc_history.db python main.py
+#   python history.py ~/.health_calc_history.db --kind caffeine --days 7
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+HISTORY_ENV = "HEALTH_CALC_HISTORY"
+KINDS = ('caffeine', 'protein', 'meal')
+# Rows per insert transaction
+WRITE_BATCH_ROWS = 10_000
+# Batches waiting for the writer before record drops rows and record_many waits
+MAX_QUEUED_BATCHES = 64
+SECONDS_PER_DAY = 86400
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS calculations (
+    id INTEGER PRIMARY KEY,
+    at REAL NOT NULL,
+    user TEXT,
+    kind TEXT NOT NULL,
+    value REAL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS calculations_user_at ON calculations (user, at);
+-- Covers daily_totals, which then never reads the table itself
+CREATE INDEX IF NOT EXISTS calculations_kind_at ON calculations (kind, at, value);
+"""
+_INSERT = "INSERT INTO calculations (at, user, kind, value, result) VALUES (?, ?, ?, ?, ?)"
+_STOP = object()
+
+
+def headline_value(kind, result):
+    # The number a row is aggregated by
+    if kind == 'caffeine':
+        return result.get('dose_mg')
+    if kind == 'protein':
+        return result.get('daily_protein')
+    if kind == 'meal':
+        return result.get('plan', {}).get('total_protein')
+    return None
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # WAL keeps the database consistent without a sync per transaction
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class HistoryStore:
+    def __init__(self, path):
+        # Only starts the writer, which opens the database; safe to call on
+        # the Tk thread
+        self.path = os.path.expanduser(path)
+        self.queue = queue.Queue(MAX_QUEUED_BATCHES)
+        self.written = 0
+        self.dropped = 0
+        self.error = None
+        # Set once the schema exists or opening failed (open_error)
+        self.opened = threading.Event()
+        self.open_error = None
+        self.writer = threading.Thread(target=self._write_loop, name="history-writer",
+                                       daemon=True)
+        self.writer.start()
+
+    def record(self, kind, result, user=None, at=None):
+        # One calculation; `result` is the dict cli.py would print for it.
+        # Never waits for the writer (see `dropped`).
+        row = (time.time() if at is None else at, user, kind, headline_value(kind, result),
+               json.dumps(result))
+        try:
+            self.queue.put_nowait([row])
+        except queue.Full:
+            self.dropped += 1
+
+    def record_many(self, rows):
+        # (at, user, kind, value, result JSON) tuples, e.g. a cli.py batch;
+        # waits only while MAX_QUEUED_BATCHES batches are already queued
+        if rows:
+            self.queue.put(list(rows))
+
+    def flush(self):
+        # Waits until every row recorded so far is in the database
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        if self.writer.is_alive():
+            self.queue.put(_STOP)
+            self.writer.join()
+        if self.error is not None:
+            raise self.error
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = _connect(self.path)
+        try:
+            connection.executescript(_SCHEMA)
+        except sqlite3.Error:
+            connection.close()
+            raise
+        return connection
+
+    def _write_loop(self):
+        try:
+            connection = self._open()
+        except (OSError, sqlite3.Error) as e:
+            # Nothing can be written; queued rows are discarded so flush()
+            # and close() still return (and raise the error)
+            self.error = self.open_error = e
+            self.opened.set()
+            while True:
+                batch = self.queue.get()
+                self.queue.task_done()
+                if batch is _STOP:
+                    return
+                self.dropped += len(batch)
+        self.opened.set()
+        try:
+            while True:
+                batches = [self.queue.get()]
+                rows = 0 if batches[0] is _STOP else len(batches[0])
+                # Everything already queued goes into the same transaction
+                while rows < WRITE_BATCH_ROWS and batches[-1] is not _STOP:
+                    try:
+                        batch = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    batches.append(batch)
+                    rows += 0 if batch is _STOP else len(batch)
+                stop = batches[-1] is _STOP
+                try:
+                    with connection:
+                        for batch in batches:
+                            if batch is not _STOP:
+                                connection.executemany(_INSERT, batch)
+                    self.written += rows
+                except sqlite3.Error as e:
+                    # Kept for flush() and close(); later rows are still tried
+                    self.error = e
+                for _ in batches:
+                    self.queue.task_done()
+                if stop:
+                    return
+        finally:
+            connection.close()
+
+    def _read(self, sql, parameters):
+        self.opened.wait()
+        if self.open_error is not None:
+            raise self.open_error
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            connection.row_factory = sqlite3.Row
+            return connection.execute(sql, parameters).fetchall()
+        finally:
+            connection.close()
+
+    def query(self, user=None, kind=None, start=None, end=None, limit=None):
+        # Calculations with start <= at < end, oldest first, as dicts with
+        # the result decoded. Call flush() first to include rows still queued.
+        where, parameters = _filters(user, kind, start, end)
+        sql = f"SELECT at, user, kind, value, result FROM calculations{where} ORDER BY at"
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(int(limit))
+        return [{'at': row['at'], 'user': row['user'], 'kind': row['kind'],
+                 'value': row['value'], 'result': json.loads(row['result'])}
+                for row in self._read(sql, parameters)]
+
+    def daily_totals(self, kind, user=None, start=None, end=None, utc_offset_hours=None):
+        # Per calendar day: count, sum, mean, min and max of the headline
+        # value. Days are local time unless `utc_offset_hours` is given.
+        if utc_offset_hours is None:
+            utc_offset_hours = time.localtime().tm_gmtoff / 3600
+        where, parameters = _filters(user, kind, start, end)
+        sql = (f"SELECT CAST((at + ?) / {SECONDS_PER_DAY} AS INTEGER) AS day, COUNT(*) AS count, "
+               f"SUM(value) AS total, AVG(value) AS mean, MIN(value) AS low, MAX(value) AS high "
+               f"FROM calculations{where} GROUP BY day ORDER BY day")
+        rows = self._read(sql, [utc_offset_hours * 3600] + parameters)
+        return [{'date': time.strftime("%Y-%m-%d", time.gmtime(row['day'] * SECONDS_PER_DAY)),
+                 'count': row['count'], 'total': row['total'], 'mean': row['mean'],
+                 'min': row['low'], 'max': row['high']}
+                for row in rows]
+
+
+def _filters(user, kind, start, end):
+    # WHERE clause on the indexed columns and its parameters
+    clauses, parameters = [], []
+    for clause, value in (("user = ?", user), ("kind = ?", kind), ("at >= ?", start),
+                          ("at < ?", end)):
+        if value is not None:
+            clauses.append(clause)
+            parameters.append(value)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), parameters
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def default_store():
+    # Store of this process from HEALTH_CALC_HISTORY, or None when unset
+    global _default_store
+    path = os.environ.get(HISTORY_ENV)
+    if not path:
+        return None
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = HistoryStore(path)
+            atexit.register(_default_store.close)
+    return _default_store
+
+
+def record(kind, result, user=None):
+    # HistoryStore.record on the default store; nothing while history is off
+    store = default_store()
+    if store is not None:
+        store.record(kind, result, user)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show daily totals from the calculation history")
+    parser.add_argument("database", nargs="?", default=os.environ.get(HISTORY_ENV))
+    parser.add_argument("--kind", choices=KINDS, default='caffeine')
+    parser.add_argument("--user", default=None)
+    parser.add_argument("--days", type=int, default=7, help="days back from now (default 7)")
+    args = parser.parse_args(argv)
+    if not args.database:
+        parser.error(f"give the database file or set {HISTORY_ENV}")
+
+    store = HistoryStore(args.database)
+    start = time.time() - args.days * SECONDS_PER_DAY
+    for day in store.daily_totals(args.kind, args.user, start=start):
+        print(f"{day['date']}  {day['count']:7d} calculations  mean {day['mean']:9.1f}  "
+              f"min {day['min']:9.1f}  max {day['max']:9.1f}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,79 @@
+import time
+_PROCESS_START = time.perf_counter()
+
+import argparse
+import os
+import sys
 import tkinter as tk
 from tkinter import ttk
 from caffeine_calculator import CaffeineCalculator
 from protein_calculator import ProteinCalculator
 from meal_planner import MealPlanner
 
+class StartupProfiler:
+    # Collects startup timings and prints them to stderr
+    def __init__(self, start=_PROCESS_START):
+        self.start = start
+    
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+    
+    def report(self, message):
+        print(f"[startup {self.elapsed_ms():8.1f} ms] {message}", file=sys.stderr, flush=True)
+
+
 class HealthCalculatorGUI:
-    def __init__(self, root):
+    def __init__(self, root, prewarm=False, profiler=None):
         self.root = root
         self.root.title("Health Calculator - Caffeine, Protein & Meal Planner")
         self.root.geometry("1000x800")
         self.root.configure(bg='#f0f0f0')
         
+        self.profiler = profiler
+        if self.profiler:
+            self.profiler.report("imports done")
+        
+        # Calculators are built the first time their tab is shown
+        self.caffeine_calc = None
+        self.protein_calc = None
+        self.meal_planner = None
+        
         self.current_calculator = "caffeine"
         self.setup_ui()
         
-        # Initialize calculators
-        self.caffeine_calc = CaffeineCalculator(self.caffeine_frame)
-        self.protein_calc = ProteinCalculator(self.protein_frame)
-        self.meal_planner = MealPlanner(self.meal_frame)
+        if self.profiler:
+            self.root.after_idle(self.report_first_paint)
+        if prewarm:
+            # Build the hidden tabs one at a time once the window is idle
+            self.root.after_idle(self.prewarm_tabs)
+    
+    def ensure_calculator(self, name):
+        attr, calculator_class, frame = {
+            "caffeine": ("caffeine_calc", CaffeineCalculator, self.caffeine_frame),
+            "protein": ("protein_calc", ProteinCalculator, self.protein_frame),
+            "meal": ("meal_planner", MealPlanner, self.meal_frame),
+        }[name]
+        calculator = getattr(self, attr)
+        if calculator is None:
+            start = time.perf_counter()
+            calculator = calculator_class(frame)
+            setattr(self, attr, calculator)
+            if self.profiler:
+                cost_ms = (time.perf_counter() - start) * 1000
+                self.profiler.report(f"{name} tab built in {cost_ms:.1f} ms")
+        return calculator
+    
+    def prewarm_tabs(self, pending=("protein", "meal")):
+        if not pending:
+            return
+        self.ensure_calculator(pending[0])
+        # Yield to the event loop between tabs so input stays responsive
+        self.root.after(50, self.prewarm_tabs, pending[1:])
+    
+    def report_first_paint(self):
+        # Flush pending geometry and redraw work so the report follows the first frame
+        self.root.update_idletasks()
+        self.profiler.report("first paint")
     
     def setup_ui(self):
         # Main container frame
@@ -76,6 +132,7 @@ class HealthCalculatorGUI:
     
     def show_caffeine_calculator(self):
         self.current_calculator = "caffeine"
+        self.ensure_calculator("caffeine")
         self.protein_frame.pack_forget()
         self.meal_frame.pack_forget()
         self.caffeine_frame.pack(fill=tk.BOTH, expand=True)
@@ -83,6 +140,7 @@ class HealthCalculatorGUI:
     
     def show_protein_calculator(self):
         self.current_calculator = "protein"
+        self.ensure_calculator("protein")
         self.caffeine_frame.pack_forget()
         self.meal_frame.pack_forget()
         self.protein_frame.pack(fill=tk.BOTH, expand=True)
@@ -90,6 +148,7 @@ class HealthCalculatorGUI:
     
     def show_meal_planner(self):
         self.current_calculator = "meal"
+        self.ensure_calculator("meal")
         self.caffeine_frame.pack_forget()
         self.protein_frame.pack_forget()
         self.meal_frame.pack(fill=tk.BOTH, expand=True)
@@ -109,9 +168,28 @@ class HealthCalculatorGUI:
         elif self.current_calculator == "meal":
             self.meal_btn.configure(bg='#0078D7', fg='white', relief='sunken')
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Health Calculator")
+    parser.add_argument("--prewarm", action="store_true",
+                        help="build the hidden tabs in the background once the window is idle")
+    parser.add_argument("--profile-startup", action="store_true",
+                        default=os.environ.get("HEALTH_CALC_PROFILE_STARTUP") == "1",
+                        help="print time-to-first-paint and per-tab build cost to stderr "
+                             "(or set HEALTH_CALC_PROFILE_STARTUP=1)")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="time the calculators' stages and write a Chrome trace to FILE "
+                             "on exit, with a summary on stderr (or set HEALTH_CALC_TRACE=FILE)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.trace:
+        import tracing
+        tracing.enable(args.trace)
+    profiler = StartupProfiler() if args.profile_startup else None
     root = tk.Tk()
-    app = HealthCalculatorGUI(root)
+    app = HealthCalculatorGUI(root, prewarm=args.prewarm, profiler=profiler)
     root.mainloop()
 
 if __name__ == "__main__":
@@ -1,14 +1,27 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import random
-import numpy as np
+import threading
 from shared import *
+import core
+import tracing
+from summaries import meal_plan_summary, text_rows
+
+# Food search runs once typing pauses for this long
+FOOD_SEARCH_DELAY_MS = 120
+FOOD_SUGGESTIONS = 8
 
 class MealPlanner:
     def __init__(self, parent_frame):
         self.parent_frame = parent_frame
+        # The week plan is kept between clicks so only changed days are re-solved
+        self.week_plan = None
+        self.week_lock = threading.Lock()
+        # Table rows every plan must include / leave out
+        self.pinned = set()
+        self.excluded = set()
+        self.food_suggestions = []
+        self._search_job = None
         self.setup_ui()
     
     def setup_ui(self):
@@ -54,6 +67,36 @@ class MealPlanner:
                                      values=["3", "4", "5", "6"], width=6, state="readonly")
         meals_combobox.pack(side=tk.LEFT, padx=(8, 15))
         
+        # Food search, to pin foods to the plan or leave them out
+        self.food_row = ttk.Frame(input_frame)
+        self.food_row.pack(fill=tk.X, pady=(0, 8))
+        
+        ttk.Label(self.food_row, text="Find Food:").pack(side=tk.LEFT)
+        
+        self.food_query_var = tk.StringVar()
+        self.food_query_var.trace_add("write", self.on_food_query_edited)
+        food_entry = ttk.Entry(self.food_row, textvariable=self.food_query_var, width=24)
+        food_entry.pack(side=tk.LEFT, padx=(8, 5))
+        
+        ttk.Button(self.food_row, text="Pin", width=8,
+                   command=lambda: self.choose_food(pin=True)).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Button(self.food_row, text="Exclude", width=8,
+                   command=lambda: self.choose_food(pin=False)).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Button(self.food_row, text="Clear", width=8,
+                   command=self.clear_foods).pack(side=tk.LEFT, padx=(5, 0))
+        
+        self.food_status = ttk.Label(self.food_row, text="", foreground='gray')
+        self.food_status.pack(side=tk.LEFT, padx=(10, 0))
+        
+        # Suggestions, shown while there are any
+        self.food_list = tk.Listbox(input_frame, height=FOOD_SUGGESTIONS, font=('Arial', 9),
+                                    exportselection=False)
+        self.food_list.bind("<Double-Button-1>", lambda event: self.choose_food(pin=True))
+        
+        self.food_choice_label = ttk.Label(input_frame, text="", foreground='darkgreen',
+                                           wraplength=700)
+        self.food_choice_label.pack(fill=tk.X)
+        
         # Generate buttons
         button_row = ttk.Frame(input_frame)
         button_row.pack(fill=tk.X, pady=(10, 0))
@@ -66,6 +109,18 @@ class MealPlanner:
                                command=self.generate_random_plan)
         random_btn.pack(side=tk.LEFT)
         
+        week_btn = ttk.Button(button_row, text="Plan Week",
+                             command=self.generate_week_plan)
+        week_btn.pack(side=tk.LEFT, padx=(10, 0))
+        
+        # Plans are computed in the background; the bar shows while one is slow
+        from background import TabWorker
+        progress = ttk.Progressbar(button_row, mode='indeterminate', length=120)
+        progress.pack(side=tk.LEFT, padx=(10, 0))
+        self.worker = TabWorker(self.parent_frame, progress)
+        # Searches have their own worker so they never cancel a plan
+        self.search_worker = TabWorker(self.parent_frame)
+        
         # Results frame
         self.results_frame = ttk.LabelFrame(self.parent_frame, text="Daily Meal Plan", padding="10")
         self.results_frame.pack(fill=tk.X, pady=(0, 10))
@@ -76,16 +131,11 @@ class MealPlanner:
         self.chart_frame = ttk.LabelFrame(self.parent_frame, text="Nutrition Breakdown", padding="5")
         self.chart_frame.pack(fill=tk.BOTH, expand=True)
         
-        # Create figure and canvas
-        self.fig, self.ax = plt.subplots(figsize=(8, 4), dpi=80)
-        self.canvas = FigureCanvasTkAgg(self.fig, self.chart_frame)
-        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.fig, self.ax, self.canvas, self.toolbar = create_chart(self.chart_frame)
         
-        # Add toolbar
-        from matplotlib.backends.backend_tkagg import NavigationToolbar2Tk
-        self.toolbar = NavigationToolbar2Tk(self.canvas, self.chart_frame)
-        self.toolbar.update()
-        self.toolbar.pack(side=tk.BOTTOM, fill=tk.X)
+        from charts import MealPlanChart, ChartRenderer
+        self.chart = MealPlanChart(self.ax, animated=True)
+        self.renderer = ChartRenderer(self.fig, self.canvas, self.chart)
     
     def setup_results(self):
         for widget in self.results_frame.winfo_children():
@@ -96,206 +146,241 @@ class MealPlanner:
                                     font=('Arial', 10),
                                     foreground='blue')
         self.result_label.pack(pady=8)
+        
+        # Plan view, built once and shown with the first plan; it only draws
+        # the lines in view, so long plans refresh as fast as short ones
+        from virtual_list import VirtualList
+        self.plan_view = VirtualList(self.results_frame, rows=12, font=('Arial', 9), styles={
+            'header': (('Arial', 11, 'bold'), 'darkblue'),
+            'meal_header': (('Arial', 10, 'bold'), 'darkgreen'),
+        })
     
-    def generate_meal_plan(self):
+    def generate_meal_plan(self, search=False):
+        with tracing.span("meal.generate_meal_plan", search=search):
+            self._generate_meal_plan(search)
+
+    def _generate_meal_plan(self, search):
+        inputs = self.read_inputs()
+        if inputs is None:
+            return
+        weight, unit, diet_pref, meals_per_day, daily_protein = inputs
+        
+        # Generate meal plan based on diet preference (replaces any plan still
+        # being computed)
+        self.worker.run(self.compute_meal_plan,
+                        (diet_pref, daily_protein, meals_per_day, search, self.chosen_foods()),
+                        on_done=lambda plan: self.show_meal_plan(
+                            weight, unit, daily_protein, plan, diet_pref),
+                        on_error=self.show_error, pass_job=True)
+    
+    def read_inputs(self):
+        # (weight, unit, diet_pref, meals_per_day, daily_protein), or None
+        # after telling the user an input is invalid
         try:
-            weight = self.weight_var.get()
-            unit = self.weight_unit_var.get()
-            diet_pref = self.diet_pref_var.get()
-            meals_per_day = int(self.meals_per_day_var.get())
-            
-            # Convert weight to kg
-            if unit == "lbs":
-                weight_kg = weight * 0.453592
-            else:
-                weight_kg = weight
+            with tracing.span("meal.parse"):
+                weight = self.weight_var.get()
+                unit = self.weight_unit_var.get()
+                diet_pref = self.diet_pref_var.get()
+                meals_per_day = int(self.meals_per_day_var.get())
+                
+                # Convert weight to kg
+                weight_kg = core.to_kg(weight, unit)
             
             # Calculate daily protein needs (1.6g per kg for muscle building)
-            daily_protein = weight_kg * PROTEIN_PER_KG
-            protein_per_meal = daily_protein / meals_per_day
-            
-            # Generate meal plan based on diet preference
-            meal_plan = self.create_meal_plan(diet_pref, daily_protein, meals_per_day)
-            
-            self.update_results(weight, unit, daily_protein, meal_plan)
-            self.update_chart(meal_plan)
+            daily_protein = core.daily_protein_target(weight_kg)
             
         except ValueError:
             messagebox.showerror("Input Error", "Please enter valid values!")
+            return None
+        return weight, unit, diet_pref, meals_per_day, daily_protein
+    
+    def compute_meal_plan(self, diet_pref, daily_protein, meals_per_day, search=False,
+                          foods=((), ()), job=None):
+        # Runs on a worker thread: no widgets here
+        with tracing.span("meal.compute", search=search):
+            meal_plan = None
+            pinned, excluded = foods
+            if pinned or excluded:
+                # The random search can't force foods, so plans with chosen
+                # foods always come from the solver (Random Plan still varies
+                # the pick among equally good plans)
+                meal_plan = self.create_meal_plan_with_foods(
+                    diet_pref, daily_protein, meals_per_day, pinned, excluded,
+                    rng=random.getrandbits(64) if search else None)
+            elif search:
+                meal_plan = self.search_meal_plan(diet_pref, daily_protein, meals_per_day,
+                                                  job.cancelled if job else None)
+            if meal_plan is None:
+                meal_plan = self.create_meal_plan(diet_pref, daily_protein, meals_per_day)
+            return meal_plan
+    
+    def show_meal_plan(self, weight, unit, daily_protein, meal_plan, diet_pref):
+        # diet_pref is the one the plan was made for; the combobox may have
+        # changed while it was computed
+        with tracing.span("meal.update_results"):
+            self.update_results(weight, unit, daily_protein, meal_plan, diet_pref)
+        with tracing.span("meal.update_chart"):
+            self.update_chart(meal_plan)
+        from history import record
+        record('meal', {'daily_protein': daily_protein, 'plan': meal_plan})
+    
+    def generate_week_plan(self):
+        with tracing.span("meal.generate_week_plan"):
+            inputs = self.read_inputs()
+            if inputs is None:
+                return
+            weight, unit, diet_pref, meals_per_day, daily_protein = inputs
+            self.worker.run(self.compute_week_plan,
+                            (diet_pref, daily_protein, meals_per_day, self.chosen_foods()),
+                            on_done=lambda days: self.show_week_plan(weight, unit, days),
+                            on_error=self.show_error)
+    
+    def compute_week_plan(self, diet_pref, daily_protein, meals_per_day, foods=((), ())):
+        # Runs on a worker thread; a superseded run may still be finishing,
+        # hence the lock
+        from week_planner import MultiDayPlan, DEFAULT_DAYS
+        with tracing.span("meal.compute_week"), self.week_lock:
+            if self.week_plan is None:
+                self.week_plan = MultiDayPlan(DEFAULT_DAYS, diet_pref, daily_protein, meals_per_day,
+                                              seed=random.getrandbits(64))
+            else:
+                self.week_plan.set_targets(diet_pref=diet_pref, daily_protein=daily_protein,
+                                           meals_per_day=meals_per_day)
+            self.week_plan.set_foods(*foods)
+            self.week_plan.refresh()
+            return self.week_plan.to_dict()['days']
+    
+    def show_week_plan(self, weight, unit, days):
+        from summaries import week_plan_summary
+        with tracing.span("meal.update_results", days=len(days)):
+            self.show_plan_view()
+            self.plan_view.set_rows(text_rows(week_plan_summary(weight, unit, days)))
+        with tracing.span("meal.update_chart"):
+            self.update_chart(days[0]['plan'])
+    
+    def show_error(self, error):
+        messagebox.showerror("Meal Plan Error", f"Could not create a meal plan: {error}")
+    
+    def show_search_error(self, error):
+        messagebox.showerror("Food Search Error", f"Could not search the foods: {error}")
     
     def generate_random_plan(self):
         # Randomize diet preference for variety
         diets = ["Mixed", "Animal Based", "Plant Based", "Vegetarian"]
         self.diet_pref_var.set(random.choice(diets))
-        self.generate_meal_plan()
+        self.generate_meal_plan(search=True)
     
     def create_meal_plan(self, diet_pref, daily_protein, meals_per_day):
-        # Filter foods based on diet preference
-        if diet_pref == "Animal Based":
-            available_foods = {k: v for k, v in FOOD_DATABASE.items() if v['category'] == 'animal'}
-        elif diet_pref == "Plant Based":
-            available_foods = {k: v for k, v in FOOD_DATABASE.items() if v['category'] == 'plant'}
-        elif diet_pref == "Vegetarian":
-            available_foods = {k: v for k, v in FOOD_DATABASE.items() if v['category'] in ['vegetarian', 'plant']}
-        else:  # Mixed
-            available_foods = FOOD_DATABASE.copy()
-        
-        # Remove some random foods to create variety
-        foods_list = list(available_foods.keys())
-        if len(foods_list) > 8:
-            foods_to_remove = random.sample(foods_list, min(3, len(foods_list) - 8))
-            for food in foods_to_remove:
-                if food in available_foods:
-                    del available_foods[food]
-        
-        meal_plan = {
-            'total_protein': 0,
-            'total_calories': 0,
-            'meals': [],
-            'foods': []
-        }
-        
-        remaining_protein = daily_protein
-        
-        # Distribute protein across meals
-        while remaining_protein > 0 and available_foods:
-            # Select a random food
-            food_name = random.choice(list(available_foods.keys()))
-            food_data = available_foods[food_name]
-            
-            # Calculate how much of this food to add
-            protein_per_serving = food_data['protein']
-            max_servings = min(3, int(remaining_protein / protein_per_serving) + 1)
-            
-            if max_servings < 1:
-                # Remove food if it doesn't fit remaining protein
-                del available_foods[food_name]
-                continue
-            
-            servings = random.randint(1, max_servings)
-            protein_from_food = protein_per_serving * servings
-            calories_from_food = food_data['calories'] * servings
-            
-            # Add to meal plan
-            meal_plan['foods'].append({
-                'name': food_name,
-                'servings': servings,
-                'protein': protein_from_food,
-                'calories': calories_from_food,
-                'serving_size': food_data['serving']
-            })
-            
-            meal_plan['total_protein'] += protein_from_food
-            meal_plan['total_calories'] += calories_from_food
-            remaining_protein -= protein_from_food
-            
-            # Remove this food to avoid repetition
-            if food_name in available_foods:
-                del available_foods[food_name]
-        
-        # Distribute foods into meals
-        foods_per_meal = max(1, len(meal_plan['foods']) // meals_per_day)
-        for i in range(meals_per_day):
-            start_idx = i * foods_per_meal
-            end_idx = (i + 1) * foods_per_meal
-            meal_foods = meal_plan['foods'][start_idx:end_idx]
-            if meal_foods:
-                meal_plan['meals'].append({
-                    'name': f"Meal {i+1}",
-                    'foods': meal_foods,
-                    'protein': sum(food['protein'] for food in meal_foods),
-                    'calories': sum(food['calories'] for food in meal_foods)
-                })
-        
-        return meal_plan
+        # Plans repeat for the same inputs, so reuse them from the result cache
+        # (kept there in compact form)
+        from compact_plan import CompactPlan
+        from result_cache import default_cache, meal_plan_key
+        key = meal_plan_key(diet_pref, daily_protein, meals_per_day)
+        compact = default_cache().get_or_compute(
+            key, lambda: CompactPlan.from_dict(
+                core.create_meal_plan(diet_pref, daily_protein, meals_per_day),
+                meals_per_day=meals_per_day))
+        return compact.to_dict()
     
-    def update_results(self, weight, unit, daily_protein, meal_plan):
-        for widget in self.results_frame.winfo_children():
-            widget.destroy()
-        
-        # Create scrollable text widget for meal plan
-        text_frame = ttk.Frame(self.results_frame)
-        text_frame.pack(fill=tk.BOTH, expand=True)
-        
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(text_frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        meal_text = tk.Text(text_frame, height=12, wrap=tk.WORD, font=('Arial', 9),
-                           yscrollcommand=scrollbar.set)
-        meal_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.config(command=meal_text.yview)
-        
-        # Header
-        meal_text.insert(tk.END, f"📊 DAILY MEAL PLAN SUMMARY\n", 'header')
-        meal_text.insert(tk.END, "="*50 + "\n")
-        meal_text.insert(tk.END, f"• Weight: {weight} {unit}\n")
-        meal_text.insert(tk.END, f"• Target Protein: {daily_protein:.1f}g\n")
-        meal_text.insert(tk.END, f"• Achieved Protein: {meal_plan['total_protein']:.1f}g\n")
-        meal_text.insert(tk.END, f"• Total Calories: {meal_plan['total_calories']:.0f} kcal\n")
-        meal_text.insert(tk.END, f"• Diet Preference: {self.diet_pref_var.get()}\n\n")
-        
-        # Meals
-        for meal in meal_plan['meals']:
-            meal_text.insert(tk.END, f"🍽️ {meal['name']}\n", 'meal_header')
-            meal_text.insert(tk.END, f"   Protein: {meal['protein']:.1f}g | Calories: {meal['calories']:.0f}\n")
-            
-            for food in meal['foods']:
-                meal_text.insert(tk.END, f"   • {food['name']}: {food['servings']} serving(s) ({food['serving_size']})\n")
-                meal_text.insert(tk.END, f"     → Protein: {food['protein']:.1f}g | Calories: {food['calories']:.0f}\n")
-            meal_text.insert(tk.END, "\n")
-        
-        # Configure tags for styling
-        meal_text.tag_configure('header', font=('Arial', 11, 'bold'), foreground='darkblue')
-        meal_text.tag_configure('meal_header', font=('Arial', 10, 'bold'), foreground='darkgreen')
-        
-        meal_text.configure(state='disabled')
+    def create_meal_plan_with_foods(self, diet_pref, daily_protein, meals_per_day, pinned,
+                                    excluded, rng=None):
+        # Excluded foods get a serving limit of 0, pinned ones a serving at least
+        import numpy as np
+        from food_table import default_table
+        limits = np.full(len(default_table()), MAX_SERVINGS_PER_FOOD)
+        limits[list(excluded)] = 0
+        return core.create_meal_plan(diet_pref, daily_protein, meals_per_day, rng=rng,
+                                     max_servings=limits, pinned=pinned)
     
-    def update_chart(self, meal_plan):
-        self.ax.clear()
-        
-        if not meal_plan['meals']:
-            self.ax.text(0.5, 0.5, 'No meal data available', 
-                        ha='center', va='center', transform=self.ax.transAxes)
-            self.canvas.draw()
+    def search_meal_plan(self, diet_pref, daily_protein, meals_per_day, cancelled=None):
+        # Best of a few thousand random plans (None if the diet has no foods)
+        from meal_search import search_meal_plans
+        plans = search_meal_plans(diet_pref, daily_protein, meals_per_day,
+                                  rng=random.getrandbits(64), top_k=1, cancelled=cancelled)
+        return plans[0] if plans else None
+    
+    def on_food_query_edited(self, *args):
+        # Coalesce bursts of keystrokes into one search
+        self.search_worker.cancel()
+        if self._search_job is not None:
+            self.parent_frame.after_cancel(self._search_job)
+        self._search_job = self.parent_frame.after(FOOD_SEARCH_DELAY_MS, self.search_foods)
+    
+    def search_foods(self):
+        self._search_job = None
+        query = self.food_query_var.get()
+        if not query.strip():
+            self.show_food_suggestions((None, []))
             return
-        
-        # Prepare data for stacked bar chart
-        meal_names = [meal['name'] for meal in meal_plan['meals']]
-        food_data = {}
-        
-        # Collect all unique foods across meals
-        all_foods = set()
-        for meal in meal_plan['meals']:
-            for food in meal['foods']:
-                all_foods.add(food['name'])
-        
-        # Initialize food data
-        for food in all_foods:
-            food_data[food] = [0] * len(meal_names)
-        
-        # Fill food data
-        for i, meal in enumerate(meal_plan['meals']):
-            for food in meal['foods']:
-                food_data[food['name']][i] = food['protein']
-        
-        # Create stacked bar chart
-        bottom = [0] * len(meal_names)
-        colors = plt.cm.Set3(np.linspace(0, 1, len(all_foods)))
-        
-        for (food, color) in zip(all_foods, colors):
-            values = food_data[food]
-            self.ax.bar(meal_names, values, bottom=bottom, label=food, color=color)
-            bottom = [bottom[i] + values[i] for i in range(len(values))]
-        
-        self.ax.set_xlabel('Meals')
-        self.ax.set_ylabel('Protein (g)')
-        self.ax.set_title('Protein Distribution Across Meals', fontsize=11, fontweight='bold')
-        self.ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=8)
-        self.ax.grid(True, alpha=0.3)
-        
-        # Rotate x labels for better fit
-        plt.setp(self.ax.get_xticklabels(), rotation=45, ha='right')
-        
-        self.fig.tight_layout()
-        self.canvas.draw()
\ No newline at end of file
+        # The first search also builds the index, which takes a moment on a
+        # large catalogue, so searches never run on the Tk thread
+        self.search_worker.run(self.find_foods, (query,), on_done=self.show_food_suggestions,
+                               on_error=self.show_search_error)
+    
+    def find_foods(self, query):
+        # Runs on a worker thread: (index description, [(row, label)])
+        from food_search import default_index
+        with tracing.span("meal.find_foods"):
+            index = default_index()
+            table = index.table
+            return index.describe(), [
+                (row, f"{table.names[row]} ({table.protein[row]:g}g protein, "
+                      f"{table.calories[row]:g} cal per {table.serving(row)})")
+                for row in index.search(query, FOOD_SUGGESTIONS)]
+    
+    def show_food_suggestions(self, found):
+        status, self.food_suggestions = found
+        if status is not None:
+            self.food_status.configure(text=status)
+        self.food_list.delete(0, tk.END)
+        for row, label in self.food_suggestions:
+            self.food_list.insert(tk.END, label)
+        if self.food_suggestions:
+            self.food_list.selection_set(0)
+            if not self.food_list.winfo_manager():
+                self.food_list.pack(fill=tk.X, pady=(0, 8), after=self.food_row)
+        elif self.food_list.winfo_manager():
+            self.food_list.pack_forget()
+    
+    def choose_food(self, pin):
+        # Pins or excludes the selected suggestion (the first one by default)
+        if not self.food_suggestions:
+            return
+        selection = self.food_list.curselection()
+        row = self.food_suggestions[selection[0] if selection else 0][0]
+        (self.pinned if pin else self.excluded).add(row)
+        (self.excluded if pin else self.pinned).discard(row)
+        self.food_query_var.set("")
+        self.update_food_choices()
+    
+    def clear_foods(self):
+        self.pinned.clear()
+        self.excluded.clear()
+        self.update_food_choices()
+    
+    def chosen_foods(self):
+        # (pinned rows, excluded rows) for the worker thread
+        return tuple(sorted(self.pinned)), tuple(sorted(self.excluded))
+    
+    def update_food_choices(self):
+        from food_table import default_table
+        names = default_table().names
+        parts = []
+        if self.pinned:
+            parts.append("Always include: " + ", ".join(names[row] for row in sorted(self.pinned)))
+        if self.excluded:
+            parts.append("Leave out: " + ", ".join(names[row] for row in sorted(self.excluded)))
+        self.food_choice_label.configure(text="    ".join(parts))
+    
+    def update_results(self, weight, unit, daily_protein, meal_plan, diet_pref):
+        self.show_plan_view()
+        self.plan_view.set_rows(text_rows(meal_plan_summary(weight, unit, daily_protein, meal_plan,
+                                                            diet_pref)))
+    
+    def show_plan_view(self):
+        if self.result_label.winfo_manager():
+            self.result_label.pack_forget()
+            self.plan_view.pack(fill=tk.BOTH, expand=True)
+    
+    def update_chart(self, meal_plan):
+        self.renderer.render(meal_plan)
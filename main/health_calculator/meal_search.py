@@ -0,0 +1,168 @@
+# Best-of-N random meal plans.
+#
+# Draws thousands of candidate plans at once with the rules of the original
+# random planner: shuffle the diet's foods, leave a few out when there are
+# more than 8, then walk the shuffled list and add 1 to min(3, what is still
+# needed + 1) servings of each food until the protein target is met. Every
+# step of that walk runs on all candidates together as NumPy arrays. The
+# candidates are scored in one pass and the best plans that share few foods
+# are returned.
+import time
+import numpy as np
+from constants import (MEAL_PROTEIN_TOLERANCE, MAX_SERVINGS_PER_FOOD, SEARCH_CANDIDATES,
+                       SEARCH_BATCH, SEARCH_BUDGET_MS, SEARCH_TOP_K, SEARCH_MAX_OVERLAP,
+                       SEARCH_POOL_SIZE, SEARCH_WEIGHTS)
+
+# Foods always kept in a candidate's pool, and how many more may be left out
+_KEEP_FOODS = 8
+_DROP_FOODS = 3
+# Floor for the leanest food's kcal per g of protein: protein alone has 4,
+# so only catalogue errors (e.g. 0 kcal) go below it
+_MIN_KCAL_PER_PROTEIN = 4.0
+
+
+def search_pool(table, diet_pref, pool_size=SEARCH_POOL_SIZE):
+    # The diet's foods with protein, at most `pool_size` of the most
+    # protein-dense ones for large catalogues, in table order
+    rows = table.diet_rows(diet_pref)
+    rows = rows[table.protein[rows] > 0]
+    if rows.size > pool_size:
+        allowed = np.zeros(len(table), dtype=bool)
+        allowed[rows] = True
+        dense = table.density_order[allowed[table.density_order]]
+        rows = np.sort(dense[:pool_size])
+    return rows
+
+
+def draw_candidates(protein, target, count, rng, max_servings=MAX_SERVINGS_PER_FOOD):
+    # Returns (picks, servings): pool indices in the order each candidate
+    # picked them and the servings taken, both (count, steps); servings are 0
+    # after a candidate reached the target
+    foods = protein.size
+    steps = foods - min(_DROP_FOODS, foods - _KEEP_FOODS) if foods > _KEEP_FOODS else foods
+    picks = np.argsort(rng.random((count, foods)), axis=1)[:, :steps]
+    servings = np.zeros((count, steps), dtype=np.int64)
+    remaining = np.full(count, float(target))
+    for step in range(steps):
+        active = remaining > 0
+        if not active.any():
+            picks, servings = picks[:, :step], servings[:, :step]
+            break
+        p = protein[picks[:, step]]
+        limit = np.clip(np.floor(remaining / p).astype(np.int64) + 1, 1, max_servings)
+        taken = np.where(active, rng.integers(1, limit + 1), 0)
+        servings[:, step] = taken
+        remaining -= taken * p
+    return picks, servings
+
+
+def meal_of_pick(servings, meals_per_day):
+    # Picked foods split into meals_per_day runs of (nearly) equal length, in
+    # pick order, like the original planner but without dropping leftovers
+    picked = servings > 0
+    n_foods = picked.sum(axis=1, keepdims=True)
+    position = np.arange(servings.shape[1])
+    return np.where(picked, position * meals_per_day // np.maximum(n_foods, 1), 0)
+
+
+def score_candidates(protein, calories, picks, servings, target, meals_per_day,
+                     tolerance=MEAL_PROTEIN_TOLERANCE, weights=SEARCH_WEIGHTS):
+    # One score per candidate, lower is better (see SEARCH_WEIGHTS)
+    count = picks.shape[0]
+    food_protein = servings * protein[picks]
+    total_protein = food_protein.sum(axis=1)
+    total_calories = (servings * calories[picks]).sum(axis=1)
+
+    protein_error = (np.maximum(target - total_protein, 0)
+                     + np.maximum(total_protein - target - tolerance, 0)) / target
+
+    # The pool only has foods with protein; the floor keeps a 0 kcal food
+    # from making every excess infinite
+    leanest = max(float((calories / protein).min()), _MIN_KCAL_PER_PROTEIN)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        calorie_excess = np.where(total_protein > 0,
+                                  total_calories / total_protein / leanest - 1, 1.0)
+
+    unused = 1 - (servings > 0).sum(axis=1) / protein.size
+
+    meal = meal_of_pick(servings, meals_per_day)
+    flat = (np.arange(count)[:, None] * meals_per_day + meal).ravel()
+    meal_protein = np.bincount(flat, food_protein.ravel(), minlength=count * meals_per_day)
+    meal_protein = meal_protein.reshape(count, meals_per_day)
+    mean = meal_protein.mean(axis=1)
+    imbalance = np.where(mean > 0, meal_protein.std(axis=1) / np.where(mean > 0, mean, 1), 1.0)
+
+    return (weights['protein'] * protein_error + weights['calories'] * calorie_excess
+            + weights['variety'] * unused + weights['balance'] * imbalance)
+
+
+def pick_diverse(food_sets, order, top_k, max_overlap=SEARCH_MAX_OVERLAP):
+    # Walks candidates best first and keeps those whose foods overlap every
+    # kept plan by at most `max_overlap` (Jaccard index)
+    head = order[:max(top_k * 64, 256)]
+    sets = food_sets[head].astype(np.int32)
+    sizes = sets.sum(axis=1)
+    shared = sets @ sets.T
+    jaccard = shared / np.maximum(sizes[:, None] + sizes[None, :] - shared, 1)
+    kept = []
+    for i in range(head.size):
+        if all(jaccard[i, j] <= max_overlap for j in kept):
+            kept.append(i)
+            if len(kept) == top_k:
+                break
+    return head[kept]
+
+
+def search_meal_plans(diet_pref, daily_protein, meals_per_day, rng=None, top_k=SEARCH_TOP_K,
+                      candidates=SEARCH_CANDIDATES, budget_ms=SEARCH_BUDGET_MS, table=None,
+                      cancelled=None):
+    # Up to `top_k` varied plans, best first, in the core.create_meal_plan
+    # layout plus a 'score'. Candidates are drawn in SEARCH_BATCH batches
+    # until `candidates` are drawn or `budget_ms` has passed (None: no limit,
+    # so a seeded rng gives the same plans every time). `cancelled` is an
+    # optional callable; once it returns True no further batch is drawn.
+    from core import build_meal_plan
+    from food_table import default_table
+
+    start = time.perf_counter()
+    if table is None:
+        table = default_table()
+    rng = np.random.default_rng(rng)
+    rows = search_pool(table, diet_pref)
+    if rows.size == 0 or daily_protein <= 0:
+        return []
+    protein = table.protein[rows].astype(float)
+    calories = table.calories[rows].astype(float)
+
+    batches = []
+    drawn = 0
+    while drawn < candidates:
+        batch = draw_candidates(protein, daily_protein, min(SEARCH_BATCH, candidates - drawn), rng)
+        batches.append(batch)
+        drawn += batch[0].shape[0]
+        if budget_ms is not None and (time.perf_counter() - start) * 1000 > budget_ms / 2:
+            # Leave the rest of the budget for scoring
+            break
+        if cancelled is not None and cancelled():
+            break
+    steps = max(picks.shape[1] for picks, _ in batches)
+    picks = np.concatenate([np.pad(p, ((0, 0), (0, steps - p.shape[1]))) for p, _ in batches])
+    servings = np.concatenate([np.pad(s, ((0, 0), (0, steps - s.shape[1]))) for _, s in batches])
+
+    scores = score_candidates(protein, calories, picks, servings, daily_protein, meals_per_day)
+    food_sets = np.zeros((picks.shape[0], rows.size), dtype=bool)
+    candidate, step = np.nonzero(servings)
+    food_sets[candidate, picks[candidate, step]] = True
+    order = np.argsort(scores, kind='stable')
+    best = pick_diverse(food_sets, order, top_k)
+
+    meals = meal_of_pick(servings[best], meals_per_day)
+    plans = []
+    for i, candidate in enumerate(best):
+        picked = servings[candidate] > 0
+        plan = build_meal_plan(table, rows[picks[candidate][picked]].tolist(),
+                               meals[i][picked].tolist(), meals_per_day,
+                               servings[candidate][picked].tolist())
+        plan['score'] = float(scores[candidate])
+        plans.append(plan)
+    return plans
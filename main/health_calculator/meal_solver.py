@@ -0,0 +1,147 @@
+# Exact meal-plan solver.
+#
+# Picks whole servings so that protein lands in [target, target + tolerance]
+# at minimum total cost (calories by default). It is a bounded knapsack over
+# protein, solved by dynamic programming on a grid of `resolution` grams.
+# Protein is rounded down to that grid so the real total never falls short.
+# If that makes the plan overshoot target + tolerance in real protein, it is
+# solved again on a ten times finer grid.
+#
+# Foods are grouped by their protein per serving. Within a group an optimal
+# plan always spends servings on the cheapest foods first, so each group
+# collapses to one convex "cost of s servings" curve. Only the cheapest few
+# foods of each group can ever be used, so the DP stays small (about a
+# hundred groups) however large the food table gets.
+import math
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from constants import MEAL_PROTEIN_TOLERANCE, MAX_SERVINGS_PER_FOOD
+
+# Relative cost noise used to break exact ties when an rng is given
+_TIE_NOISE = 1e-9
+# Finest grid (g) tried when the plan on the requested one overshoots
+_FINEST_RESOLUTION = 0.01
+
+
+def solve_servings(protein, cost, target, tolerance=MEAL_PROTEIN_TOLERANCE,
+                   max_servings=MAX_SERVINGS_PER_FOOD, resolution=1.0, rng=None, variety=0.0,
+                   order=None):
+    # Returns the number of servings for every food (same order as `protein`).
+    # `max_servings` may be a scalar or one limit per food. With an rng, ties
+    # are broken randomly and `variety` > 0 perturbs costs by up to that
+    # fraction to trade a little optimality for different plans.
+    # `order` restricts the search to those foods; when it is already sorted by
+    # (protein floored to `resolution`, cost), as FoodTable.solver_order is,
+    # the sort is skipped unless an rng reshuffles ties.
+    protein = np.asarray(protein, dtype=float)
+    cost = np.asarray(cost, dtype=float)
+    limits = np.broadcast_to(np.asarray(max_servings, dtype=np.int64), protein.shape)
+    servings = np.zeros(protein.shape, dtype=np.int64)
+
+    low = max(int(math.ceil(target / resolution - 1e-9)), 0)
+    high = low + int(round(tolerance / resolution))
+    if low == 0:
+        return servings
+
+    units = np.zeros(protein.shape, dtype=np.int64)
+    if order is None:
+        candidates = np.arange(protein.size)
+    else:
+        candidates = np.asarray(order)
+    units[candidates] = np.floor(protein[candidates] / resolution)
+    candidates = candidates[(units[candidates] > 0) & (units[candidates] <= high)
+                            & (limits[candidates] > 0)]
+    if candidates.size == 0:
+        return servings
+
+    effective = cost[candidates]
+    if rng is not None:
+        noise = rng.random(candidates.size)
+        effective = effective * (1 + variety * noise) + np.abs(effective) * _TIE_NOISE * noise
+        order = candidates[np.lexsort((noise, effective, units[candidates]))]
+    elif order is None:
+        order = candidates[np.lexsort((effective, units[candidates]))]
+    else:
+        order = candidates
+    effective_cost = np.empty_like(cost)
+    effective_cost[candidates] = effective
+
+    # Drop foods that come after a group already has its high // p servings
+    sorted_units = units[order]
+    group_units, group_start = np.unique(sorted_units, return_index=True)
+    group_of = np.repeat(np.arange(group_units.size), np.diff(np.r_[group_start, order.size]))
+    cumulative = np.cumsum(limits[order])
+    before_group = np.r_[0, cumulative][group_start]
+    first_serving = cumulative - limits[order] - before_group[group_of]
+    keep = first_serving < high // sorted_units
+    order, group_of = order[keep], group_of[keep]
+
+    # Per-serving costs, cheapest first, then a cost curve per group
+    serving_food = np.repeat(order, limits[order])
+    serving_group = np.repeat(group_of, limits[order])
+    serving_start = np.searchsorted(serving_group, np.arange(group_units.size))
+    serving_end = np.r_[serving_start[1:], serving_food.size]
+    curve_sum = np.r_[0.0, np.cumsum(effective_cost[serving_food])]
+    food_start = np.searchsorted(group_of, np.arange(group_units.size))
+    food_end = np.r_[food_start[1:], order.size]
+
+    # One DP stage per protein value
+    best = np.full(high + 1, np.inf)
+    best[0] = 0.0
+    stages = []
+    for g, p in enumerate(group_units):
+        p = int(p)
+        count = min(high // p, int(serving_end[g] - serving_start[g]))
+        curve = curve_sum[serving_start[g]:serving_start[g] + count + 1] - curve_sum[serving_start[g]]
+        # Row s holds best[c - s * p] (inf where c < s * p)
+        padded = np.concatenate((np.full(count * p, np.inf), best))
+        shifted = as_strided(padded[count * p:], shape=(count + 1, high + 1),
+                             strides=(-p * padded.itemsize, padded.itemsize))
+        totals = shifted + curve[:, None]
+        choice = np.argmin(totals, axis=0)
+        best = totals[choice, np.arange(high + 1)]
+        stages.append((p, order[food_start[g]:food_end[g]], choice))
+
+    reachable = np.flatnonzero(np.isfinite(best))
+    window = reachable[reachable >= low]
+    if window.size == 0:
+        # Target out of reach with these limits: get as close as possible
+        return _servings_for(int(reachable.max()), stages, limits, servings)
+
+    amount = int(window[np.argmin(best[window])])
+    plan = _servings_for(amount, stages, limits, servings)
+    if (float(np.dot(plan, protein)) <= target + tolerance + 1e-9
+            or resolution <= _FINEST_RESOLUTION):
+        return plan
+    # Flooring hid an overshoot past target + tolerance: solve again on a
+    # finer grid, where the floored protein is closer to the real one
+    finer = resolution / 10
+    fine_order = candidates[np.lexsort((cost[candidates],
+                                        np.floor(protein[candidates] / finer)))]
+    return solve_servings(protein, cost, target, tolerance, max_servings, finer, rng, variety,
+                          fine_order)
+
+
+def _servings_for(amount, stages, limits, servings):
+    # Walks the DP choices back from `amount` grid units into `servings`
+    for p, group, choice in reversed(stages):
+        count = int(choice[amount])
+        amount -= count * p
+        for food in group:
+            if count == 0:
+                break
+            take = min(count, int(limits[food]))
+            servings[food] = take
+            count -= take
+    return servings
+
+
+def distribute_into_meals(protein, meals_per_day):
+    # Largest item first into the meal with the least protein so far
+    meal_index = np.zeros(len(protein), dtype=np.int64)
+    loads = np.zeros(meals_per_day)
+    for i in np.argsort(-np.asarray(protein, dtype=float), kind='stable'):
+        meal = int(np.argmin(loads))
+        meal_index[i] = meal
+        loads[meal] += protein[i]
+    return meal_index
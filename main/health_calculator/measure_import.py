@@ -0,0 +1,97 @@
+# Cold-import cost of the calculator modules.
+# Every sample runs in a fresh interpreter so nothing is cached in-process.
+# Each sample also lists the heavy libraries (HEAVY_MODULES) the import
+# pulled in; a module loading one it is not expected to (ALLOWED_HEAVY, e.g.
+# numpy under core) fails the run with status 1, so the numbers measure the
+# import they claim to.
+#
+#   python measure_import.py                 # core, engine, shared and the GUI
+#   python measure_import.py core -n 20      # just the headless core
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["constants", "core", "caffeine_engine", "shared", "main"]
+HEAVY_MODULES = ("numpy", "matplotlib", "tkinter")
+# Heavy libraries each module may load on import; others are not checked
+ALLOWED_HEAVY = {
+    "constants": (),
+    "core": (),
+    "caffeine_engine": ("numpy",),
+    "shared": (),
+    "main": ("tkinter",),
+}
+
+_PROBE = """
+import resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(elapsed, rss_kb, len(sys.modules), ",".join(heavy) or "-")
+"""
+
+
+def measure(module, repeat=10):
+    here = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(repeat):
+        probe = _PROBE.format(module=module, heavy=HEAVY_MODULES)
+        out = subprocess.run([sys.executable, "-c", probe],
+                             cwd=here, capture_output=True, text=True, check=True).stdout
+        elapsed, rss_kb, n_modules, heavy = out.split()
+        samples.append((float(elapsed), int(rss_kb), int(n_modules)))
+
+    return {
+        "module": module,
+        "median_ms": statistics.median(s[0] for s in samples) * 1000,
+        "min_ms": min(s[0] for s in samples) * 1000,
+        "max_rss_mb": max(s[1] for s in samples) / 1024,
+        "modules_loaded": samples[-1][2],
+        "heavy_loaded": [] if heavy == "-" else heavy.split(","),
+    }
+
+
+def unexpected_heavy(result):
+    # Heavy libraries the import loaded although ALLOWED_HEAVY rules them out
+    allowed = ALLOWED_HEAVY.get(result['module'])
+    if allowed is None:
+        return []
+    return [name for name in result['heavy_loaded'] if name not in allowed]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold import time per module")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("-n", "--repeat", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = [measure(module, args.repeat) for module in args.modules]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'module':<18}{'median ms':>11}{'min ms':>9}{'max RSS MB':>12}{'modules':>9}"
+              f"  heavy")
+        for r in results:
+            print(f"{r['module']:<18}{r['median_ms']:>11.1f}{r['min_ms']:>9.1f}"
+                  f"{r['max_rss_mb']:>12.1f}{r['modules_loaded']:>9}"
+                  f"  {', '.join(r['heavy_loaded']) or '-'}")
+
+    failed = False
+    for r in results:
+        unexpected = unexpected_heavy(r)
+        if unexpected:
+            print(f"{r['module']} should not import {', '.join(unexpected)}", file=sys.stderr)
+            failed = True
+    if failed:
+        sys.exit(1)
+    return results
+
+
+if __name__ == "__main__":
+    main()
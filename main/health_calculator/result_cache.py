@@ -0,0 +1,295 @@
+# Two-level cache for computed results (meal plans, caffeine timelines).
+#
+# Entries live in an in-memory LRU and, when a directory is given, in a
+# store on disk that evicts the least recently used files once it grows
+# past its size limit. Keys are built from normalized inputs (see
+# meal_plan_key and caffeine_key) plus a fingerprint of the constants and
+# the food table in use, so editing FOOD_DATABASE or any constant invalidates
+# every entry made before. food_table.set_default_table invalidates every
+# cache at once; otherwise get() checks the fingerprint again every
+# FINGERPRINT_CHECK_SECONDS. Disk entries of other fingerprints (another
+# process, an older snapshot) are kept until unused for
+# STALE_FINGERPRINT_SECONDS.
+#
+#   HEALTH_CALC_CACHE_DIR=~/.health_calc_cache python main.py
+import hashlib
+import math
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import constants
+import tracing
+
+CACHE_DIR_ENV = "HEALTH_CALC_CACHE_DIR"
+MEMORY_ENTRIES = 1024
+DISK_BYTES = 64 << 20
+# Disk eviction frees space down to this share of the limit
+_DISK_LOW_WATER = 0.9
+# Seconds between fingerprint checks in get()
+FINGERPRINT_CHECK_SECONDS = 5.0
+# Disk entries of another fingerprint unused this long are deleted
+STALE_FINGERPRINT_SECONDS = 7 * 86400
+_FINGERPRINT_CHARS = 16
+# Every ResultCache of this process, for invalidate_caches()
+_caches = weakref.WeakSet()
+
+
+def snapshot_tag(path):
+    # Identifies a snapshot file by path, size and modification time ("" if
+    # there is none), without reading it
+    if not path or not os.path.exists(path):
+        return ""
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def data_fingerprint():
+    # Digest of every constant and of the food table the planner reads
+    items = sorted((name, getattr(constants, name)) for name in dir(constants) if name.isupper())
+    digest = hashlib.sha256(repr(items).encode('utf-8'))
+    # The table already in use if food_table has loaded one (not imported to
+    # keep numpy out), else the snapshot it would load
+    food_table = sys.modules.get('food_table')
+    table = None if food_table is None else food_table._default_table
+    if table is not None:
+        tag = table.cache_tag()
+    else:
+        # Same variable as food_import.SNAPSHOT_ENV
+        tag = snapshot_tag(os.environ.get("HEALTH_CALC_FOOD_SNAPSHOT"))
+    digest.update(tag.encode('utf-8'))
+    return digest.hexdigest()[:_FINGERPRINT_CHARS]
+
+
+def invalidate_caches():
+    # ResultCache.invalidate on every cache of this process
+    for cache in list(_caches):
+        cache.invalidate()
+
+
+def _is_fingerprint(name):
+    return len(name) == _FINGERPRINT_CHARS and all(c in "0123456789abcdef" for c in name)
+
+
+def _last_used(directory):
+    # Newest modification time of a store directory or any file in it
+    try:
+        with os.scandir(directory) as entries:
+            return max([os.stat(directory).st_mtime]
+                       + [entry.stat().st_mtime for entry in entries])
+    except OSError:
+        return time.time()
+
+
+def meal_plan_key(diet_pref, daily_protein, meals_per_day, seed=None, variety=0.0):
+    # The solver only sees the target rounded up to whole grams, so weights
+    # in the same 1 g bucket of protein share one entry without changing
+    # the plan. Entries are compact_plan.CompactPlan; the tag differs from
+    # the one of older disk caches, which held plan dicts.
+    grams = max(math.ceil(daily_protein - 1e-9), 0)
+    return ('compact_meal', diet_pref, grams, int(meals_per_day), seed, float(variety))
+
+
+def caffeine_key(caffeine_mg):
+    return ('caffeine', round(float(caffeine_mg), 6))
+
+
+def population_key(caffeine_mg):
+    # Population bands use the fixed POPULATION_SEED, so the dose decides them
+    return ('caffeine_population', round(float(caffeine_mg), 6))
+
+
+class LRUCache:
+    def __init__(self, max_entries=MEMORY_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        try:
+            self.entries.move_to_end(key)
+        except KeyError:
+            return default
+        return self.entries[key]
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class DiskStore:
+    # One pickle file per entry under directory/<fingerprint>/. A hit touches
+    # the file, so eviction by modification time drops the least recently
+    # used. Other fingerprints may belong to a process running with another
+    # snapshot; their directories are deleted when the store opens only if
+    # nothing in them was used for STALE_FINGERPRINT_SECONDS.
+    def __init__(self, directory, fingerprint, max_bytes=DISK_BYTES):
+        self.root = os.path.expanduser(directory)
+        self.directory = os.path.join(self.root, fingerprint)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        os.utime(self.directory)
+        stale = time.time() - STALE_FINGERPRINT_SECONDS
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if (name != fingerprint and _is_fingerprint(name) and os.path.isdir(path)
+                    and _last_used(path) < stale):
+                shutil.rmtree(path, ignore_errors=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(self.directory))
+
+    def _path(self, key):
+        name = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + ".pkl")
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                stored_key, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return default
+        if stored_key != key:
+            return default
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        data = pickle.dumps((key, value), protocol=pickle.HIGHEST_PROTOCOL)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self.total_bytes += len(data) - previous
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        # Oldest files first until the store is back under its low-water mark
+        files = sorted((entry.stat().st_mtime_ns, entry.stat().st_size, entry.path)
+                       for entry in os.scandir(self.directory) if entry.name.endswith(".pkl"))
+        self.total_bytes = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if self.total_bytes <= self.max_bytes * _DISK_LOW_WATER:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.total_bytes -= size
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+        self.total_bytes = 0
+
+
+class ResultCache:
+    # Safe to share between threads (the GUI computes on worker threads)
+    def __init__(self, directory=None, max_entries=MEMORY_ENTRIES, max_bytes=DISK_BYTES):
+        self.lock = threading.RLock()
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory = LRUCache(max_entries)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.fingerprint = None
+        self.checked = 0.0
+        self.disk = None
+        self.invalidate()
+        _caches.add(self)
+
+    def invalidate(self):
+        # Drops everything if the constants or food table changed since the
+        # last check (called on creation, by invalidate_caches and from get)
+        fingerprint = data_fingerprint()
+        with self.lock:
+            self.checked = time.monotonic()
+            if fingerprint == self.fingerprint:
+                return
+            self.fingerprint = fingerprint
+            self.memory.clear()
+            if self.directory:
+                self.disk = DiskStore(self.directory, fingerprint, self.max_bytes)
+
+    def get(self, key, default=None):
+        if time.monotonic() - self.checked > FINGERPRINT_CHECK_SECONDS:
+            self.invalidate()
+        with self.lock:
+            value = self.memory.get(key, default)
+            if value is not default:
+                self.hits += 1
+                tracing.count("cache.memory_hits")
+                return value
+            if self.disk is not None:
+                value = self.disk.get(key, default)
+                if value is not default:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    tracing.count("cache.disk_hits")
+                    self.memory.put(key, value)
+                    return value
+            self.misses += 1
+            tracing.count("cache.misses")
+            return default
+
+    def put(self, key, value):
+        with self.lock:
+            self.memory.put(key, value)
+            if self.disk is not None:
+                self.disk.put(key, value)
+
+    def get_or_compute(self, key, compute):
+        # `compute` runs outside the lock, so two threads may both compute a
+        # missing value; the later put wins
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            stats = {'hits': self.hits, 'misses': self.misses, 'disk_hits': self.disk_hits,
+                     'hit_rate': self.hits / lookups if lookups else 0.0,
+                     'entries': len(self.memory)}
+            if self.disk is not None:
+                stats['disk_bytes'] = self.disk.total_bytes
+            return stats
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache():
+    # Shared cache of this process, on disk too if HEALTH_CALC_CACHE_DIR is set
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache(os.environ.get(CACHE_DIR_ENV) or None)
+    return _default_cache
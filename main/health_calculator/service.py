@@ -0,0 +1,515 @@
+# Local HTTP service for the calculators (asyncio, standard library only).
+#
+#   POST /caffeine   {"dose": 0.2, "unit": "grams"}
+#   POST /protein    {"weight": 70, "unit": "kg", "activity": "Athlete", "goal": "Maintenance"}
+#   POST /meal       {"user_id": "m42", "weight": 68, "diet": "Vegetarian", "meals_per_day": 4}
+#   POST /intake     {"user_id": "m42", "dose": 95, "unit": "mg", "at": 493245.5}
+#   POST /level      {"user_id": "m42", "at": 493258.0}
+#   GET  /stats      request counts, batch sizes and p50/p99 latency per endpoint
+#
+# Request bodies and results are the same as the lines of cli.py. /intake logs
+# a drink and /level reads a user's current caffeine level from a
+# caffeine_tracker.CaffeineTracker; "at" is in hours (default: now, in hours
+# since the Unix epoch). Requests
+# that arrive within BATCH_WINDOW_MS of each other are merged into one batch
+# call: the NumPy batch functions of cli.py for caffeine and protein, and a
+# process pool for meal plans, so the event loop never waits on a plan.
+# Meal plans of repeated profiles come from a result_cache.ResultCache. Once
+# MAX_PENDING requests are in progress, new ones get 503 right away instead
+# of queueing. Meal requests are checked before they join a batch, so an
+# invalid profile gets its 400 alone. If a batch still fails, its requests are
+# run again one at a time, and only those that fail on their own get a 500.
+#
+#   python service.py serve --port 8765
+#   python service.py loadgen --port 8765 --kind protein -n 20000 -c 64
+#   python service.py loadgen --serve --kind meal     # server and client in one process
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import cli
+import cohort
+import core
+import tracing
+from caffeine_tracker import CaffeineTracker
+from compact_plan import CompactPlan
+from result_cache import ResultCache
+from constants import BASE_PROTEIN, GOAL_MULTIPLIER, DIET_CATEGORIES, SLEEP_THRESHOLD_MG
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+BATCH_WINDOW_MS = 2
+MAX_BATCH = 1024
+# Smaller meal batches keep every worker busy
+MAX_MEAL_BATCH = 32
+MAX_PENDING = 4096
+LATENCY_SAMPLES = 10000
+MAX_BODY_BYTES = 1 << 20
+CACHE_ENTRIES = 65536
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class MicroBatcher:
+    # Collects requests for up to `window_ms` (or until `max_batch` are
+    # waiting) and hands them to `compute`, a coroutine taking a list of
+    # requests and returning one result per request
+    def __init__(self, compute, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH):
+        self.compute = compute
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.pending = []
+        self.timer = None
+        self.tasks = set()
+        self.batches = 0
+        self.requests = 0
+        self.retried = 0
+
+    def submit(self, request):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((request, future))
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self.flush)
+        return future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            self.batches += 1
+            self.requests += len(batch)
+            task = asyncio.ensure_future(self._run(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, batch):
+        start = time.perf_counter()
+        try:
+            results = await self.compute([request for request, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(e)
+                return
+            # One request may have failed the others; retry them one by one
+            self.retried += 1
+            await asyncio.gather(*(self._run([item]) for item in batch))
+            return
+        tracing.record("service.batch", start, time.perf_counter(), requests=len(batch))
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {'batches': self.batches, 'retried_batches': self.retried,
+                'mean_batch': self.requests / self.batches if self.batches else 0.0}
+
+
+class LatencyStats:
+    # Request count and the latency of the last LATENCY_SAMPLES requests
+    def __init__(self, samples=LATENCY_SAMPLES):
+        self.samples = deque(maxlen=samples)
+        self.count = 0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def summary(self):
+        if not self.samples:
+            return {'count': self.count}
+        ms = np.array(self.samples) * 1000
+        p50, p99 = np.percentile(ms, [50, 99])
+        return {'count': self.count, 'p50_ms': round(float(p50), 3),
+                'p99_ms': round(float(p99), 3), 'max_ms': round(float(ms.max()), 3)}
+
+
+def _tracker_fields(request, now):
+    # (user_id, at) of an /intake or /level request
+    user_id = request.get('user_id')
+    if not isinstance(user_id, (str, int)) or isinstance(user_id, bool):
+        raise ValueError("user_id must be a string or an integer")
+    at = float(request.get('at', now))
+    if not math.isfinite(at):
+        raise ValueError("at must be a number of hours")
+    return user_id, at
+
+
+def intake_batch(tracker, requests):
+    # Logs a batch of drinks in one CaffeineTracker.add_many call
+    results = [None] * len(requests)
+    now = time.time() / 3600
+    valid, users, doses, times = [], [], [], []
+    for i, request in enumerate(requests):
+        try:
+            user_id, at = _tracker_fields(request, now)
+            dose = core.to_mg(float(request['dose']), request.get('unit', "mg"))
+            if not (dose >= 0 and math.isfinite(dose)):
+                raise ValueError("dose must be a non-negative number")
+        except KeyError as e:
+            results[i] = cli._error(request, f"missing field: {e.args[0]}")
+            continue
+        except (TypeError, ValueError) as e:
+            results[i] = cli._error(request, str(e))
+            continue
+        valid.append(i)
+        users.append(user_id)
+        doses.append(dose)
+        times.append(at)
+
+    tracker.add_many(users, doses, times)
+    for i, user_id, dose in zip(valid, users, doses):
+        results[i] = {'id': requests[i].get('id'), 'type': 'intake', 'user_id': user_id,
+                      'dose_mg': dose}
+    return results
+
+
+def level_batch(tracker, requests):
+    # Current level, and when it drops under the sleep threshold, per user
+    results = [None] * len(requests)
+    now = time.time() / 3600
+    for i, request in enumerate(requests):
+        try:
+            user_id, at = _tracker_fields(request, now)
+        except (TypeError, ValueError) as e:
+            results[i] = cli._error(request, str(e))
+            continue
+        level = tracker.level(user_id, at)
+        safe_in = max(tracker.half_life * math.log2(max(level, SLEEP_THRESHOLD_MG)
+                                                    / SLEEP_THRESHOLD_MG), 0.0)
+        results[i] = {'id': request.get('id'), 'type': 'level', 'user_id': user_id, 'at': at,
+                      'level_mg': level, 'hours_until_safe': safe_in}
+    return results
+
+
+def meal_error(request):
+    # Why a /meal request is invalid (None if it is valid), checked before it
+    # joins a batch
+    try:
+        cohort.profile_target({**cli.DEFAULT_MEAL, **request})
+    except (TypeError, ValueError) as e:
+        return str(e)
+    return None
+
+
+class CalculatorService:
+    def __init__(self, workers=None, seed=0, window_ms=BATCH_WINDOW_MS, max_pending=MAX_PENDING,
+                 cache=None):
+        self.seed = seed
+        self.max_pending = max_pending
+        self.cache = cache if cache is not None else ResultCache(max_entries=CACHE_ENTRIES)
+        self.workers = workers
+        self.pool = self._new_pool()
+        self.tracker = CaffeineTracker()
+        self.batchers = {
+            'caffeine': MicroBatcher(self._inline(cli.caffeine_batch), window_ms),
+            'protein': MicroBatcher(self._inline(cli.protein_batch), window_ms),
+            'meal': MicroBatcher(self._meals, window_ms, MAX_MEAL_BATCH),
+            'intake': MicroBatcher(self._inline(lambda r: intake_batch(self.tracker, r)), window_ms),
+            'level': MicroBatcher(self._inline(lambda r: level_batch(self.tracker, r)), window_ms)
+        }
+        self.latency = {kind: LatencyStats() for kind in self.batchers}
+        self.in_flight = 0
+        self.rejected = 0
+        self.errors = 0
+        self.connections = {}
+
+    @staticmethod
+    def _inline(batch_function):
+        # Caffeine and protein batches take microseconds, run them on the loop
+        async def compute(requests):
+            return batch_function(requests)
+        return compute
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(self.workers, initializer=cohort.init_worker)
+
+    async def _meals(self, requests):
+        # Cached plans are answered here, only the rest go to the pool
+        results = cli.meal_batch(requests, self.seed, cache=self.cache, cached_only=True)
+        misses = [i for i, result in enumerate(results) if result is None]
+        if misses:
+            loop = asyncio.get_running_loop()
+            pool = self.pool
+            try:
+                computed = await loop.run_in_executor(pool, cli.meal_batch,
+                                                      [requests[i] for i in misses], self.seed)
+            except BrokenProcessPool:
+                # A worker died (out of memory, killed); later batches get a
+                # new pool, and a request that breaks it alone is its own error
+                if self.pool is pool:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    self.pool = self._new_pool()
+                if len(misses) > 1:
+                    raise
+                computed = [cli._error(requests[misses[0]],
+                                       "meal plan failed: worker process died")]
+            for i, result in zip(misses, computed):
+                results[i] = result
+                if 'error' not in result:
+                    profile = {**cli.DEFAULT_MEAL, **requests[i]}
+                    self.cache.put(cohort.plan_cache_key(profile, self.seed),
+                                   CompactPlan.from_dict(result['plan']))
+        return results
+
+    async def calculate(self, kind, request):
+        # Returns (HTTP status, result dict)
+        if self.in_flight >= self.max_pending:
+            self.rejected += 1
+            return 503, {'error': "server busy, retry later"}
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            request = dict(request, type=kind)
+            error = meal_error(request) if kind == 'meal' else None
+            if error is not None:
+                return 400, cli._error(request, error)
+            result = await self.batchers[kind].submit(request)
+        finally:
+            self.in_flight -= 1
+        self.latency[kind].add(time.perf_counter() - start)
+        return (400 if 'error' in result else 200), result
+
+    def stats(self):
+        return {
+            'in_flight': self.in_flight,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'meal_cache': self.cache.stats(),
+            'tracked_users': len(self.tracker),
+            'endpoints': {kind: {**self.latency[kind].summary(), **batcher.stats()}
+                          for kind, batcher in self.batchers.items()}
+        }
+
+    async def route(self, method, path, body):
+        kind = path.strip("/")
+        if path == "/stats":
+            return 200, self.stats()
+        if kind not in self.batchers:
+            return 404, {'error': f"unknown endpoint: {path}"}
+        if method != "POST":
+            return 405, {'error': "use POST"}
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError as e:
+            return 400, {'error': f"invalid JSON: {e}"}
+        if not isinstance(request, dict):
+            return 400, {'error': "request must be a JSON object"}
+        return await self.calculate(kind, request)
+
+    async def handle_connection(self, reader, writer):
+        # HTTP/1.1 with keep-alive; one request at a time per connection
+        task = asyncio.current_task()
+        self.connections[task] = writer
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_BYTES:
+                    status, result = 413, {'error': "request body too large"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    try:
+                        status, result = await self.route(method, path, body)
+                    except Exception as e:
+                        # A failed batch (a crashed worker process, a bug)
+                        # fails all of its requests; each still gets an answer
+                        self.errors += 1
+                        status, result = 500, {'error': f"internal error: {type(e).__name__}: {e}"}
+                    connection = headers.get('connection', "").lower()
+                    keep_alive = (connection != "close" if version == "HTTP/1.1"
+                                  else connection == "keep-alive")
+
+                payload = cli.encode_result(result).encode('utf-8')
+                head = (f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+                        f"Content-Type: application/json\r\n"
+                        f"Content-Length: {len(payload)}\r\n")
+                if status == 503:
+                    head += "Retry-After: 1\r\n"
+                if not keep_alive:
+                    head += "Connection: close\r\n"
+                writer.write(head.encode('latin-1') + b"\r\n" + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            # Malformed request or client went away
+            pass
+        finally:
+            del self.connections[task]
+            writer.close()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        return await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+
+    async def shutdown(self):
+        # Close idle keep-alive connections, let their handlers finish, then
+        # stop the worker processes
+        for writer in list(self.connections.values()):
+            writer.close()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, seed=0, cache_dir=None):
+    cache = ResultCache(cache_dir, max_entries=CACHE_ENTRIES)
+    service = CalculatorService(workers, seed, cache=cache)
+    server = await service.start(host, port)
+    print(f"Serving on http://{host}:{server.sockets[0].getsockname()[1]}", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.shutdown()
+
+
+# Load generator
+
+def sample_request(kind, rng):
+    if kind == "caffeine":
+        return {'dose': round(rng.uniform(20, 1200)), 'unit': "mg"}
+    if kind == "protein":
+        return {'weight': round(rng.uniform(45, 140), 1), 'unit': rng.choice(["kg", "lbs"]),
+                'activity': rng.choice(list(BASE_PROTEIN)),
+                'goal': rng.choice(list(GOAL_MULTIPLIER))}
+    if kind in ("intake", "level"):
+        request = {'user_id': f"load-{rng.randrange(100000)}"}
+        if kind == "intake":
+            request.update(dose=rng.choice([63, 80, 95, 120, 200]), unit="mg")
+        return request
+    return {'user_id': f"load-{rng.getrandbits(32)}", 'weight': round(rng.uniform(45, 140)),
+            'diet': rng.choice(list(DIET_CATEGORIES)),
+            'meals_per_day': rng.choice([3, 4, 5, 6])}
+
+
+async def _client(host, port, kind, count, rng, latencies, statuses, profiles=None):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(count):
+            request = rng.choice(profiles) if profiles else sample_request(kind, rng)
+            body = json.dumps(request).encode('utf-8')
+            start = time.perf_counter()
+            writer.write(f"POST /{kind} HTTP/1.1\r\nHost: {host}\r\n"
+                         f"Content-Type: application/json\r\n"
+                         f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode('latin-1').partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def load_generator(host, port, kind="protein", total=10000, concurrency=64, seed=0,
+                         profiles=0):
+    # `concurrency` keep-alive connections send `total` requests between them,
+    # drawn from `profiles` distinct requests (0: every request is new)
+    rng = random.Random(seed)
+    latencies, statuses = [], {}
+    pool = [sample_request(kind, rng) for _ in range(profiles)]
+    start = time.perf_counter()
+    shares = [total // concurrency + (i < total % concurrency) for i in range(concurrency)]
+    await asyncio.gather(*(_client(host, port, kind, n, random.Random(rng.getrandbits(64)),
+                                   latencies, statuses, pool) for n in shares if n))
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    p50, p99 = np.percentile(ms, [50, 99]) if ms.size else (0.0, 0.0)
+    return {'kind': kind, 'requests': len(latencies), 'seconds': round(elapsed, 3),
+            'requests_per_s': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(float(p50), 3), 'p99_ms': round(float(p99), 3),
+            'statuses': statuses}
+
+
+async def _loadgen(args):
+    service = None
+    host, port = args.host, args.port
+    if args.serve:
+        service = CalculatorService(args.workers)
+        server = await service.start(host, 0)
+        port = server.sockets[0].getsockname()[1]
+    try:
+        report = await load_generator(host, port, args.kind, args.requests, args.concurrency,
+                                      profiles=args.profiles)
+        if service is not None:
+            report['server'] = service.stats()
+        print(json.dumps(report, indent=2))
+    finally:
+        if service is not None:
+            server.close()
+            await service.shutdown()
+            await server.wait_closed()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local HTTP service for the calculators")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="run the service")
+    serve_parser.add_argument("--host", default=DEFAULT_HOST)
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("--workers", type=int, default=None,
+                              help="meal-plan processes (default: one per CPU)")
+    serve_parser.add_argument("--seed", type=int, default=0, help="base seed for meal-plan RNGs")
+    serve_parser.add_argument("--cache-dir", default=None,
+                              help="also keep cached meal plans on disk in this directory")
+
+    load_parser = commands.add_parser("loadgen", help="send requests and report latency")
+    load_parser.add_argument("--host", default=DEFAULT_HOST)
+    load_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    load_parser.add_argument("--kind", choices=["caffeine", "protein", "meal", "intake", "level"],
+                             default="protein")
+    load_parser.add_argument("-n", "--requests", type=int, default=10000)
+    load_parser.add_argument("-c", "--concurrency", type=int, default=64)
+    load_parser.add_argument("--profiles", type=int, default=0,
+                             help="draw requests from this many distinct ones (default: all new)")
+    load_parser.add_argument("--serve", action="store_true",
+                             help="start a server in this process on a free port")
+    load_parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "serve":
+            asyncio.run(serve(args.host, args.port, args.workers, args.seed, args.cache_dir))
+        else:
+            asyncio.run(_loadgen(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
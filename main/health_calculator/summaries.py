@@ -0,0 +1,94 @@
+# Text summaries of the calculator results, shared by the result panels of
+# the GUI and the headless reports (reports.py). Plain Python, no GUI imports.
+
+
+def format_dose(caffeine_grams, caffeine_mg):
+    mg = f"{caffeine_mg:,.0f}" if caffeine_mg >= 1000 else f"{caffeine_mg:.0f}"
+    grams = f"{caffeine_grams:,.1f}" if caffeine_grams >= 1 else f"{caffeine_grams:.3f}"
+    return f"{grams}g ({mg}mg)"
+
+
+def caffeine_summary(caffeine_grams, caffeine_mg, safe_hours, safety_level, bands=None):
+    # `bands` (caffeine_population.population_bands) adds the range of sleep
+    # impact between people
+    summary = f"""• Dose: {format_dose(caffeine_grams, caffeine_mg)}
+• Sleep Impact: {safe_hours:.1f} hours
+• Safety: {safety_level}"""
+    if bands is not None:
+        low, high = bands['percentiles'][0], bands['percentiles'][-1]
+        summary += (f"\n• For {high - low:g}% of People: {bands['safe_hours'][0]:.1f}"
+                    f"–{bands['safe_hours'][-1]:.1f} hours")
+    return summary
+
+
+def protein_summary(weight, unit, protein_data, activity, goal):
+    daily_protein = protein_data["daily_protein"]
+    protein_per_kg = protein_data["protein_per_kg"]
+    return f"""• Your Weight: {weight} {unit}
+• Activity Level: {activity}
+• Fitness Goal: {goal}
+• Recommended Daily Protein: {daily_protein:.1f}g
+• Protein Intake: {protein_per_kg:.1f}g per kg
+• Meal Distribution (4 meals): {daily_protein/4:.1f}g per meal"""
+
+
+def meal_plan_summary(weight, unit, daily_protein, meal_plan, diet_pref, icons=True):
+    # List of (text, tag) pieces; tag is 'header', 'meal_header' or None so
+    # the Text widget can style them. `icons=False` leaves out the emoji,
+    # which the default matplotlib font can't draw.
+    summary_icon, meal_icon = ("📊 ", "🍽️ ") if icons else ("", "")
+    parts = [
+        (f"{summary_icon}DAILY MEAL PLAN SUMMARY\n", 'header'),
+        ("="*50 + "\n", None),
+        (f"• Weight: {weight} {unit}\n"
+         f"• Target Protein: {daily_protein:.1f}g\n"
+         f"• Achieved Protein: {meal_plan['total_protein']:.1f}g\n"
+         f"• Total Calories: {meal_plan['total_calories']:.0f} kcal\n"
+         f"• Diet Preference: {diet_pref}\n\n", None),
+    ]
+    parts.extend(_meal_parts(meal_plan, meal_icon))
+    return parts
+
+
+def week_plan_summary(weight, unit, days, icons=True):
+    # Like meal_plan_summary for a week_planner.MultiDayPlan.to_dict() list of
+    # days; locked days are marked
+    summary_icon, day_icon, meal_icon = ("📅 ", "🗓️ ", "🍽️ ") if icons else ("", "", "")
+    parts = [
+        (f"{summary_icon}{len(days)}-DAY MEAL PLAN\n", 'header'),
+        ("="*50 + "\n", None),
+        (f"• Weight: {weight} {unit}\n"
+         f"• Average Protein: {sum(d['plan']['total_protein'] for d in days) / len(days):.1f}g\n"
+         f"• Average Calories: {sum(d['plan']['total_calories'] for d in days) / len(days):.0f} kcal\n\n",
+         None),
+    ]
+    for day in days:
+        plan = day['plan']
+        lock = " (locked)" if day['locked'] else ""
+        parts.append((f"{day_icon}DAY {day['day']}{lock}\n", 'header'))
+        parts.append((f"   Target: {day['daily_protein']:.1f}g | "
+                      f"Achieved: {plan['total_protein']:.1f}g | "
+                      f"Calories: {plan['total_calories']:.0f} kcal | {day['diet_pref']}\n", None))
+        parts.extend(_meal_parts(plan, meal_icon))
+    return parts
+
+
+def _meal_parts(meal_plan, meal_icon):
+    parts = []
+    for meal in meal_plan['meals']:
+        parts.append((f"{meal_icon}{meal['name']}\n", 'meal_header'))
+        lines = [f"   Protein: {meal['protein']:.1f}g | Calories: {meal['calories']:.0f}\n"]
+        for food in meal['foods']:
+            lines.append(f"   • {food['name']}: {food['servings']} serving(s) ({food['serving_size']})\n")
+            lines.append(f"     → Protein: {food['protein']:.1f}g | Calories: {food['calories']:.0f}\n")
+        lines.append("\n")
+        parts.append(("".join(lines), None))
+    return parts
+
+
+def text_rows(parts):
+    # (line, tag) per line of (text, tag) pieces, for virtual_list.VirtualList
+    rows = []
+    for text, tag in parts:
+        rows.extend((line, tag) for line in text.split("\n")[:-1])
+    return rows
@@ -0,0 +1,75 @@
+# CaffeineTracker against summing every drink's decay
+import numpy as np
+import pytest
+
+from caffeine_tracker import CaffeineTracker
+
+
+def expected_levels(users, doses, times, at, half_life):
+    # mg left at `at` per user, from every drink on its own
+    levels = {}
+    for user, dose, time in zip(users, doses, times):
+        levels[user] = levels.get(user, 0.0) + dose * 2.0 ** (-(at - time) / half_life)
+    return levels
+
+
+def random_events(seed, users=50, events=400):
+    rng = np.random.default_rng(seed)
+    return (rng.integers(users, size=events).tolist(), rng.uniform(20, 300, events),
+            rng.uniform(-30, 30, events))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_add_slots_matches_sequential_add(seed):
+    users, doses, times = random_events(seed)
+    batched, sequential = CaffeineTracker(), CaffeineTracker()
+    for start in range(0, len(users), 64):
+        part = slice(start, start + 64)
+        batched.add_many(users[part], doses[part], times[part])
+    for user, dose, time in zip(users, doses, times):
+        sequential.add(user, dose, time)
+
+    assert batched.users == sequential.users
+    np.testing.assert_allclose(batched.times[:len(batched)], sequential.times[:len(sequential)])
+    np.testing.assert_allclose(batched.levels_at(40.0), sequential.levels_at(40.0), rtol=1e-9)
+    expected = expected_levels(users, doses, times, 40.0, batched.half_life)
+    for user, level in expected.items():
+        assert batched.level(user, 40.0) == pytest.approx(level, rel=1e-9)
+
+
+def test_out_of_order_events():
+    in_order, shuffled = CaffeineTracker(), CaffeineTracker()
+    events = [("ana", 95, 8.0), ("ana", 63, 13.5), ("ana", 200, 20.0), ("ben", 120, 14.0)]
+    for event in events:
+        in_order.add(*event)
+    for event in reversed(events):
+        shuffled.add(*event)
+    for user in ("ana", "ben"):
+        assert shuffled.level(user, 22.0) == pytest.approx(in_order.level(user, 22.0))
+    # Drinks logged late never move a user back in time
+    assert shuffled.times[shuffled.slots["ana"]] == 20.0
+
+
+def test_first_drink_starts_the_clock():
+    # Times before 0 are not decayed to 0 first
+    tracker = CaffeineTracker()
+    tracker.add("ana", 200, at=-5.0)
+    tracker.add_many(["ben", "ben"], [100, 100], [-3.0, -4.0])
+    assert tracker.times[tracker.slots["ana"]] == -5.0
+    assert tracker.level("ana", -5.0) == pytest.approx(200)
+    assert tracker.times[tracker.slots["ben"]] == -3.0
+    assert tracker.level("ben", -3.0) == pytest.approx(100 + 100 * 2.0 ** (-1 / tracker.half_life))
+    safe = tracker.safe_times()
+    assert safe[tracker.slots["ana"]] == pytest.approx(-5.0 + tracker.half_life * 2)
+
+
+def test_capacity_grows():
+    tracker = CaffeineTracker(capacity=2)
+    users = [f"u{i}" for i in range(100)]
+    tracker.add_many(users[:50], np.full(50, 100.0), np.arange(50.0))
+    for i, user in enumerate(users[50:], start=50):
+        tracker.add(user, 100.0, float(i))
+    assert len(tracker) == 100 and tracker.levels.size == 128
+    expected = 100.0 * 2.0 ** (-(200.0 - np.arange(100.0)) / tracker.half_life)
+    np.testing.assert_allclose(tracker.levels_at(200.0), expected)
+    assert tracker.above(200.0, threshold_mg=expected[97]) == users[98:]
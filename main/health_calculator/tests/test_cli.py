@@ -0,0 +1,22 @@
+# cli.py streams: one result per line, in order, whatever the line holds
+import json
+
+import pytest
+
+import cli
+from constants import PROTEIN_PER_KG
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_bad_meal_lines_give_error_records(workers):
+    requests = [{'id': 1, 'type': 'meal', 'weight': "inf"},
+                {'id': 2, 'type': 'meal', 'weight': 1e9},
+                {'id': 3, 'type': 'meal', 'weight': 70, 'meals_per_day': 2.7},
+                {'id': 4, 'type': 'caffeine'},
+                {'id': 5, 'type': 'meal'}]
+    lines = [json.dumps(request) for request in requests]
+    results = list(cli.iter_results(lines, workers=workers, batch_size=2))
+    assert [r['id'] for r in results] == [1, 2, 3, 4, 5]
+    assert ['error' in r for r in results] == [True, True, True, False, False]
+    # A meal line without a weight uses the Meal Planner tab's
+    assert results[4]['daily_protein'] == pytest.approx(cli.DEFAULT_MEAL['weight'] * PROTEIN_PER_KG)
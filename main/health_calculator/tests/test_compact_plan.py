@@ -0,0 +1,84 @@
+# CompactPlan <-> plan dict round trips and totals
+import pickle
+
+import numpy as np
+import pytest
+
+import core
+from benchmarks import synthetic_table
+from compact_plan import CompactPlan, memory_report
+from food_table import default_table
+from meal_search import search_meal_plans
+
+DIETS = ("Mixed", "Animal Based", "Plant Based", "Vegetarian")
+
+
+def random_plans(table, count, seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        diet = DIETS[rng.integers(len(DIETS))]
+        protein = float(rng.uniform(20, 300))
+        meals = int(rng.integers(1, 7))
+        plan = core.create_meal_plan(diet, protein, meals, rng=int(rng.integers(2**32)),
+                                     variety=float(rng.uniform(0, 0.5)), table=table)
+        yield plan, meals
+
+
+def check(plan, table, meals_per_day=None):
+    compact = CompactPlan.from_dict(plan, table, meals_per_day)
+    assert compact.to_dict(table) == plan
+    assert pickle.loads(pickle.dumps(compact)) == compact
+
+    # Totals from bincount match the dict summed again
+    protein, calories = compact.meal_totals(table)
+    by_name = {meal['name']: meal for meal in plan['meals']}
+    for number in range(compact.meals_per_day):
+        meal = by_name.get(f"Meal {number + 1}", {'foods': []})
+        assert protein[number] == pytest.approx(sum(f['protein'] for f in meal['foods']))
+        assert calories[number] == pytest.approx(sum(f['calories'] for f in meal['foods']))
+    assert compact.totals(table) == (pytest.approx(plan['total_protein']),
+                                     pytest.approx(plan['total_calories']))
+    rows, servings = compact.daily_foods()
+    assert [table.names[r] for r in rows.tolist()] == [f['name'] for f in plan['foods']]
+    assert servings.tolist() == [f['servings'] for f in plan['foods']]
+    return compact
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_solver_plans_round_trip(seed):
+    table = default_table()
+    for plan, meals in random_plans(table, 10, seed):
+        assert check(plan, table, meals).meals_per_day == meals
+        # Straight from the solver's rows too
+        rows, meal_index = core.solve_meal_rows(table, "Mixed", plan['total_protein'], meals)
+        direct = CompactPlan.from_rows(rows, meal_index, meals)
+        assert direct.to_dict(table) == core.build_meal_plan(table, rows, meal_index, meals)
+
+
+def test_large_table_round_trip():
+    table = synthetic_table(10_000)
+    for plan, meals in random_plans(table, 30, 7):
+        check(plan, table, meals)
+
+
+@pytest.mark.parametrize("diet", DIETS)
+def test_search_plans_round_trip(diet):
+    table = default_table()
+    for plan in search_meal_plans(diet, 150, 4, rng=3, budget_ms=None, table=table):
+        plan = dict(plan)
+        plan.pop('score')
+        check(plan, table)
+
+
+def test_merged_servings():
+    # Repeated rows in one meal merge, meals without food are kept empty
+    table = default_table()
+    compact = CompactPlan.from_rows([3, 1, 3, 1, 2], [2, 2, 2, 0, 2], 4, servings=[1, 2, 1, 1, 1])
+    assert compact.entries.tolist() == [(1, 1, 0), (3, 2, 2), (1, 2, 2), (2, 1, 2)]
+    assert compact.meal_totals(table)[0][[1, 3]].tolist() == [0.0, 0.0]
+    assert compact.to_dict(table) == core.build_meal_plan(table, [3, 1, 3, 1, 2], [2, 2, 2, 0, 2],
+                                                          4, [1, 2, 1, 1, 1])
+
+
+def test_memory_at_least_ten_times_smaller():
+    assert memory_report()['ratio'] >= 10
@@ -0,0 +1,140 @@
+# Catalogue import -> snapshot -> default_table() round trips
+import io
+import json
+
+import numpy as np
+import pytest
+
+import food_import
+import food_table
+from food_import import ImportStats, import_catalogue, load_snapshot
+
+GOOD = [
+    {'name': "Chicken Breast", 'protein': 31, 'calories': 165, 'category': "poultry"},
+    {'name': "Tofu", 'protein_g': 8, 'energy_kj': 318, 'type': "soy", 'serving': "100g"},
+    {'name': "Greek  Yogurt", 'protein': 10, 'kcal': 59, 'group': "dairy",
+     'serving_size': "1 cup"},
+    {'name': "Whey", 'protein_mg': 25000, 'calories': 120, 'category': "supplement"},
+]
+BAD = [
+    {'name': "", 'protein': 1, 'calories': 1, 'category': "meat"},
+    {'name': "No Protein", 'calories': 1, 'category': "meat"},
+    {'name': "Text", 'protein': "lots", 'calories': 1, 'category': "meat"},
+    {'name': "Negative", 'protein': -1, 'calories': 1, 'category': "meat"},
+    {'name': "Rock", 'protein': 1, 'calories': 1, 'category': "mineral"},
+    # Same name as the first good row: the first one wins
+    {'name': "Chicken Breast", 'protein': 99, 'calories': 1, 'category': "meat"},
+]
+EXPECTED = [("Chicken Breast", 31.0, 165.0, 'animal', "100g"),
+            ("Tofu", 8.0, 318 / 4.184, 'plant', "100g"),
+            ("Greek Yogurt", 10.0, 59.0, 'vegetarian', "1 cup"),
+            ("Whey", 25.0, 120.0, 'animal', "100g")]
+REJECTED = {"missing name": 1, "missing protein or calories": 1,
+            "non-numeric protein or calories": 1, "negative or non-finite protein or calories": 1,
+            "unknown category": 1, "duplicate name": 1}
+
+
+def check_table(table, expected=EXPECTED):
+    assert len(table) == len(expected)
+    for row, (name, protein, calories, category, serving) in enumerate(expected):
+        assert table.names[row] == name
+        assert table.index_of(name) == row
+        assert table.protein[row] == pytest.approx(protein, rel=1e-6)
+        assert table.calories[row] == pytest.approx(calories, rel=1e-6)
+        assert table.category(row) == category
+        assert table.serving(row) == serving
+
+
+def write_csv(path, records):
+    columns = sorted({key for record in records for key in record})
+    lines = [",".join(columns)]
+    lines += [",".join(str(record.get(c, "")) for c in columns) for record in records]
+    path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl", "json"])
+def test_round_trip(tmp_path, fmt):
+    records = GOOD[:2] + BAD + GOOD[2:]
+    source = tmp_path / f"foods.{fmt}"
+    if fmt == "csv":
+        write_csv(source, records)
+    elif fmt == "jsonl":
+        source.write_text("\n".join(map(json.dumps, records)), encoding='utf-8')
+    else:
+        source.write_text(json.dumps(records, indent=1), encoding='utf-8')
+
+    snapshot = tmp_path / "foods.snap"
+    stats = import_catalogue(str(source), str(snapshot), chunk_rows=3)
+    assert stats.rows_read == len(records)
+    assert stats.rows_written == len(GOOD)
+    assert stats.rejected == REJECTED
+
+    table = load_snapshot(str(snapshot))
+    check_table(table)
+    # Prebuilt indexes match the ones a fresh table computes
+    fresh = food_table.FoodTable(list(table.names), table.protein, table.calories,
+                                 table.category_codes, table.serving_codes, table.serving_sizes)
+    assert np.array_equal(table.density_order, fresh.density_order)
+    for category, rows in fresh.category_rows.items():
+        assert np.array_equal(table.category_rows[category], rows)
+
+
+def test_default_table_from_snapshot(tmp_path, monkeypatch):
+    source = tmp_path / "foods.jsonl"
+    source.write_text("\n".join(map(json.dumps, GOOD)), encoding='utf-8')
+    snapshot = tmp_path / "foods.snap"
+    import_catalogue(str(source), str(snapshot))
+
+    monkeypatch.setenv(food_import.SNAPSHOT_ENV, str(snapshot))
+    previous = food_table._default_table
+    food_table.set_default_table(None)
+    try:
+        check_table(food_table.default_table())
+    finally:
+        food_table.set_default_table(previous)
+
+
+def test_malformed_jsonl_lines(tmp_path):
+    source = tmp_path / "foods.jsonl"
+    source.write_text(json.dumps(GOOD[0]) + "\n{not json\n[1, 2]\n" + json.dumps(GOOD[1]) + "\n",
+                      encoding='utf-8')
+    stats = import_catalogue(str(source), str(tmp_path / "foods.snap"))
+    assert stats.rows_written == 2
+    assert stats.rejected == {"invalid JSON line": 1, "not an object": 1}
+
+
+def test_json_array_streaming():
+    items = [1, 23456, -7.5e3, True, None, "a, b]", {'x': [1, {'y': "]"}]}, [], 1234567890]
+    text = json.dumps(items)
+    # Every buffer size splits some item across reads
+    for buffer_size in range(1, len(text) + 2):
+        assert list(food_import._iter_json_array(io.StringIO(text), buffer_size)) == items
+    assert list(food_import._iter_json_array(io.StringIO("  [ ]  "), 2)) == []
+
+
+@pytest.mark.parametrize("text", ["", "5", '{"a": 1}', "[1, 2", "[1 2]", "[1,]"])
+def test_json_array_errors(text):
+    with pytest.raises(ValueError):
+        list(food_import._iter_json_array(io.StringIO(text), 3))
+
+
+def test_scalar_items_are_rejected(tmp_path):
+    source = tmp_path / "foods.json"
+    source.write_text(json.dumps([5, "Tofu", GOOD[0]]), encoding='utf-8')
+    stats = import_catalogue(str(source), str(tmp_path / "foods.snap"))
+    assert stats.rows_written == 1 and stats.rejected == {"not an object": 2}
+
+
+def test_nothing_usable(tmp_path):
+    source = tmp_path / "foods.json"
+    source.write_text(json.dumps(BAD[:3]), encoding='utf-8')
+    with pytest.raises(ValueError):
+        import_catalogue(str(source), str(tmp_path / "foods.snap"))
+
+
+def test_normalize_record_units():
+    stats = ImportStats()
+    assert food_import.normalize_record({'Name': " Lentils ", 'Protein_MG': "9000",
+                                         'kJ': 4.184 * 116, 'Category': "Legumes"}, stats) \
+        == ("Lentils", 9.0, pytest.approx(116.0), 'plant', "100g")
+    assert not stats.rejected
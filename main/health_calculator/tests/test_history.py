@@ -0,0 +1,133 @@
+# HistoryStore writer thread, write errors and daily totals
+import json
+import sqlite3
+import threading
+
+import pytest
+
+import history
+from history import HistoryStore, SECONDS_PER_DAY
+
+# 2026-10-18 00:00:00 UTC
+MIDNIGHT = 1_792_281_600
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    yield store
+    if store.writer.is_alive():
+        store.queue.put(history._STOP)
+        store.writer.join()
+
+
+def test_record_and_query(store):
+    store.record('caffeine', {'dose_mg': 95.0}, user="ana", at=MIDNIGHT + 10)
+    store.record_many([(MIDNIGHT + 20, "ben", 'protein', 120.0,
+                        json.dumps({'daily_protein': 120.0}))])
+    store.record('meal', {'plan': {'total_protein': 140.0}}, at=MIDNIGHT + 5)
+    store.flush()
+    assert store.written == 3
+    rows = store.query()
+    assert [(r['kind'], r['value'], r['user']) for r in rows] == \
+        [('meal', 140.0, None), ('caffeine', 95.0, "ana"), ('protein', 120.0, "ben")]
+    assert rows[1]['result'] == {'dose_mg': 95.0}
+    assert store.query(user="ben", kind='protein')[0]['at'] == MIDNIGHT + 20
+    assert len(store.query(start=MIDNIGHT + 10, end=MIDNIGHT + 20)) == 1
+    assert len(store.query(limit=2)) == 2
+
+
+def test_database_is_opened_on_the_writer(tmp_path, monkeypatch):
+    threads = []
+    connect = history._connect
+
+    def recording_connect(path):
+        threads.append(threading.current_thread())
+        return connect(path)
+
+    monkeypatch.setattr(history, "_connect", recording_connect)
+    store = HistoryStore(str(tmp_path / "new" / "history.db"))
+    store.record('caffeine', {'dose_mg': 1.0})
+    store.close()
+    assert threads == [store.writer]
+    assert store.written == 1
+
+
+def test_record_never_waits(tmp_path, monkeypatch):
+    # The writer is held while opening, so the queue fills up
+    release = threading.Event()
+    connect = history._connect
+
+    def slow_connect(path):
+        release.wait()
+        return connect(path)
+
+    monkeypatch.setattr(history, "_connect", slow_connect)
+    monkeypatch.setattr(history, "MAX_QUEUED_BATCHES", 3)
+    store = HistoryStore(str(tmp_path / "history.db"))
+    for i in range(10):
+        store.record('caffeine', {'dose_mg': float(i)}, at=MIDNIGHT + i)
+    assert store.dropped == 7
+    release.set()
+    store.close()
+    assert store.written == 3
+    assert [r['value'] for r in store.query()] == [0.0, 1.0, 2.0]
+
+
+def test_write_error_is_raised_and_later_rows_written(store):
+    # A row with the wrong number of columns fails its transaction
+    store.record_many([(MIDNIGHT, None, 'caffeine', 1.0)])
+    with pytest.raises(sqlite3.Error):
+        store.flush()
+    store.record('caffeine', {'dose_mg': 2.0}, at=MIDNIGHT)
+    with pytest.raises(sqlite3.Error):
+        store.close()
+    assert [r['value'] for r in store.query()] == [2.0]
+
+
+def test_open_error(tmp_path):
+    # The database path is a directory
+    store = HistoryStore(str(tmp_path))
+    store.record('caffeine', {'dose_mg': 1.0})
+    store.record_many([(MIDNIGHT, None, 'caffeine', 1.0, "{}")])
+    with pytest.raises(sqlite3.Error):
+        store.flush()
+    with pytest.raises(sqlite3.Error):
+        store.query()
+    with pytest.raises(sqlite3.Error):
+        store.close()
+    assert store.written == 0 and store.dropped == 2
+
+
+def test_daily_totals_day_boundaries(store):
+    values = {MIDNIGHT - 1: 10.0, MIDNIGHT: 20.0, MIDNIGHT + SECONDS_PER_DAY - 1: 30.0,
+              MIDNIGHT + SECONDS_PER_DAY: 40.0}
+    for at, mg in values.items():
+        store.record('caffeine', {'dose_mg': mg}, at=at)
+    store.record('protein', {'daily_protein': 99.0}, at=MIDNIGHT)
+    store.flush()
+
+    days = store.daily_totals('caffeine', utc_offset_hours=0)
+    assert [(d['date'], d['count'], d['total']) for d in days] == \
+        [("2026-10-17", 1, 10.0), ("2026-10-18", 2, 50.0), ("2026-10-19", 1, 40.0)]
+    assert (days[1]['mean'], days[1]['min'], days[1]['max']) == (25.0, 20.0, 30.0)
+
+    # One hour east of UTC the last second of a UTC day is already the next day
+    days = store.daily_totals('caffeine', utc_offset_hours=1)
+    assert [(d['date'], d['total']) for d in days] == \
+        [("2026-10-18", 30.0), ("2026-10-19", 70.0)]
+    # ... and west of it the first second is still the previous one
+    days = store.daily_totals('caffeine', utc_offset_hours=-1)
+    assert [(d['date'], d['total']) for d in days] == \
+        [("2026-10-17", 30.0), ("2026-10-18", 70.0)]
+
+    # start and end filter before grouping
+    days = store.daily_totals('caffeine', start=MIDNIGHT, end=MIDNIGHT + SECONDS_PER_DAY,
+                              utc_offset_hours=0)
+    assert [(d['date'], d['count']) for d in days] == [("2026-10-18", 2)]
+
+
+def test_module_record_is_off_without_the_variable(monkeypatch):
+    monkeypatch.delenv(history.HISTORY_ENV, raising=False)
+    assert history.default_store() is None
+    history.record('caffeine', {'dose_mg': 1.0})
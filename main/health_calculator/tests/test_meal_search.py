@@ -0,0 +1,25 @@
+# Scoring and search of random meal plans
+import numpy as np
+
+from food_table import FoodTable
+from meal_search import draw_candidates, score_candidates, search_meal_plans
+
+
+def test_zero_calorie_food_keeps_scores_finite():
+    protein = np.array([10.0, 25.0, 8.0], dtype=np.float32)
+    calories = np.array([0.0, 120.0, 90.0], dtype=np.float32)
+    rng = np.random.default_rng(0)
+    picks, servings = draw_candidates(protein, 60, 500, rng)
+    scores = score_candidates(protein, calories, picks, servings, 60, 3)
+    assert np.all(np.isfinite(scores))
+    # Plans leaning on the 0 kcal food still score best
+    best = picks[np.argmin(scores)][servings[np.argmin(scores)] > 0]
+    assert 0 in best.tolist()
+
+
+def test_search_with_zero_calorie_food():
+    names = ["Zero", "Whey", "Lentils", "Tofu", "Eggs"]
+    table = FoodTable(names, [10.0, 25.0, 9.0, 8.0, 13.0], [0.0, 120.0, 116.0, 76.0, 155.0],
+                      [0, 0, 1, 1, 2], [0] * 5, ["100g"])
+    plans = search_meal_plans("Mixed", 80, 3, rng=1, budget_ms=None, table=table)
+    assert plans and all(np.isfinite(plan['score']) for plan in plans)
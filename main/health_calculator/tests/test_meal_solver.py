@@ -0,0 +1,159 @@
+# meal_solver against brute force on small food lists
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+import core
+from food_table import FoodTable
+from meal_solver import solve_servings, distribute_into_meals
+
+
+def brute_force(protein, cost, target, tolerance, limits, resolution=1.0):
+    # (best cost in the target window of floored protein or None, highest
+    # reachable floored units, best cost there that also stays under
+    # target + tolerance in real protein, best cost with the real protein in
+    # [target, target + tolerance]); None where there is no such plan
+    units = np.floor(np.asarray(protein) / resolution).astype(int)
+    low = max(math.ceil(target / resolution - 1e-9), 0)
+    high = low + round(tolerance / resolution)
+    best = capped = real_best = None
+    reachable = 0
+    for servings in itertools.product(*(range(n + 1) for n in limits)):
+        value = float(np.dot(servings, cost))
+        real = float(np.dot(servings, protein))
+        if target - 1e-9 <= real <= target + tolerance + 1e-9:
+            real_best = value if real_best is None else min(real_best, value)
+        total = int(np.dot(servings, units))
+        if total > high:
+            continue
+        reachable = max(reachable, total)
+        if total >= low:
+            best = value if best is None else min(best, value)
+            if real <= target + tolerance + 1e-9:
+                capped = value if capped is None else min(capped, value)
+    return best, reachable, capped, real_best
+
+
+def random_case(rng, foods):
+    protein = rng.integers(1, 30, foods) + rng.choice([0.0, 0.4, 0.9], foods)
+    cost = rng.integers(20, 400, foods).astype(float)
+    limits = rng.integers(0, 4, foods)
+    target = float(rng.integers(1, 80))
+    tolerance = float(rng.integers(0, 6))
+    return protein, cost, target, tolerance, limits
+
+
+def check_servings(servings, protein, cost, target, tolerance, limits):
+    assert np.all(servings >= 0) and np.all(servings <= limits)
+    best, reachable, capped, real_best = brute_force(protein, cost, target, tolerance, limits)
+    if best is None:
+        # Infeasible: as close to the target as the limits allow
+        assert int(np.dot(servings, np.floor(protein))) == reachable
+    elif real_best is not None:
+        # Never over target + tolerance in real protein, even when flooring
+        # the fractional grams would allow it
+        assert target - 1e-9 <= float(np.dot(servings, protein)) <= target + tolerance + 1e-9
+        value = float(np.dot(servings, cost))
+        assert value >= real_best - 1e-6
+        if capped is not None:
+            assert value <= capped + 1e-6
+
+
+@pytest.mark.parametrize("seed", range(150))
+def test_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    protein, cost, target, tolerance, limits = random_case(rng, int(rng.integers(1, 6)))
+    servings = solve_servings(protein, cost, target, tolerance, limits)
+    check_servings(servings, protein, cost, target, tolerance, limits)
+
+
+def test_fractional_protein_stays_under_tolerance():
+    # Four 31.9 g servings floor to 124 g, but are really 127.6 g
+    protein, cost, limits = [31.9, 10.0], [100.0, 150.0], [4, 12]
+    servings = solve_servings(protein, cost, 120, 5, limits)
+    assert 120 <= float(np.dot(servings, protein)) <= 125
+    check_servings(servings, np.array(protein), np.array(cost), 120.0, 5.0, np.array(limits))
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_rng_keeps_optimal_cost(seed):
+    rng = np.random.default_rng(1000 + seed)
+    protein, cost, target, tolerance, limits = random_case(rng, 5)
+    servings = solve_servings(protein, cost, target, tolerance, limits, rng=rng)
+    check_servings(servings, protein, cost, target, tolerance, limits)
+
+
+def test_scalar_max_servings():
+    servings = solve_servings([10.0, 10.0], [100.0, 50.0], 60, 0, max_servings=3)
+    assert servings.tolist() == [3, 3]
+    assert solve_servings([10.0, 10.0], [100.0, 50.0], 30, 0, max_servings=3).tolist() == [0, 3]
+
+
+def test_infeasible_targets():
+    # Over the limits: every serving allowed
+    assert solve_servings([10.0, 20.0], [1.0, 1.0], 500, 5, [2, 1]).tolist() == [2, 1]
+    # No usable food at all
+    assert solve_servings([10.0], [1.0], 50, 5, [0]).tolist() == [0]
+    assert solve_servings([0.5], [1.0], 50, 5, [3]).tolist() == [0]
+    # Nothing to reach
+    assert solve_servings([10.0], [1.0], 0, 5, [3]).tolist() == [0]
+
+
+def test_order_restricts_foods():
+    servings = solve_servings([10.0, 10.0, 20.0], [1.0, 1.0, 1.0], 20, 0, 3, order=[0, 1])
+    assert servings[2] == 0 and servings.sum() == 2
+
+
+def small_table(protein, calories):
+    names = [f"Food {i}" for i in range(len(protein))]
+    return FoodTable(names, protein, calories, [0] * len(protein), [0] * len(protein), ["1 serving"])
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_pinned_rows(seed):
+    rng = np.random.default_rng(2000 + seed)
+    foods = 5
+    protein = rng.integers(1, 30, foods).astype(float)
+    calories = rng.integers(20, 400, foods).astype(float)
+    table = small_table(protein, calories)
+    limits = rng.integers(0, 4, foods)
+    pinned = sorted(rng.choice(foods, int(rng.integers(1, 3)), replace=False).tolist())
+    target = float(rng.integers(10, 120))
+
+    rows, meal_index = core.solve_meal_rows(table, "Mixed", target, 3, tolerance=5.0,
+                                            max_servings=limits, pinned=pinned)
+    counts = np.bincount(rows, minlength=foods)
+    # At least one serving of every pinned food, even with a limit of 0
+    assert np.all(counts[pinned] >= 1)
+    assert np.all(counts <= np.maximum(limits, np.isin(np.arange(foods), pinned)))
+    assert sorted(rows) == rows and len(meal_index) == len(rows)
+
+    # The rest is the optimum for what the pinned servings leave
+    rest_limits = limits.copy()
+    rest_limits[pinned] = np.maximum(rest_limits[pinned] - 1, 0)
+    rest_target = max(target - protein[pinned].sum(), 0.0)
+    best = brute_force(protein, calories, rest_target, 5.0, rest_limits)[0]
+    rest = counts.copy()
+    rest[pinned] -= 1
+    if best is not None and rest_target > 0:
+        assert float(np.dot(rest, calories)) == pytest.approx(best)
+
+
+def test_no_pins_is_unchanged():
+    table = small_table([30.0, 20.0, 8.0], [150.0, 120.0, 60.0])
+    assert core.solve_meal_rows(table, "Mixed", 70, 3) == \
+        core.solve_meal_rows(table, "Mixed", 70, 3, pinned=())
+
+
+def test_distribute_into_meals():
+    rng = np.random.default_rng(0)
+    for meals in range(1, 7):
+        protein = rng.integers(1, 40, 15).astype(float)
+        meal_index = distribute_into_meals(protein, meals)
+        assert meal_index.min() >= 0 and meal_index.max() < meals
+        loads = np.bincount(meal_index, weights=protein, minlength=meals)
+        assert loads.sum() == pytest.approx(protein.sum())
+        # Greedy largest-first keeps meals within one item of each other
+        assert loads.max() - loads.min() <= protein.max()
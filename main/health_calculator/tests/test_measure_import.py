@@ -0,0 +1,16 @@
+# measure_import.py reports the heavy libraries an import pulls in
+import measure_import
+
+
+def test_core_imports_no_heavy_library():
+    result = measure_import.measure("core", repeat=1)
+    assert result['heavy_loaded'] == []
+    assert measure_import.unexpected_heavy(result) == []
+
+
+def test_unexpected_heavy():
+    result = {'module': "core", 'heavy_loaded': ["numpy"]}
+    assert measure_import.unexpected_heavy(result) == ["numpy"]
+    assert measure_import.unexpected_heavy(dict(result, module="caffeine_engine")) == []
+    # Modules without an expectation are not checked
+    assert measure_import.unexpected_heavy(dict(result, module="charts")) == []
@@ -0,0 +1,19 @@
+# Reports: invalid members are error records, the others get a file
+import os
+
+import pytest
+
+import reports
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_bad_members_do_not_stop_the_batch(tmp_path, workers):
+    pytest.importorskip("matplotlib")
+    profiles = [{'user_id': "inf", 'weight': "inf"}, {'user_id': "huge", 'weight': 1e9},
+                {'user_id': "meals", 'weight': 70, 'meals_per_day': 2.7},
+                {'user_id': "coffee", 'weight': 70, 'caffeine_mg': "inf"},
+                {'user_id': "ok", 'weight': 70}]
+    results = list(reports.iter_reports(profiles, str(tmp_path), workers=workers, chunk_size=2))
+    assert [r['user_id'] for r in results] == ["inf", "huge", "meals", "coffee", "ok"]
+    assert all('error' in r for r in results[:4])
+    assert os.path.getsize(results[4]['path']) > 0
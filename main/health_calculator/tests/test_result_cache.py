@@ -0,0 +1,155 @@
+# ResultCache hits, invalidation and eviction
+import os
+import time
+
+import pytest
+
+import constants
+import food_table
+import result_cache
+from result_cache import ResultCache, meal_plan_key
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "cache")
+
+
+def fingerprint_dirs(directory):
+    return sorted(os.listdir(directory))
+
+
+def test_memory_hit_and_lru():
+    cache = ResultCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    # 'b' was the least recently used
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats()['hits'] == 3 and cache.stats()['misses'] == 1
+
+
+def test_disk_hit_in_a_new_cache(cache_dir):
+    key = meal_plan_key("Mixed", 120.4, 3)
+    ResultCache(cache_dir).put(key, {'plan': 1})
+    cache = ResultCache(cache_dir)
+    assert cache.get(meal_plan_key("Mixed", 120.9, 3)) == {'plan': 1}
+    assert cache.stats()['disk_hits'] == 1
+    # Now in memory too
+    assert cache.get(key) == {'plan': 1} and cache.stats()['disk_hits'] == 1
+
+
+def test_get_or_compute():
+    cache = ResultCache()
+    calls = []
+    for _ in range(3):
+        assert cache.get_or_compute('k', lambda: calls.append(1) or "value") == "value"
+    assert len(calls) == 1
+
+
+def test_constant_change_invalidates(cache_dir, monkeypatch):
+    cache = ResultCache(cache_dir)
+    cache.put('k', 1)
+    monkeypatch.setattr(constants, "MAX_SERVINGS_PER_FOOD", constants.MAX_SERVINGS_PER_FOOD + 1)
+    # Seen on the next check without an explicit invalidate()
+    monkeypatch.setattr(result_cache, "FINGERPRINT_CHECK_SECONDS", 0.0)
+    assert cache.get('k') is None
+    monkeypatch.undo()
+    # The old entries are still on disk for the old fingerprint
+    cache.invalidate()
+    assert cache.get('k') == 1
+
+
+def test_check_is_throttled(monkeypatch):
+    cache = ResultCache()
+    cache.put('k', 1)
+    monkeypatch.setattr(constants, "MAX_SERVINGS_PER_FOOD", constants.MAX_SERVINGS_PER_FOOD + 1)
+    assert cache.get('k') == 1
+    cache.invalidate()
+    assert cache.get('k') is None
+
+
+def test_table_swap_invalidates():
+    from food_table import FoodTable
+    cache = ResultCache()
+    cache.put('k', 1)
+    previous = food_table.default_table()
+    fingerprint = cache.fingerprint
+    try:
+        food_table.set_default_table(FoodTable(["Egg"], [6.0], [70.0], [0], [0], ["1 egg"]))
+        assert cache.fingerprint != fingerprint
+        assert cache.get('k') is None
+    finally:
+        food_table.set_default_table(previous)
+    assert cache.fingerprint == fingerprint
+
+
+def test_equal_tables_share_a_fingerprint():
+    from food_table import FoodTable
+    cache = ResultCache()
+    previous = food_table.default_table()
+    fingerprints = []
+    try:
+        for _ in range(2):
+            food_table.set_default_table(FoodTable(["Egg"], [6.0], [70.0], [0], [0], ["1 egg"]))
+            fingerprints.append(cache.fingerprint)
+        food_table.set_default_table(FoodTable(["Egg"], [6.5], [70.0], [0], [0], ["1 egg"]))
+        fingerprints.append(cache.fingerprint)
+    finally:
+        food_table.set_default_table(previous)
+    assert fingerprints[0] == fingerprints[1] != fingerprints[2]
+
+
+def test_other_fingerprints_are_kept(cache_dir, monkeypatch):
+    # Two processes running with different data do not delete each other's entries
+    ResultCache(cache_dir).put('k', 1)
+    monkeypatch.setattr(constants, "MAX_SERVINGS_PER_FOOD", constants.MAX_SERVINGS_PER_FOOD + 1)
+    other = ResultCache(cache_dir)
+    other.put('k', 2)
+    assert len(fingerprint_dirs(cache_dir)) == 2
+    monkeypatch.undo()
+    assert ResultCache(cache_dir).get('k') == 1
+
+
+def test_stale_fingerprints_are_pruned(cache_dir, monkeypatch):
+    old = ResultCache(cache_dir)
+    old.put('k', 1)
+    old_dir = old.disk.directory
+    long_ago = time.time() - result_cache.STALE_FINGERPRINT_SECONDS - 60
+    for name in os.listdir(old_dir):
+        os.utime(os.path.join(old_dir, name), (long_ago, long_ago))
+    os.utime(old_dir, (long_ago, long_ago))
+
+    monkeypatch.setattr(constants, "MAX_SERVINGS_PER_FOOD", constants.MAX_SERVINGS_PER_FOOD + 1)
+    new = ResultCache(cache_dir)
+    assert fingerprint_dirs(cache_dir) == [new.fingerprint]
+
+
+def test_disk_eviction_drops_least_recently_used(cache_dir):
+    cache = ResultCache(cache_dir, max_entries=1)
+    value = "x" * 1000
+    for key in range(4):
+        cache.put(key, value)
+    size = os.path.getsize(cache.disk._path(0))
+    # Oldest first: 0, 2, 3, then 1 touched by a hit
+    now = time.time()
+    for age, key in enumerate((0, 2, 3)):
+        os.utime(cache.disk._path(key), (now - 100 + age, now - 100 + age))
+    cache.put('last', None)
+    assert cache.get(1) == value
+
+    cache.disk.max_bytes = size * 3
+    cache.disk.evict()
+    remaining = {key for key in (0, 1, 2, 3) if os.path.exists(cache.disk._path(key))}
+    assert remaining == {1, 3}
+    assert cache.disk.total_bytes <= cache.disk.max_bytes * result_cache._DISK_LOW_WATER
+
+
+def test_disk_limit_applies_on_put(cache_dir):
+    cache = ResultCache(cache_dir, max_bytes=5000)
+    for key in range(20):
+        cache.put(key, "x" * 1000)
+    assert cache.disk.total_bytes <= 5000
+    assert sum(e.stat().st_size for e in os.scandir(cache.disk.directory)) == cache.disk.total_bytes
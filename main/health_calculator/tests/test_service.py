@@ -0,0 +1,121 @@
+# HTTP service: answers and errors over a real socket
+import asyncio
+import json
+
+import service
+
+
+async def post(port, path, body, requests=1):
+    # Sends `requests` POSTs on one keep-alive connection; returns (status, result) each
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = json.dumps(body).encode()
+    answers = []
+    for _ in range(requests):
+        writer.write(f"POST {path} HTTP/1.1\r\nContent-Length: {len(payload)}\r\n\r\n".encode()
+                     + payload)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while (line := await reader.readline()) != b"\r\n":
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        answers.append((status, json.loads(await reader.readexactly(int(headers['content-length'])))))
+    writer.close()
+    return answers
+
+
+def run_with_service(scenario):
+    async def main():
+        calculator = service.CalculatorService(workers=1)
+        server = await calculator.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await scenario(calculator, port)
+        finally:
+            server.close()
+            await calculator.shutdown()
+    return asyncio.run(main())
+
+
+def test_protein_request():
+    async def scenario(calculator, port):
+        return await post(port, "/protein", {'weight': 70, 'unit': "kg"})
+    [(status, result)] = run_with_service(scenario)
+    assert status == 200 and result['daily_protein'] > 0
+
+
+def test_failing_batch_answers_500():
+    async def scenario(calculator, port):
+        async def broken(requests):
+            raise RuntimeError("worker pool crashed")
+        calculator.batchers['caffeine'].compute = broken
+        # Several requests land in the same failing batch, one connection is reused
+        answers = await asyncio.gather(*(post(port, "/caffeine", {'dose': 0.1}) for _ in range(5)),
+                                       post(port, "/caffeine", {'dose': 0.1}, requests=2))
+        healthy = await post(port, "/protein", {'weight': 70})
+        return [a for group in answers for a in group], healthy, calculator.stats()
+
+    answers, healthy, stats = run_with_service(scenario)
+    assert len(answers) == 7
+    for status, result in answers:
+        assert status == 500
+        assert "RuntimeError: worker pool crashed" in result['error']
+    assert healthy[0][0] == 200
+    assert stats['errors'] == 7 and stats['in_flight'] == 0
+
+
+def test_bad_requests():
+    async def scenario(calculator, port):
+        return (await post(port, "/nope", {}) + await post(port, "/protein", [1])
+                + await post(port, "/protein", {'weight': -1}))
+    statuses = [status for status, _ in run_with_service(scenario)]
+    assert statuses == [404, 400, 400]
+
+
+def test_failing_request_fails_alone():
+    async def scenario(calculator, port):
+        compute = calculator.batchers['caffeine'].compute
+
+        async def fails_on_zero(requests):
+            if any(request['dose'] == 0 for request in requests):
+                raise RuntimeError("bad dose")
+            return await compute(requests)
+        calculator.batchers['caffeine'].compute = fails_on_zero
+        answers = await asyncio.gather(*(post(port, "/caffeine", {'dose': dose, 'unit': "mg"})
+                                         for dose in (0, 95, 200)))
+        return [a for group in answers for a in group], calculator.stats()
+
+    answers, stats = run_with_service(scenario)
+    assert [status for status, _ in answers] == [500, 200, 200]
+    assert answers[1][1]['dose_mg'] == 95
+    assert stats['endpoints']['caffeine']['retried_batches'] >= 1
+
+
+def test_invalid_meal_is_rejected_before_batching():
+    async def scenario(calculator, port):
+        answers = await asyncio.gather(
+            post(port, "/meal", {'weight': "inf"}), post(port, "/meal", {'weight': 1e9}),
+            post(port, "/meal", {'weight': 70, 'meals_per_day': 2.7}),
+            post(port, "/meal", {'user_id': "m1", 'weight': 70}))
+        return [a for group in answers for a in group], calculator.stats()
+
+    answers, stats = run_with_service(scenario)
+    assert [status for status, _ in answers] == [400, 400, 400, 200]
+    assert "at most" in answers[0][1]['error'] and "whole number" in answers[2][1]['error']
+    assert stats['endpoints']['meal']['batches'] == 1 and stats['errors'] == 0
+
+
+def test_dead_worker_fails_only_its_request():
+    async def scenario(calculator, port):
+        await post(port, "/meal", {'user_id': "warm", 'weight': 70})
+        broken = calculator.pool
+        for process in broken._processes.values():
+            process.kill()
+        answers = await asyncio.gather(*(post(port, "/meal", {'user_id': f"m{i}", 'weight': 70})
+                                         for i in range(3)))
+        again = await post(port, "/meal", {'user_id': "after", 'weight': 70})
+        return [a for group in answers for a in group], again, calculator.pool is not broken
+
+    answers, again, replaced = run_with_service(scenario)
+    assert replaced and again[0][0] == 200
+    assert all(status in (200, 400) for status, _ in answers)
@@ -0,0 +1,63 @@
+# Dose and weight units shared by the GUI, cli.py and the service
+import pytest
+
+import cli
+import cohort
+import core
+
+
+def test_dose_units():
+    assert core.to_mg(0.2, "grams") == pytest.approx(200.0)
+    assert core.to_mg(95, "milligrams") == core.to_mg(95, "mg") == 95
+    with pytest.raises(ValueError, match="unknown unit: oz"):
+        core.to_mg(1, "oz")
+
+
+def test_weight_units():
+    assert core.to_kg(70, "kg") == 70
+    assert core.to_kg(150, "lbs") == pytest.approx(68.0388)
+    with pytest.raises(ValueError, match="unknown unit: stone"):
+        core.to_kg(10, "stone")
+
+
+def test_caffeine_batch_units():
+    results = cli.caffeine_batch([{'id': 1, 'dose': 0.2, 'unit': "grams"},
+                                  {'id': 2, 'dose': 200, 'unit': "milligrams"},
+                                  {'id': 3, 'dose': 200, 'unit': "mg"},
+                                  {'id': 4, 'dose': 200, 'unit': "cups"}])
+    assert [r['dose_mg'] for r in results[:3]] == [pytest.approx(200.0)] * 3
+    assert results[1]['hours_until_safe'] == results[2]['hours_until_safe']
+    assert results[3]['error'] == "unknown unit: cups"
+
+
+def test_protein_batch_units():
+    results = cli.protein_batch([{'weight': 150, 'unit': "lbs"}, {'weight': 68.0388, 'unit': "kg"},
+                                 {'weight': 70, 'unit': "st"}])
+    assert results[0]['daily_protein'] == pytest.approx(results[1]['daily_protein'], rel=1e-5)
+    assert results[2]['error'] == "unknown unit: st"
+    with pytest.raises(ValueError):
+        cohort.read_profile({'weight': 70, 'unit': "st"})
+
+
+@pytest.mark.parametrize("profile, error", [
+    ({'weight': "inf"}, "weight must be at most"),
+    ({'weight': 1e9}, "weight must be at most"),
+    ({'weight': 1500, 'unit': "lbs"}, "weight must be at most"),
+    ({'weight': "nan"}, "weight must be positive"),
+    ({'weight': 70, 'meals_per_day': 2.7}, "whole number"),
+    ({'weight': 70, 'meals_per_day': 1e12}, "between 1 and"),
+])
+def test_profile_limits(profile, error):
+    with pytest.raises(ValueError, match=error):
+        cohort.read_profile(profile)
+    assert error in cohort.plan_for_profile(dict(profile, user_id=1))['error']
+
+
+def test_plan_failure_is_a_member_error(monkeypatch):
+    def failing_plan(*args, **kwargs):
+        raise MemoryError("no room")
+
+    monkeypatch.setattr(core, "create_meal_plan", failing_plan)
+    assert cohort.plan_for_profile({'user_id': 7, 'weight': 70}) == \
+        {'user_id': 7, 'error': "meal plan failed: no room"}
+    assert cohort.read_profile({'weight': 70, 'meals_per_day': "5"})[3] == 5
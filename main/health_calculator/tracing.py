@@ -0,0 +1,214 @@
+# Switchable tracing for the hot paths: named spans, counters and latency
+# histograms, exported as Chrome trace-event JSON (chrome://tracing or
+# https://ui.perfetto.dev) and as a plain-text summary.
+#
+# Tracing is off unless HEALTH_CALC_TRACE is set (to the trace file to write
+# at exit, or to "1" for the summary alone) or main.py runs with --trace.
+# While off, span() hands back one shared no-op context manager, so an
+# instrumented call costs about a function call.
+#
+#   with tracing.span("meal.compute"):
+#       plan = create_meal_plan(...)
+import atexit
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+TRACE_ENV = "HEALTH_CALC_TRACE"
+# Spans kept for the Chrome trace; later spans still feed the histograms
+MAX_EVENTS = 200_000
+# Histogram buckets per doubling of the duration (each ~19% wide)
+_BUCKETS_PER_OCTAVE = 4
+_BUCKETS = 40 * _BUCKETS_PER_OCTAVE
+
+_enabled = False
+_path = None
+_origin_ns = time.perf_counter_ns()
+_events = []
+_dropped = 0
+_histograms = {}
+_counters = {}
+_lock = threading.Lock()
+_atexit_registered = False
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        _add(self.name, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+
+class _Histogram:
+    # Durations in log-spaced microsecond buckets; bucket 0 is under 1 us
+    __slots__ = ('count', 'total_ns', 'max_ns', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.buckets = [0] * _BUCKETS
+
+    def add(self, duration_ns):
+        self.count += 1
+        self.total_ns += duration_ns
+        self.max_ns = max(self.max_ns, duration_ns)
+        us = duration_ns / 1000
+        bucket = int(math.log2(us) * _BUCKETS_PER_OCTAVE) + 1 if us >= 1 else 0
+        self.buckets[min(bucket, _BUCKETS - 1)] += 1
+
+    def percentile_ms(self, q):
+        # Upper edge of the bucket holding the q-th percentile
+        rank = q / 100 * self.count
+        seen = 0
+        for bucket, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return min(2 ** (bucket / _BUCKETS_PER_OCTAVE) / 1000, self.max_ns / 1e6)
+        return self.max_ns / 1e6
+
+
+def enabled():
+    return _enabled
+
+
+def enable(path=None):
+    # Starts collecting; `path` gets the Chrome trace and stderr the summary
+    # when the process exits
+    global _enabled, _path, _atexit_registered
+    _enabled = True
+    if path and path != "1":
+        _path = path
+    if not _atexit_registered:
+        atexit.register(_write_at_exit)
+        _atexit_registered = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    global _dropped
+    with _lock:
+        _events.clear()
+        _histograms.clear()
+        _counters.clear()
+        _dropped = 0
+
+
+def span(name, **args):
+    # Context manager timing the block under `name`; `args` show up in the
+    # Chrome trace's event details
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def record(name, start, end, **args):
+    # Adds a span measured elsewhere (time.perf_counter() seconds)
+    if _enabled:
+        _add(name, int(start * 1e9), int(end * 1e9), args)
+
+
+def count(name, value=1):
+    if _enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + value
+
+
+def _add(name, start_ns, end_ns, args):
+    global _dropped
+    duration = end_ns - start_ns
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = _Histogram()
+        histogram.add(duration)
+        if len(_events) < MAX_EVENTS:
+            _events.append((name, start_ns, duration, threading.get_ident(), args))
+        else:
+            _dropped += 1
+
+
+def chrome_trace():
+    # Trace-event JSON object ("X" complete events, times in microseconds)
+    pid = os.getpid()
+    with _lock:
+        events = [{'name': name, 'cat': name.split(".", 1)[0], 'ph': "X", 'pid': pid,
+                   'tid': tid, 'ts': (start - _origin_ns) / 1000, 'dur': duration / 1000,
+                   **({'args': args} if args else {})}
+                  for name, start, duration, tid, args in _events]
+        now = (time.perf_counter_ns() - _origin_ns) / 1000
+        events += [{'name': name, 'ph': "C", 'pid': pid, 'ts': now, 'args': {'value': value}}
+                   for name, value in _counters.items()]
+    return {'traceEvents': events, 'displayTimeUnit': "ms",
+            'otherData': {'dropped_events': _dropped}}
+
+
+def write_chrome_trace(path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(chrome_trace(), f)
+
+
+def stats():
+    # {span name: count, total/mean/p50/p95/max in ms} and the counters
+    with _lock:
+        spans = {name: {'count': h.count, 'total_ms': h.total_ns / 1e6,
+                        'mean_ms': h.total_ns / h.count / 1e6,
+                        'p50_ms': h.percentile_ms(50), 'p95_ms': h.percentile_ms(95),
+                        'max_ms': h.max_ns / 1e6}
+                 for name, h in _histograms.items()}
+        return {'spans': spans, 'counters': dict(_counters), 'dropped_events': _dropped}
+
+
+def summary():
+    # Plain-text table, slowest total first (percentiles are bucket upper edges)
+    data = stats()
+    lines = [f"{'span':<32}{'count':>8}{'total ms':>11}{'mean ms':>10}"
+             f"{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}"]
+    for name, s in sorted(data['spans'].items(), key=lambda item: -item[1]['total_ms']):
+        lines.append(f"{name:<32}{s['count']:>8}{s['total_ms']:>11.2f}{s['mean_ms']:>10.3f}"
+                     f"{s['p50_ms']:>9.3f}{s['p95_ms']:>9.3f}{s['max_ms']:>9.3f}")
+    for name, value in sorted(data['counters'].items()):
+        lines.append(f"{name:<32}{value:>8}")
+    if data['dropped_events']:
+        lines.append(f"({data['dropped_events']} spans left out of the trace file)")
+    return "\n".join(lines)
+
+
+def _write_at_exit():
+    if not _histograms and not _counters:
+        return
+    if _path:
+        write_chrome_trace(_path)
+        print(f"Trace written to {_path}", file=sys.stderr)
+    print(summary(), file=sys.stderr)
+
+
+if os.environ.get(TRACE_ENV):
+    enable(os.environ[TRACE_ENV])
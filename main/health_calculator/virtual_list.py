@@ -0,0 +1,92 @@
+# Scrollable list of text rows that only draws the rows in view.
+#
+# A Text widget holds every line it is given, so refreshing a long plan
+# costs time in proportion to its length. VirtualList keeps the rows as a
+# Python list and a small pool of canvas text items, one per visible row;
+# scrolling or new rows just retarget those items. A refresh costs the same
+# for 20 rows or 20,000.
+#
+#   view = VirtualList(frame, styles={'header': (('Arial', 11, 'bold'), 'darkblue')})
+#   view.set_rows([("DAILY PLAN", 'header'), ("  • Eggs: 2 serving(s)", None)])
+import tkinter as tk
+import tkinter.font as tkfont
+from tkinter import ttk
+
+DEFAULT_FONT = ('Arial', 9)
+ROW_PADDING = 2
+TEXT_INSET = 6
+
+
+class VirtualList(ttk.Frame):
+    def __init__(self, parent, rows=12, font=DEFAULT_FONT, foreground='black', styles=None,
+                 background='white', **kwargs):
+        # `styles` maps a row's tag to (font, color); untagged rows use
+        # `font` and `foreground`
+        super().__init__(parent, **kwargs)
+        self.styles = {None: (font, foreground)}
+        self.styles.update(styles or {})
+        self.row_height = max(tkfont.Font(self, font=f).metrics('linespace')
+                              for f, _ in self.styles.values()) + ROW_PADDING
+        self.rows = []
+        self.top = 0
+        self.items = []
+
+        self.canvas = tk.Canvas(self, height=rows * self.row_height, background=background,
+                                highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.canvas.bind('<Configure>', lambda event: self.redraw())
+        for widget in (self.canvas, self):
+            widget.bind('<MouseWheel>', self._on_wheel)
+            widget.bind('<Button-4>', lambda event: self.scroll(-3))
+            widget.bind('<Button-5>', lambda event: self.scroll(3))
+
+    def visible_rows(self):
+        return max(self.canvas.winfo_height() // self.row_height, 1)
+
+    def set_rows(self, rows, keep_position=False):
+        # Replaces the content with (text, tag) rows
+        self.rows = rows
+        if not keep_position:
+            self.top = 0
+        self.redraw()
+
+    def scroll(self, rows):
+        self.top += rows
+        self.redraw()
+
+    def yview(self, *args):
+        # Scrollbar protocol: ('moveto', fraction) or ('scroll', n, 'units'|'pages')
+        if args[0] == 'moveto':
+            self.top = round(float(args[1]) * len(self.rows))
+        elif args[0] == 'scroll':
+            step = self.visible_rows() if args[2] == 'pages' else 1
+            self.top += int(args[1]) * step
+        self.redraw()
+
+    def _on_wheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+
+    def redraw(self):
+        visible = self.visible_rows()
+        self.top = max(0, min(self.top, len(self.rows) - visible))
+        while len(self.items) < visible:
+            self.items.append(self.canvas.create_text(TEXT_INSET, 0, anchor='nw', text=''))
+
+        for slot, item in enumerate(self.items):
+            row = self.top + slot
+            if slot < visible and row < len(self.rows):
+                text, tag = self.rows[row]
+                font, color = self.styles.get(tag, self.styles[None])
+                self.canvas.itemconfigure(item, text=text, font=font, fill=color, state='normal')
+                self.canvas.coords(item, TEXT_INSET, slot * self.row_height + ROW_PADDING // 2)
+            else:
+                self.canvas.itemconfigure(item, state='hidden')
+
+        if self.rows:
+            self.scrollbar.set(self.top / len(self.rows),
+                               min(self.top + visible, len(self.rows)) / len(self.rows))
+        else:
+            self.scrollbar.set(0, 1)
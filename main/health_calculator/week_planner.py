@@ -0,0 +1,152 @@
+# Meal plans over several days (a week, a month) that are edited one day at
+# a time.
+#
+# No food is eaten on two consecutive days: a day's plan is solved with the
+# foods of its neighbours excluded (a per-food serving limit of 0), unless
+# the foods left can't reach the target. Because of that, a day can change
+# without touching its neighbours. Edits only mark
+# days dirty, and refresh() re-solves just those. Locked days keep their
+# plan until unlocked.
+#
+#   week = MultiDayPlan(28, "Mixed", 120, 4, seed=7)
+#   week.refresh()                     # all 28 days
+#   week.set_day(3, diet_pref="Vegetarian")
+#   week.refresh()                     # day 3 only
+import numpy as np
+import core
+from constants import MAX_SERVINGS_PER_FOOD
+
+DEFAULT_DAYS = 7
+SETTINGS = ('diet_pref', 'daily_protein', 'meals_per_day')
+
+
+class MultiDayPlan:
+    def __init__(self, days, diet_pref, daily_protein, meals_per_day, seed=0, variety=0.0,
+                 table=None):
+        from food_table import default_table
+
+        if days < 1:
+            raise ValueError("days must be at least 1")
+        self.table = default_table() if table is None else table
+        self.settings = {'diet_pref': diet_pref, 'daily_protein': daily_protein,
+                         'meals_per_day': meals_per_day}
+        self.seed = seed
+        self.variety = variety
+        self.overrides = [{} for _ in range(days)]
+        self.plans = [None] * days
+        self.rows = [np.empty(0, dtype=np.int64)] * days
+        self.locked = [False] * days
+        self.revisions = [0] * days
+        self.dirty = set(range(days))
+        self.solved = 0
+        self.pinned = ()
+        self.excluded = ()
+        self._limits = np.full(len(self.table), MAX_SERVINGS_PER_FOOD, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.plans)
+
+    def day_settings(self, day):
+        return {**self.settings, **self.overrides[day]}
+
+    def set_targets(self, **settings):
+        # New defaults for every day (e.g. daily_protein after a weight
+        # change); days overriding a changed setting keep their plan
+        for key in settings:
+            if key not in SETTINGS:
+                raise ValueError(f"unknown setting: {key}")
+        changed = [key for key, value in settings.items() if self.settings[key] != value]
+        for key in changed:
+            self.settings[key] = settings[key]
+        for day, overrides in enumerate(self.overrides):
+            if any(key not in overrides for key in changed):
+                self.dirty.add(day)
+
+    def set_day(self, day, **settings):
+        # Settings for one day only; None goes back to the default
+        overrides = self.overrides[day]
+        for key, value in settings.items():
+            if key not in SETTINGS:
+                raise ValueError(f"unknown setting: {key}")
+            if value is None:
+                overrides.pop(key, None)
+            else:
+                overrides[key] = value
+        self.dirty.add(day)
+
+    def set_foods(self, pinned=(), excluded=()):
+        # Table rows every day must include (a serving at least) or leave out
+        pinned, excluded = tuple(sorted(pinned)), tuple(sorted(excluded))
+        if (pinned, excluded) == (self.pinned, self.excluded):
+            return
+        self.pinned, self.excluded = pinned, excluded
+        self._limits[:] = MAX_SERVINGS_PER_FOOD
+        self._limits[list(excluded)] = 0
+        self.dirty.update(range(len(self)))
+
+    def regenerate_day(self, day):
+        # A different draw among the equally good plans for the day
+        self.revisions[day] += 1
+        self.dirty.add(day)
+
+    def lock(self, day):
+        self.locked[day] = True
+
+    def unlock(self, day):
+        # Edits made while locked apply at the next refresh
+        self.locked[day] = False
+
+    def pending(self):
+        # Days the next refresh() will solve, in order
+        return sorted(day for day in self.dirty
+                      if not self.locked[day] or self.plans[day] is None)
+
+    def refresh(self):
+        # Solves the dirty days that aren't locked; returns them
+        days = self.pending()
+        waiting = set(days)
+        for day in days:
+            waiting.discard(day)
+            self._solve(day, waiting)
+            self.dirty.discard(day)
+        return days
+
+    def _solve(self, day, waiting):
+        # A neighbour that is about to be solved again excludes this day's
+        # foods itself, so only settled neighbours are excluded here
+        limits = self._limits.copy()
+        for neighbour in (day - 1, day + 1):
+            if 0 <= neighbour < len(self) and neighbour not in waiting \
+                    and self.plans[neighbour] is not None:
+                limits[self.rows[neighbour]] = 0
+        settings = self.day_settings(day)
+        serving_row, meal_index = self._solve_rows(day, settings, limits)
+        if self.table.protein[serving_row].sum() < settings['daily_protein']:
+            # The remaining foods can't reach the target; repeating a food
+            # beats falling short (see repeated_foods)
+            serving_row, meal_index = self._solve_rows(day, settings, self._limits)
+        self.plans[day] = core.build_meal_plan(self.table, serving_row, meal_index,
+                                               settings['meals_per_day'])
+        self.rows[day] = np.unique(np.asarray(serving_row, dtype=np.int64))
+        self.solved += 1
+
+    def _solve_rows(self, day, settings, limits):
+        rng = np.random.default_rng([self.seed, day, self.revisions[day]])
+        return core.solve_meal_rows(self.table, settings['diet_pref'], settings['daily_protein'],
+                                    settings['meals_per_day'], rng, self.variety,
+                                    max_servings=limits, pinned=self.pinned)
+
+    def repeated_foods(self):
+        # (day, food name) for every food also eaten the day before; empty
+        # unless a locked day, a pinned food or a too small food list forced
+        # a repeat
+        repeats = []
+        for day in range(1, len(self)):
+            shared = np.intersect1d(self.rows[day - 1], self.rows[day])
+            repeats.extend((day, self.table.names[row]) for row in shared.tolist())
+        return repeats
+
+    def to_dict(self):
+        return {'days': [{'day': day + 1, 'locked': self.locked[day], **self.day_settings(day),
+                          'plan': plan}
+                         for day, plan in enumerate(self.plans)]}